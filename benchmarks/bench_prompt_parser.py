@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark for PromptGenerator over the prompt corpus in benchmarks/prompts.txt.
+
+The corpus is expanded to --count distinct prompts by varying the user count, then parsed
+three ways: one at a time with an empty cache, again from the cache, and as a single
+batch drawn from the original corpus with repeats, like bulk scenario generation.
+
+Exits with status 1 if uncached parsing exceeds the per-prompt budget.
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCHMARKS_DIR), "src"))
+
+from locust_mcp.prompt_generator import PromptGenerator
+
+CORPUS = os.path.join(BENCHMARKS_DIR, "prompts.txt")
+
+
+def load_corpus(path: str):
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def expand(corpus, count: int):
+    """count distinct prompts: corpus prompts with a varying user count"""
+    return [
+        re.sub(r"\d+(\s+users?)", lambda m, n=i: f"{n}{m.group(1)}", corpus[i % len(corpus)], count=1)
+        for i in range(1, count + 1)
+    ]
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark natural language prompt parsing")
+    parser.add_argument("--corpus", default=CORPUS, help="File with one prompt per line")
+    parser.add_argument("--count", type=int, default=20000, help="Prompts per measurement")
+    parser.add_argument("--budget", type=float, default=100.0, help="Microseconds per uncached prompt")
+    args = parser.parse_args()
+
+    generator = PromptGenerator()
+    corpus = load_corpus(args.corpus)
+    prompts = expand(corpus, args.count)
+    bulk = [corpus[i % len(corpus)] for i in range(args.count)]
+
+    generator.cache_clear()
+    cold = timed(lambda: [generator.parse_prompt(prompt) for prompt in prompts])
+    # The last PROMPT_CACHE_SIZE prompts are still cached
+    cached_prompts = prompts[-min(len(prompts), 1000):]
+    warm = timed(lambda: [generator.parse_prompt(prompt) for prompt in cached_prompts])
+    generator.cache_clear()
+    batch = timed(generator.parse_prompts, bulk)
+
+    per_prompt = cold / len(prompts) * 1e6
+    ok = per_prompt <= args.budget
+    print(f"Corpus: {len(corpus)} prompts from {args.corpus}")
+    print(f"Uncached: {per_prompt:.1f} us/prompt ({len(prompts) / cold:,.0f} prompts/s), "
+          f"budget {args.budget:.0f} us: {'OK' if ok else 'FAIL'}")
+    print(f"Cached: {warm / len(cached_prompts) * 1e6:.1f} us/prompt")
+    print(f"Batch of {len(bulk)} with repeats: {batch * 1000:.0f} ms ({len(bulk) / batch:,.0f} prompts/s)")
+    print(f"Cache: {generator.cache_info()}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
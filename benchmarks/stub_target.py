@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Local stub HTTP target for benchmarks: answers every GET, POST, PUT, PATCH and DELETE with
+a small JSON body over keep-alive HTTP/1.1, so runs measure the load generator, not a
+remote service or the network. With --tls it serves HTTPS with a self-signed certificate
+for 127.0.0.1, made with the openssl command line tool.
+
+Run standalone with `python benchmarks/stub_target.py --port 8089`, or start it in a child
+process with StubTarget.
+"""
+import argparse
+import multiprocessing
+import os
+import socket
+import ssl
+import subprocess
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+
+BODY = b'{"ok": true}'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; with Nagle's algorithm every response would
+    # wait for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def _respond(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _respond
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Runs that open a connection per request connect many at once
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # Load generators drop keep-alive connections when they stop
+        pass
+
+
+def make_certificate(directory: str) -> Tuple[str, str]:
+    """A self-signed certificate and key for 127.0.0.1 in directory; returns their paths"""
+    cert, key = os.path.join(directory, "stub-cert.pem"), os.path.join(directory, "stub-key.pem")
+    subprocess.run([
+        "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+        "-keyout", key, "-out", cert, "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1"
+    ], check=True, capture_output=True)
+    return cert, key
+
+
+def serve(port: int, cert: Optional[str] = None, key: Optional[str] = None):
+    server = StubServer(("127.0.0.1", port), StubHandler)
+    if cert:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        # Handshakes happen in the handler threads, so a slow one doesn't block accepting
+        server.socket = context.wrap_socket(server.socket, server_side=True, do_handshake_on_connect=False)
+    server.serve_forever()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class StubTarget:
+    """
+    The stub target in a child process, so it does not share a GIL with the load generator.
+    With tls=True it serves HTTPS; cert is the certificate to verify it with.
+    """
+
+    def __init__(self, port: int = 0, tls: bool = False):
+        self.port = port or free_port()
+        self.tls = tls
+        self.url = f"{'https' if tls else 'http'}://127.0.0.1:{self.port}"
+        self.cert: Optional[str] = None
+        self.process = None
+        self._directory: Optional[tempfile.TemporaryDirectory] = None
+
+    def __enter__(self) -> "StubTarget":
+        key = None
+        if self.tls:
+            self._directory = tempfile.TemporaryDirectory()
+            self.cert, key = make_certificate(self._directory.name)
+        self.process = multiprocessing.get_context("spawn").Process(target=serve, args=(self.port, self.cert, key), daemon=True)
+        self.process.start()
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=0.5).close()
+                return self
+            except OSError:
+                time.sleep(0.02)
+        raise RuntimeError(f"Stub target did not start on port {self.port}")
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.join()
+        if self._directory is not None:
+            self._directory.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a stub HTTP target for benchmarks")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--tls", action="store_true", help="serve HTTPS with a self-signed certificate")
+    args = parser.parse_args()
+    if args.tls:
+        directory = tempfile.mkdtemp()
+        cert, key = make_certificate(directory)
+        print(f"Stub target listening on https://127.0.0.1:{args.port}; its certificate is {cert}")
+        serve(args.port, cert, key)
+    else:
+        print(f"Stub target listening on http://127.0.0.1:{args.port}")
+        serve(args.port)
@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the prompt parser, script generator, test store, MCP server and
+generated Locust scripts. Load runs target a local stub HTTP or HTTPS server; nothing
+touches the network.
+
+    python benchmarks/suite.py                   # run everything, compare with the baseline
+    python benchmarks/suite.py --quick --only store,server
+    python benchmarks/suite.py --save-baseline   # record this machine's baseline
+
+Results are written as JSON (--output). Each metric records whether lower or higher is
+better, and metrics that are worse than the baseline by more than --tolerance are reported
+as regressions, with exit status 1. Baselines only compare meaningfully on the machine
+that recorded them, in the same mode (--quick or not).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+SRC_DIR = os.path.join(REPO_DIR, "src")
+sys.path.insert(0, SRC_DIR)
+# Locust processes import the run hooks from locust_mcp too
+os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [SRC_DIR, os.environ.get("PYTHONPATH")]))
+
+from locust_mcp.client import AsyncMCPClient  # noqa: E402
+from locust_mcp.locust_generator import LocustScriptGenerator  # noqa: E402
+from locust_mcp.prompt_generator import PromptGenerator  # noqa: E402
+from locust_mcp.retention import RetentionPolicy  # noqa: E402
+from locust_mcp.run_broadcast import RunBroadcaster  # noqa: E402
+from locust_mcp.test_runner import LocustTestRunner  # noqa: E402
+from locust_mcp.test_store import TestStore  # noqa: E402
+from stub_target import StubTarget, free_port  # noqa: E402
+
+CORPUS = os.path.join(BENCHMARKS_DIR, "prompts.txt")
+BASELINE = os.path.join(BENCHMARKS_DIR, "baseline.json")
+RESULTS = os.path.join(BENCHMARKS_DIR, "results.json")
+
+BENCHMARKS: Dict[str, Callable[[bool], Dict[str, Dict[str, Any]]]] = {}
+
+
+def benchmark(name: str):
+    def register(function):
+        BENCHMARKS[name] = function
+        return function
+    return register
+
+
+def metric(value: float, unit: str, better: Optional[str], tolerance: Optional[float] = None) -> Dict[str, Any]:
+    """
+    A measurement; better is "lower", "higher", or None for informational values. A tolerance
+    widens the allowed change for noisy metrics such as tail latencies.
+    """
+    result = {"value": round(value, 3), "unit": unit, "better": better}
+    if tolerance is not None:
+        result["tolerance"] = tolerance
+    return result
+
+
+def best_of(repeat: int, function: Callable[[], Any]) -> float:
+    """Fastest of repeat timed calls, in seconds"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def load_corpus(path: str = CORPUS) -> List[str]:
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def expand_corpus(corpus: List[str], count: int) -> List[str]:
+    """count distinct prompts: corpus prompts with varying user counts"""
+    prompts = []
+    for i in range(count):
+        prompt = corpus[i % len(corpus)]
+        prompts.append(prompt.replace(" users", f"{i} users", 1) if " users" in prompt else f"{prompt} #{i}")
+    return prompts
+
+
+@benchmark("prompt_parse")
+def bench_prompt_parse(quick: bool) -> Dict[str, Dict[str, Any]]:
+    generator = PromptGenerator()
+    corpus = load_corpus()
+    prompts = expand_corpus(corpus, 2000 if quick else 20000)
+    bulk = [corpus[i % len(corpus)] for i in range(len(prompts))]
+
+    def uncached():
+        generator.cache_clear()
+        for prompt in prompts:
+            generator.parse_prompt(prompt)
+
+    uncached_time = best_of(3, uncached)
+    # Still in the cache after the uncached pass
+    cached = prompts[-4000:]
+    cached_time = best_of(3, lambda: [generator.parse_prompt(prompt) for prompt in cached])
+
+    def batch():
+        generator.cache_clear()
+        generator.parse_prompts(bulk)
+
+    batch_time = best_of(3, batch)
+    return {
+        "uncached": metric(uncached_time / len(prompts) * 1e6, "us/prompt", "lower"),
+        "cached": metric(cached_time / len(cached) * 1e6, "us/prompt", "lower"),
+        "batch": metric(len(bulk) / batch_time, "prompts/s", "higher")
+    }
+
+
+def endpoint_spec(count: int, seed: int = 0) -> Dict[str, Any]:
+    return {
+        "targetUrl": "http://127.0.0.1:8089",
+        "endpoints": [
+            {
+                "method": ("GET", "POST", "PUT", "DELETE")[i % 4],
+                "path": f"/api/v1/resource{seed}_{i}/items",
+                "data": {"id": i, "name": f"item {i}", "tags": ["a", "b"]} if i % 4 in (1, 2) else None,
+                "headers": {"Accept": "application/json"},
+                "weight": 1 + i % 5
+            }
+            for i in range(count)
+        ]
+    }
+
+
+@benchmark("generator")
+def bench_generator(quick: bool) -> Dict[str, Dict[str, Any]]:
+    generator = LocustScriptGenerator()
+    # Distinct specs in every repetition, so every script is generated and validated rather
+    # than served from the compiled script cache
+    small_count = 50 if quick else 500
+    small_specs = iter([[endpoint_spec(3, repeat * small_count + seed) for seed in range(small_count)]
+                        for repeat in range(3)])
+    small_time = best_of(3, lambda: [generator.generate(spec) for spec in next(small_specs)])
+
+    large_size = 1000 if quick else 5000
+    large_specs = iter([endpoint_spec(large_size, -2 - repeat) for repeat in range(3)])
+    script = generator.generate(endpoint_spec(large_size, -1))
+    large_time = best_of(3, lambda: generator.generate(next(large_specs)))
+    return {
+        "small_spec": metric(small_time / small_count * 1e6, "us/script", "lower"),
+        f"large_spec_{large_size}": metric(large_time * 1000, "ms/script", "lower"),
+        f"large_spec_{large_size}_size": metric(len(script) / 1024, "KiB", None)
+    }
+
+
+@benchmark("store")
+def bench_store(quick: bool) -> Dict[str, Dict[str, Any]]:
+    entries = 10000 if quick else 100000
+    saves = 50 if quick else 200
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            # A store of mostly archived tests, as retention leaves it
+            history_dir = os.path.join(directory, "tests", "generated")
+            os.makedirs(history_dir)
+            with open(os.path.join(history_dir, "history.jsonl"), "w") as f:
+                for i in range(entries):
+                    f.write(json.dumps({
+                        "id": f"20240101_{i:06d}", "timestamp": "2024-01-01T00:00:00",
+                        "description": "Test https://api.example.com with 10 users: GET /users",
+                        "script_path": None, "config_path": None, "archived": True,
+                        "config": {"host": "https://api.example.com", "users": 10, "spawn_rate": 1, "run_time": "30s"}
+                    }) + "\n")
+
+            started = time.perf_counter()
+            store = TestStore(base_dir=os.path.join(directory, "cache"))
+            load_time = time.perf_counter() - started
+
+            script = LocustScriptGenerator().generate(endpoint_spec(3))
+            config = {"host": "https://api.example.com", "users": 10, "spawn_rate": 1, "run_time": "30s"}
+            started = time.perf_counter()
+            ids = [store.save_test(script, config, f"Benchmark test {i}")["id"] for i in range(saves)]
+            save_time = (time.perf_counter() - started) / saves
+
+            list_time = best_of(3, lambda: json.dumps({"tests": store.list_tests()}))
+            lookups = [random.choice(ids) for _ in range(1000)]
+            get_time = best_of(3, lambda: [store.get_test(test_id) for test_id in lookups]) / len(lookups)
+
+            started = time.perf_counter()
+            store.compact(RetentionPolicy(max_count=0))
+            compact_time = time.perf_counter() - started
+            get_archived_time = best_of(3, lambda: [store.get_test(test_id) for test_id in lookups]) / len(lookups)
+        finally:
+            os.chdir(cwd)
+    return {
+        f"load_{entries}": metric(load_time * 1000, "ms", "lower"),
+        f"save_at_{entries}": metric(save_time * 1000, "ms/test", "lower"),
+        f"list_{entries}": metric(list_time * 1000, "ms", "lower"),
+        "get": metric(get_time * 1e6, "us/test", "lower"),
+        "get_archived": metric(get_archived_time * 1e6, "us/test", "lower"),
+        f"compact_{entries}": metric(compact_time * 1000, "ms", "lower")
+    }
+
+
+async def round_trips(url: str, message: Dict[str, Any], count: int) -> List[float]:
+    import websockets
+    timings = []
+    async with websockets.connect(url, max_size=None) as ws:
+        for _ in range(count):
+            started = time.perf_counter()
+            await ws.send(json.dumps(message))
+            while json.loads(await ws.recv()).get("type") == "heartbeat":
+                pass
+            timings.append(time.perf_counter() - started)
+    return timings
+
+
+async def pipelined(url: str, command: str, params: Dict[str, Any], count: int) -> float:
+    """Seconds to answer count requests sent all at once over one client connection"""
+    async with AsyncMCPClient(url) as client:
+        started = time.perf_counter()
+        await client.batch([(command, params)] * count)
+        return time.perf_counter() - started
+
+
+@benchmark("server")
+def bench_server(quick: bool) -> Dict[str, Dict[str, Any]]:
+    requests_count = 200 if quick else 1000
+    port = free_port()
+    with tempfile.TemporaryDirectory() as directory:
+        env = {**os.environ, "LOCUST_MCP_LOG_LEVEL": "WARNING", "LOCUST_MCP_MAX_REQUESTS_PER_MINUTE": "0"}
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "locust_mcp.server:app", "--port", str(port), "--log-level", "warning"],
+            cwd=directory, env=env
+        )
+        try:
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+                    break
+                except OSError:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError("MCP server did not start")
+                    time.sleep(0.05)
+            url = f"ws://127.0.0.1:{port}/mcp"
+            spec = endpoint_spec(3)
+            asyncio.run(round_trips(url, {"command": "list", "params": {}}, 20))
+            list_times = asyncio.run(round_trips(url, {"command": "list", "params": {}}, requests_count))
+            generate_times = asyncio.run(round_trips(url, {"command": "generate", "params": spec}, requests_count // 10))
+            pipelined_time = asyncio.run(pipelined(url, "generate", spec, requests_count // 2))
+        finally:
+            server.terminate()
+            try:
+                server.wait(10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+                server.wait()
+    return {
+        "list_p50": metric(statistics.median(list_times) * 1000, "ms", "lower"),
+        "list_p99": metric(percentile(list_times, 0.99) * 1000, "ms", "lower", tolerance=1.0),
+        "generate_p50": metric(statistics.median(generate_times) * 1000, "ms", "lower"),
+        "generate_pipelined": metric(requests_count // 2 / pipelined_time, "req/s", "higher")
+    }
+
+
+async def fan_out(subscribers: int, events: List[Dict[str, Any]]) -> float:
+    """Seconds to deliver every event to every subscriber of one live run"""
+    delivered = 0
+
+    async def send(text: str):
+        nonlocal delivered
+        delivered += 1
+
+    live_run = RunBroadcaster().start("bench")
+    for key in range(subscribers):
+        live_run.subscribe(key, send)
+    expected = subscribers * (len(events) + 1)
+    start = time.perf_counter()
+    for event in events:
+        live_run.publish(event)
+        # Let the subscribers drain, as the server's event loop would between run events
+        await asyncio.sleep(0)
+    while delivered < expected:
+        await asyncio.sleep(0)
+    return time.perf_counter() - start
+
+
+@benchmark("broadcast")
+def bench_broadcast(quick: bool) -> Dict[str, Dict[str, Any]]:
+    subscribers = 100 if quick else 500
+    count = 50 if quick else 200
+    now = time.time()
+    events = [
+        {"event": "stats", "start": now + i, "time": now + i + 1, "entries": [
+            {"name": f"/endpoint/{n}", "method": "GET", "num_requests": 100, "num_failures": 1,
+             "total_response_time": 1500, "response_times": {str(value): 10 for value in range(5, 50, 5)}}
+            for n in range(10)
+        ]}
+        for i in range(count)
+    ]
+    elapsed = min(asyncio.run(fan_out(subscribers, events)) for _ in range(3))
+    return {
+        f"fan_out_{subscribers}": metric(elapsed / count * 1e6, "us/event", "lower")
+    }
+
+
+@benchmark("locust_rps")
+def bench_locust_rps(quick: bool) -> Dict[str, Dict[str, Any]]:
+    generator = LocustScriptGenerator()
+    with StubTarget() as target:
+        spec = {
+            "targetUrl": target.url,
+            "endpoints": [{"method": "GET", "path": "/", "weight": 3}, {"method": "POST", "path": "/items", "data": {"a": 1}}],
+            "users": 20,
+            "spawnRate": 20,
+            "runTime": "6s" if quick else "20s",
+            "thinkTime": {"min": 0, "max": 0},
+            "warmup": "ramp"
+        }
+        result = asyncio.run(LocustTestRunner().run({
+            "script": generator.generate(spec),
+            "config": generator.generate_config(spec)
+        }))
+    if not result.get("success"):
+        raise RuntimeError(f"Locust run failed: {result.get('error')}")
+    entries = result["statistics"]
+    failures = sum(entry.get("num_failures", 0) for entry in entries)
+    if failures:
+        raise RuntimeError(f"{failures} requests to the stub target failed")
+    return {
+        "rps": metric(sum(entry.get("requests_per_sec", 0) for entry in entries), "req/s", "higher"),
+        "startup": metric(result["phases"].get("startup", 0) * 1000, "ms", "lower")
+    }
+
+
+@benchmark("connections")
+def bench_connections(quick: bool) -> Dict[str, Dict[str, Any]]:
+    generator = LocustScriptGenerator()
+    results = {}
+    with StubTarget(tls=True) as target:
+        for mode in ("keepalive", "close", "pool"):
+            spec = {
+                "targetUrl": target.url,
+                "endpoints": [{"method": "GET", "path": "/"}],
+                "users": 20,
+                "spawnRate": 20,
+                "runTime": "5s" if quick else "15s",
+                "thinkTime": {"min": 0, "max": 0},
+                "warmup": "ramp",
+                # 20 users share 4 connections in pool mode
+                "connections": {"mode": mode, "poolSize": 4, "verify": target.cert}
+            }
+            result = asyncio.run(LocustTestRunner().run({
+                "script": generator.generate(spec),
+                "config": generator.generate_config(spec)
+            }))
+            if not result.get("success"):
+                raise RuntimeError(f"Locust run failed: {result.get('error')}")
+            failures = sum(entry.get("num_failures", 0) for entry in result["statistics"])
+            if failures:
+                raise RuntimeError(f"{failures} requests to the stub target failed")
+            phases = result["connections"][0]["phases"]
+            results[f"{mode}_rps"] = metric(sum(entry.get("requests_per_sec", 0) for entry in result["statistics"]), "req/s", "higher")
+            if mode == "close":
+                results["tls_handshake_p50"] = metric(phases["tls"]["p50"], "ms", "lower", tolerance=0.5)
+                results["connect_p50"] = metric(phases["connect"]["p50"], "ms", "lower", tolerance=0.5)
+            elif mode == "pool":
+                # Time requests spent waiting for one of the pooled connections
+                results["pool_wait_p50"] = metric(phases["wait"]["p50"], "ms", None)
+    return results
+
+
+def run_benchmarks(names: List[str], quick: bool) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    for name in names:
+        print(f"Running {name}...", flush=True)
+        for key, value in BENCHMARKS[name](quick).items():
+            results[f"{name}.{key}"] = value
+    return results
+
+
+def machine_info(quick: bool) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "quick": quick
+    }
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[str]:
+    """Print each metric against the baseline and return the names of regressed metrics"""
+    regressions = []
+    print(f"\n{'metric':<40} {'value':>12} {'baseline':>12} {'change':>8}")
+    for name, current in results.items():
+        previous = baseline.get(name)
+        line = f"{name:<40} {current['value']:>12.3f}"
+        if previous is None or not previous["value"] or current["better"] is None:
+            print(f"{line} {'':>12} {'':>8}  {current['unit']}")
+            continue
+        change = (current["value"] - previous["value"]) / previous["value"]
+        allowed = max(tolerance, current.get("tolerance", 0))
+        worse = change > allowed if current["better"] == "lower" else change < -allowed
+        if worse:
+            regressions.append(name)
+        print(f"{line} {previous['value']:>12.3f} {change:>+8.1%}  {current['unit']}{'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the locust-mcp benchmark suite")
+    parser.add_argument("--only", help=f"Comma-separated benchmarks to run: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--quick", action="store_true", help="Smaller inputs and shorter runs")
+    parser.add_argument("--output", default=RESULTS, help="Where to write the results JSON")
+    parser.add_argument("--baseline", default=BASELINE, help="Baseline results JSON to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="Also write the results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown before a regression")
+    args = parser.parse_args(argv)
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(unknown)}")
+    logging.getLogger("locust_mcp").setLevel(logging.ERROR)
+
+    report = {"meta": machine_info(args.quick), "results": run_benchmarks(names, args.quick)}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["meta"].get("quick") != args.quick:
+            print(f"Baseline {args.baseline} was recorded {'with' if baseline['meta'].get('quick') else 'without'} "
+                  "--quick; not comparing")
+            compare(report["results"], {}, args.tolerance)
+        else:
+            regressions = compare(report["results"], baseline["results"], args.tolerance)
+    else:
+        compare(report["results"], {}, args.tolerance)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
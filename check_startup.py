@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Startup budget check for the MCP server.
+
+1. Imports locust_mcp.server in a fresh interpreter and compares the time against importing
+   FastAPI alone, so the check measures this project's own import cost, not the framework's.
+   Importing must not create files or configure logging.
+2. Starts the server against a large synthetic test history and measures the time until
+   it answers HTTP requests.
+
+Exits with status 1 if either budget is exceeded.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src")
+
+IMPORT_PROBE = """
+import logging, sys, time
+started = time.perf_counter()
+import fastapi
+framework = time.perf_counter() - started
+import locust_mcp.server
+total = time.perf_counter() - started
+print(framework, total, len(logging.getLogger().handlers))
+"""
+
+
+def check_import(budget: float, cwd: str) -> bool:
+    env = {**os.environ, "PYTHONPATH": SRC_DIR}
+    output = subprocess.run([sys.executable, "-c", IMPORT_PROBE], cwd=cwd, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    framework, total, handlers = output.split()
+    overhead = float(total) - float(framework)
+    ok = overhead <= budget
+    print(f"Import: {overhead * 1000:.1f} ms on top of FastAPI ({float(framework) * 1000:.1f} ms), "
+          f"budget {budget * 1000:.0f} ms: {'OK' if ok else 'FAIL'}")
+    if os.listdir(cwd):
+        print(f"Import: created {os.listdir(cwd)} in the working directory: FAIL")
+        ok = False
+    if int(handlers):
+        print("Import: configured logging handlers: FAIL")
+        ok = False
+    return ok
+
+
+def check_serving(budget: float, cwd: str, history_size: int) -> bool:
+    history_dir = os.path.join(cwd, "tests", "generated")
+    os.makedirs(history_dir, exist_ok=True)
+    with open(os.path.join(history_dir, "history.jsonl"), "w") as f:
+        for i in range(history_size):
+            f.write(json.dumps({"id": f"{i:08d}", "timestamp": "2024-01-01T00:00:00", "description": "x" * 64,
+                                "script_path": "", "config_path": "", "config": {"users": 10, "run_time": "30s"}}) + "\n")
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    env = {**os.environ, "PYTHONPATH": SRC_DIR, "LOCUST_MCP_LOG_LEVEL": "WARNING"}
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "locust_mcp.server:app", "--port", str(port), "--log-level", "warning"],
+        cwd=cwd, env=env
+    )
+    try:
+        while time.perf_counter() - started < budget * 10:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=1).read()
+                break
+            except OSError:
+                time.sleep(0.01)
+        elapsed = time.perf_counter() - started
+    finally:
+        process.terminate()
+        process.wait()
+    ok = elapsed <= budget
+    print(f"Serving: first response after {elapsed * 1000:.0f} ms with {history_size} tests in the history, "
+          f"budget {budget * 1000:.0f} ms: {'OK' if ok else 'FAIL'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the MCP server's import and startup time budgets")
+    parser.add_argument("--import-budget", type=float, default=0.1, help="Seconds of import time on top of FastAPI")
+    parser.add_argument("--serve-budget", type=float, default=1.0, help="Seconds from process start to first response")
+    parser.add_argument("--history-size", type=int, default=200000, help="Tests in the synthetic history")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as import_cwd, tempfile.TemporaryDirectory() as serve_cwd:
+        ok = check_import(args.import_budget, import_cwd)
+        ok = check_serving(args.serve_budget, serve_cwd, args.history_size) and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,7 @@ setup(
     entry_points={
         "console_scripts": [
             "locust-mcp=locust_mcp.server:main",
+            "locust-mcp-batch=locust_mcp.batch_generator:main",
         ],
     },
 )
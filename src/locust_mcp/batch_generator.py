@@ -0,0 +1,253 @@
+import argparse
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple, Union
+
+from locust_mcp.cpu_affinity import set_affinity
+from locust_mcp.locust_generator import LocustScriptGenerator
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 100
+
+# Column names used by tests/test_cases.csv, mapped to the keys used internally
+CSV_COLUMNS = {
+    "Sr. No": "sr_no",
+    "Curl Command": "curl_command",
+    "No. Of Users": "users",
+    "Duration": "duration",
+}
+
+_generator = LocustScriptGenerator()
+
+
+def iter_test_cases(path: str) -> Iterator[Tuple[int, Union[Dict[str, Any], str]]]:
+    """
+    Stream raw test cases from a CSV or JSONL file as (row number, row) pairs.
+    JSONL rows are yielded undecoded so that decoding happens in the workers.
+    """
+    if path.endswith((".jsonl", ".ndjson")):
+        with open(path, "r") as f:
+            for row_no, line in enumerate(f, 1):
+                if line.strip():
+                    yield row_no, line
+    else:
+        with open(path, "r", newline="") as f:
+            # Row 1 is the header, so data rows start at 2 like in a spreadsheet
+            for row_no, row in enumerate(csv.DictReader(f), 2):
+                yield row_no, row
+
+
+def normalize_case(row_no: int, raw: Union[Dict[str, Any], str]) -> Dict[str, Any]:
+    """Convert a CSV or JSONL row into a test case dict, raising ValueError if it is unusable."""
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON: {e}")
+        if not isinstance(raw, dict):
+            raise ValueError("Expected a JSON object")
+
+    case = {CSV_COLUMNS.get(key, key): value for key, value in raw.items()}
+    curl_command = case.get("curl_command") or case.get("curl")
+    if not curl_command:
+        raise ValueError("Missing curl command")
+
+    try:
+        users = int(case.get("users") or 10)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid user count: {case.get('users')!r}")
+
+    return {
+        "row": row_no,
+        "sr_no": str(case.get("sr_no") or row_no),
+        "curl_command": curl_command,
+        "users": users,
+        "duration": str(case.get("duration") or case.get("run_time") or "30s"),
+    }
+
+
+def generate_case(case: Dict[str, Any]) -> Dict[str, Any]:
+    """Generate the script and config for a single normalized test case, parsing the curl command once."""
+    config = _generator._parse_curl_command(case["curl_command"], case["users"], case["duration"])
+    # Scripts are validated when they are run rather than one by one here
+    script = _generator.generate_from_config(config, validate=False)
+    return {"row": case["row"], "sr_no": case["sr_no"], "script": script, "config": config}
+
+
+def _generate_chunk(chunk: List[Tuple[int, Union[Dict[str, Any], str]]]) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """Worker entry point: generate a chunk of rows, returning output lines and per-row errors."""
+    lines = []
+    errors = []
+    for row_no, raw in chunk:
+        try:
+            result = generate_case(normalize_case(row_no, raw))
+            lines.append(json.dumps(result))
+        except Exception as e:
+            sr_no = raw.get("Sr. No", raw.get("sr_no")) if isinstance(raw, dict) else None
+            errors.append({"row": row_no, "sr_no": sr_no, "error": str(e)})
+    return lines, errors
+
+
+def _chunked(rows: Iterator[Any], size: int) -> Iterator[List[Any]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def default_output_path() -> str:
+    """Output file used when none is given, next to the tests saved by TestStore."""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return os.path.join(os.getcwd(), 'tests', 'generated', f'batch_{timestamp}.jsonl')
+
+
+def generate_batch(
+    input_path: str,
+    output_path: Optional[str] = None,
+    workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    cores: Optional[List[int]] = None,
+) -> Dict[str, Any]:
+    """
+    Generate Locust scripts for every row of a CSV or JSONL file.
+
+    Rows are streamed in chunks to a process pool with at most two chunks in
+    flight per worker, so memory stays bounded regardless of the input size.
+    Each generated test is written as one JSON line to output_path; rows may
+    appear out of order, and every line carries its source row number. With
+    cores, the worker processes run on those cores rather than on this process's.
+    """
+    if not os.path.exists(input_path):
+        raise ValueError(f"Test case file not found: {input_path}")
+
+    workers = workers or os.cpu_count() or 1
+    output_path = output_path or default_output_path()
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+
+    start = time.perf_counter()
+    summary = {
+        "input_path": input_path,
+        "output_path": output_path,
+        "total": 0,
+        "generated": 0,
+        "failed": 0,
+        "errors": [],
+    }
+
+    def collect(lines: List[str], errors: List[Dict[str, Any]]):
+        if lines:
+            out.write("\n".join(lines))
+            out.write("\n")
+        summary["generated"] += len(lines)
+        summary["failed"] += len(errors)
+        summary["total"] += len(lines) + len(errors)
+        room = MAX_REPORTED_ERRORS - len(summary["errors"])
+        if room > 0:
+            summary["errors"].extend(errors[:room])
+        if progress is not None:
+            progress({
+                "total": summary["total"],
+                "generated": summary["generated"],
+                "failed": summary["failed"],
+                "elapsed": time.perf_counter() - start,
+            })
+
+    chunks = _chunked(iter_test_cases(input_path), chunk_size)
+    with open(output_path, "w") as out:
+        if workers == 1:
+            for chunk in chunks:
+                collect(*_generate_chunk(chunk))
+        else:
+            context = multiprocessing.get_context("spawn")
+            # Each worker process sets its own cores as it starts
+            initializer, initargs = (set_affinity, (0, cores)) if cores else (None, ())
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                     initializer=initializer, initargs=initargs) as pool:
+                pending = set()
+                for chunk in chunks:
+                    if len(pending) >= workers * 2:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            collect(*future.result())
+                    pending.add(pool.submit(_generate_chunk, chunk))
+                for future in pending:
+                    collect(*future.result())
+
+    summary["elapsed"] = time.perf_counter() - start
+    logger.info(
+        f"Generated {summary['generated']} of {summary['total']} test cases "
+        f"in {summary['elapsed']:.2f}s ({summary['failed']} failed)"
+    )
+    return summary
+
+
+def generate_mixed_test(input_path: str) -> int:
+    """Generate and save a single mixed-workload test from every row of a test case file"""
+    from locust_mcp.test_store import TestStore
+
+    try:
+        cases = [normalize_case(row_no, raw) for row_no, raw in iter_test_cases(input_path)]
+        script, config = _generator.generate_mixed(cases)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    test_info = TestStore().save_test(script, config, f"Mixed workload from {input_path}")
+    print(f"Mixed workload test {test_info['id']} saved to: {test_info['script_path']}")
+    print("\nTo run this test, use the following command:")
+    print(f"locust -f {test_info['script_path']} --users {config['users']} --spawn-rate {config['spawn_rate']} "
+          f"--run-time {config['run_time']} --headless")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point for batch generation"""
+    parser = argparse.ArgumentParser(description="Generate Locust scripts from a CSV or JSONL file of curl test cases")
+    parser.add_argument("input", help="CSV (Sr. No, Curl Command, No. Of Users, Duration) or JSONL test case file")
+    parser.add_argument("-o", "--output", help="JSONL file to write generated tests to")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows handed to a worker at a time")
+    parser.add_argument("--mixed", action="store_true", help="Combine all rows into one mixed-workload test instead")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    if args.mixed:
+        return generate_mixed_test(args.input)
+
+    def report(state: Dict[str, Any]):
+        print(
+            f"\r{state['total']} rows, {state['generated']} generated, "
+            f"{state['failed']} failed ({state['elapsed']:.1f}s)",
+            end="", file=sys.stderr, flush=True
+        )
+
+    try:
+        summary = generate_batch(args.input, args.output, args.workers, args.chunk_size, progress=report)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(file=sys.stderr)
+
+    for error in summary["errors"]:
+        print(f"Row {error['row']}: {error['error']}", file=sys.stderr)
+    print(f"Generated tests written to: {summary['output_path']}")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
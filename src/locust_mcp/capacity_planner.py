@@ -0,0 +1,216 @@
+import logging
+import math
+import os
+import random
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+import requests
+
+from locust_mcp.data_feeder import DataFeeder, fill_template
+from locust_mcp.locust_generator import parse_run_time, think_time_range
+
+logger = logging.getLogger(__name__)
+
+# Measured probe requests per endpoint, sent after one unmeasured request that opens the connection
+PROBE_REQUESTS = 5
+# Probe requests per second per endpoint, low enough not to load the target
+PROBE_RATE = 5.0
+PROBE_TIMEOUT = 10
+PROBE_CONCURRENCY = 8
+# Large imports are sized from their most heavily weighted endpoints
+MAX_PROBED_ENDPOINTS = 50
+# Rough ceilings for one Locust process driving HttpUser users
+RPS_PER_WORKER = 500
+USERS_PER_WORKER = 5000
+# Ramp up over this share of the run time
+RAMP_FRACTION = 0.1
+
+
+def available_cores() -> int:
+    """CPU cores this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _param_value(generator: Dict[str, Any]) -> Any:
+    """A value for a path parameter, like the generated script's expression would produce"""
+    kind = generator.get("type")
+    if kind == "int":
+        return random.randint(int(generator.get("min", 1)), int(generator.get("max", 10000)))
+    if kind == "choice":
+        if not generator.get("values"):
+            raise ValueError("A choice path parameter needs values")
+        return random.choice(generator["values"])
+    if kind == "uuid":
+        return str(uuid.uuid4())
+    return uuid.uuid4().hex[:8]
+
+
+def probe_request(endpoint: Dict[str, Any], row: Optional[Dict[str, Any]] = None) -> Tuple[str, str, Dict[str, Any]]:
+    """
+    The method, path and requests keyword arguments of one concrete request to a spec
+    endpoint. Raises ValueError if its path parameters can't be filled in.
+    """
+    method = endpoint.get("method", "GET").upper()
+    row = row or {}
+    if endpoint.get("samples"):
+        path = random.choice(endpoint["samples"])
+    elif endpoint.get("pathParams"):
+        try:
+            values = {key: _param_value(generator) for key, generator in endpoint["pathParams"].items()}
+            path = endpoint.get("path", "/").format(**{**row, **values})
+        except KeyError as e:
+            raise ValueError(f"No value for path parameter {e} of {method} {endpoint.get('path', '/')}") from e
+        except (IndexError, TypeError, ValueError) as e:
+            raise ValueError(f"Invalid path parameters for {method} {endpoint.get('path', '/')}: {e}") from e
+    else:
+        path = endpoint.get("path", "/")
+    kwargs: Dict[str, Any] = {}
+    if endpoint.get("headers"):
+        kwargs["headers"] = endpoint["headers"]
+    if endpoint.get("params"):
+        kwargs["params"] = endpoint["params"]
+    if endpoint.get("data") and method in ("POST", "PUT", "PATCH"):
+        kwargs["json"] = endpoint["data"]
+    if row:
+        path, kwargs = fill_template(path, row), fill_template(kwargs, row)
+    return method, path, kwargs
+
+
+def probe_endpoint(target_url: str, endpoint: Dict[str, Any], row: Optional[Dict[str, Any]] = None,
+                   requests_per_endpoint: int = PROBE_REQUESTS, rate: float = PROBE_RATE) -> Dict[str, Any]:
+    """Blocking: measure the service time of one endpoint with a few spaced-out requests."""
+    session = requests.Session()
+    samples: List[float] = []
+    failures = sent = 0
+    error = None
+    for attempt in range(requests_per_endpoint + 1):
+        try:
+            method, path, kwargs = probe_request(endpoint, row)
+        except ValueError as e:
+            # Reported like an HTTP failure, so the other endpoints are still probed
+            error = str(e)
+            break
+        sent += 1
+        started = time.perf_counter()
+        try:
+            response = session.request(method, target_url.rstrip("/") + path, timeout=PROBE_TIMEOUT, **kwargs)
+            elapsed = time.perf_counter() - started
+            response.close()
+            if response.status_code >= 400:
+                failures += 1
+                error = f"HTTP {response.status_code}"
+            elif attempt > 0:
+                samples.append(elapsed)
+        except requests.RequestException as e:
+            elapsed = time.perf_counter() - started
+            failures += 1
+            error = str(e)
+        time.sleep(max(1.0 / rate - elapsed, 0))
+    session.close()
+
+    result = {
+        "method": endpoint.get("method", "GET").upper(),
+        "name": endpoint.get("name") or endpoint.get("path", "/"),
+        "weight": endpoint.get("weight", 1),
+        "requests": sent,
+        "failures": failures
+    }
+    if samples:
+        result["mean_service_time"] = round(statistics.mean(samples), 4)
+        result["median_service_time"] = round(statistics.median(samples), 4)
+    else:
+        result["error"] = error
+    return result
+
+
+def size_for_throughput(target_rps: float, service_time: float, think_time: float,
+                        run_time: Any = "30s", cores: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Users, spawn rate and worker processes needed for target_rps by Little's law: every user
+    cycles through a request (service_time) and a wait (think_time), so
+    users = throughput * (service_time + think_time).
+    """
+    if target_rps <= 0:
+        raise ValueError("Target throughput must be positive")
+    users = max(1, math.ceil(target_rps * (service_time + think_time)))
+    ramp_seconds = max(1.0, parse_run_time(run_time) * RAMP_FRACTION)
+    workers = max(math.ceil(target_rps / RPS_PER_WORKER), math.ceil(users / USERS_PER_WORKER))
+    cores = cores or available_cores()
+
+    warnings = []
+    if workers > cores:
+        warnings.append(
+            f"{target_rps:g} req/s needs about {workers} Locust worker processes but only {cores} "
+            "CPU cores are available; the load generator, not the target, will likely be the bottleneck"
+        )
+    return {
+        "users": users,
+        "spawn_rate": max(1, math.ceil(users / ramp_seconds)),
+        "workers": workers,
+        "processes": min(workers, cores) if workers > 1 else None,
+        "warnings": warnings
+    }
+
+
+def plan_capacity(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Blocking: probe every endpoint of a load test spec at a low rate and size the run for the
+    spec's targetRps. Endpoints are weighted like the generated tasks, and the service times
+    are measured unloaded, so the plan is a lower bound when latency grows under load.
+    """
+    target_rps = spec.get("targetRps")
+    if not target_rps:
+        raise ValueError("Capacity planning requires a targetRps")
+    target_url = spec.get("targetUrl", "http://localhost:8000")
+    endpoints = sorted(spec.get("endpoints") or [], key=lambda e: e.get("weight", 1), reverse=True)
+    if not endpoints:
+        raise ValueError("Capacity planning requires at least one endpoint")
+    probed = endpoints[:MAX_PROBED_ENDPOINTS]
+
+    row = None
+    if spec.get("dataFile"):
+        row = DataFeeder(spec["dataFile"]["path"]).row(0)
+
+    with ThreadPoolExecutor(max_workers=min(PROBE_CONCURRENCY, len(probed))) as executor:
+        results = list(executor.map(lambda endpoint: probe_endpoint(target_url, endpoint, row), probed))
+
+    measured = [result for result in results if "mean_service_time" in result]
+    if not measured:
+        raise ValueError(f"Probe failed for every endpoint: {results[0].get('error')}")
+    total_weight = sum(result["weight"] for result in measured)
+    service_time = sum(result["mean_service_time"] * result["weight"] for result in measured) / total_weight
+
+    think_min, think_max = think_time_range(spec)
+    think_time = (think_min + think_max) / 2
+    plan = size_for_throughput(float(target_rps), service_time, think_time, spec.get("runTime", "30s"))
+    for result in results:
+        if "error" in result:
+            plan["warnings"].append(f"Probe of {result['method']} {result['name']} failed: {result['error']}")
+    if len(endpoints) > len(probed):
+        plan["warnings"].append(f"Only the {len(probed)} most heavily weighted of {len(endpoints)} endpoints were probed")
+    for warning in plan["warnings"]:
+        logger.warning(warning)
+
+    plan.update({
+        "target_rps": target_rps,
+        "service_time": round(service_time, 4),
+        "think_time": think_time,
+        "endpoints": results
+    })
+    return plan
+
+
+def apply_plan(config: Dict[str, Any], plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Set a run config's users, spawn rate and processes from a capacity plan"""
+    config["users"] = plan["users"]
+    config["spawn_rate"] = plan["spawn_rate"]
+    if plan.get("processes"):
+        config["processes"] = plan["processes"]
+    config["sizing"] = {key: value for key, value in plan.items() if key != "endpoints"}
+    return config
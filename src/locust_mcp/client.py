@@ -0,0 +1,413 @@
+# Python client for the MCP server. AsyncMCPClient keeps one WebSocket connection open,
+# sends every request with a requestId and matches replies to requests as they arrive, so
+# any number of requests can be in flight at once; MCPClient wraps it for synchronous code.
+import asyncio
+import itertools
+import json
+import logging
+import threading
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+import websockets
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_URI = "ws://127.0.0.1:8000/mcp"
+# Requests in flight before new ones wait, matching the server's default per-connection limit
+DEFAULT_MAX_IN_FLIGHT = 256
+# Seconds between pings on an idle connection; the server drops connections idle for 60s
+KEEPALIVE_INTERVAL = 30
+# Seconds to keep retrying a connection before giving up
+CONNECT_TIMEOUT = 30
+
+_END = object()
+
+
+class MCPError(Exception):
+    """An error returned by the server for a request"""
+
+    def __init__(self, command: str, message: str):
+        super().__init__(f"{command}: {message}")
+        self.command = command
+        self.message = message
+
+
+class RequestStream:
+    """
+    A request whose intermediate messages (run events, batch progress) are read with
+    `async for`; iteration ends when the reply arrives, which result() returns.
+    """
+
+    def __init__(self, command: str):
+        self.command = command
+        self._events: asyncio.Queue = asyncio.Queue()
+        self._reply: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def _event(self, message: Dict[str, Any]):
+        self._events.put_nowait(message)
+
+    def _finish(self, message: Optional[Dict[str, Any]] = None, error: Optional[BaseException] = None):
+        if self._reply.done():
+            return
+        if error is not None:
+            self._reply.set_exception(error)
+        elif message.get("error"):
+            self._reply.set_exception(MCPError(self.command, message["error"]))
+        else:
+            self._reply.set_result(message.get("result") or {})
+        self._events.put_nowait(_END)
+
+    def __aiter__(self) -> "RequestStream":
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        event = await self._events.get()
+        if event is _END:
+            raise StopAsyncIteration
+        return event
+
+    async def result(self) -> Dict[str, Any]:
+        """The request's result; raises MCPError if the server returned an error"""
+        return await asyncio.shield(self._reply)
+
+
+class AsyncMCPClient:
+    """
+    Asynchronous client for the MCP server over one persistent WebSocket connection.
+
+    Requests are pipelined: each one is sent with its own requestId without waiting for
+    earlier replies, and up to max_in_flight are outstanding at once. If the connection
+    drops, requests in flight fail with ConnectionError (runs and generations are not
+    safely repeatable) and the next request reconnects.
+
+        async with AsyncMCPClient() as client:
+            tests = await asyncio.gather(*(client.generate(prompt) for prompt in prompts))
+            results = await asyncio.gather(*(client.run(test["test_id"]) for test in tests))
+    """
+
+    def __init__(self, uri: str = DEFAULT_URI, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                 reconnect: bool = True, connect_timeout: float = CONNECT_TIMEOUT,
+                 keepalive_interval: float = KEEPALIVE_INTERVAL):
+        self.uri = uri
+        self.reconnect = reconnect
+        self.connect_timeout = connect_timeout
+        self.keepalive_interval = keepalive_interval
+        self.max_in_flight = max_in_flight
+        self._connection = None
+        self._tasks: List[asyncio.Task] = []
+        self._pending: Dict[str, RequestStream] = {}
+        # Subscriptions to runs in progress by run ID; their messages carry a runId, not a requestId
+        self._subscriptions: Dict[str, RequestStream] = {}
+        self._ids = itertools.count(1)
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._closed = False
+
+    async def __aenter__(self) -> "AsyncMCPClient":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    @property
+    def connected(self) -> bool:
+        return self._connection is not None
+
+    async def connect(self):
+        """Connect if not connected, retrying with backoff for up to connect_timeout seconds"""
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+        async with self._connect_lock:
+            if self._connection is not None:
+                return
+            if self._closed:
+                raise ConnectionError("Client is closed")
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.connect_timeout
+            delay = 0.1
+            while True:
+                try:
+                    # Replies with full run statistics can exceed the default 1 MiB limit
+                    self._connection = await websockets.connect(self.uri, max_size=None)
+                    break
+                except (OSError, websockets.WebSocketException) as e:
+                    if not self.reconnect or loop.time() + delay > deadline:
+                        raise ConnectionError(f"Could not connect to {self.uri}: {e}") from e
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 5.0)
+            connection = self._connection
+            self._tasks = [
+                asyncio.create_task(self._read(connection)),
+                asyncio.create_task(self._keepalive(connection))
+            ]
+            logger.debug(f"Connected to {self.uri}")
+
+    async def close(self):
+        self._closed = True
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            await connection.close()
+        for task in self._tasks:
+            task.cancel()
+        self._fail_pending(ConnectionError("Client closed"))
+
+    def _fail_pending(self, error: Exception):
+        pending, self._pending = self._pending, {}
+        subscriptions, self._subscriptions = self._subscriptions, {}
+        for stream in [*pending.values(), *subscriptions.values()]:
+            stream._finish(error=error)
+
+    async def _read(self, connection):
+        """Route every message from the server to the request it belongs to"""
+        try:
+            async for raw in connection:
+                message = json.loads(raw)
+                if message.get("type") == "heartbeat":
+                    continue
+                if message.get("requestId") is None and message.get("runId") is not None:
+                    # Messages already on their way after an unsubscribe are dropped
+                    subscription = self._subscriptions.get(message["runId"])
+                    if subscription is not None and message.get("event") == "result":
+                        del self._subscriptions[message["runId"]]
+                        subscription._finish({"result": message["result"]})
+                    elif subscription is not None and message.get("event") == "unsubscribed":
+                        # The server ended the subscription, e.g. for falling too far behind
+                        del self._subscriptions[message["runId"]]
+                        subscription._finish({"error": message.get("reason") or "Unsubscribed by the server"})
+                    elif subscription is not None:
+                        subscription._event(message)
+                    continue
+                stream = self._pending.get(message.get("requestId"))
+                if stream is None:
+                    logger.warning(f"Message for no pending request: {str(message)[:200]}")
+                elif message.get("type") in (None, "response"):
+                    del self._pending[message["requestId"]]
+                    stream._finish(message)
+                else:
+                    stream._event(message)
+        except websockets.ConnectionClosed:
+            pass
+        except Exception as e:
+            logger.error(f"Error reading from {self.uri}: {e}")
+        finally:
+            if self._connection is connection:
+                self._connection = None
+                self._fail_pending(ConnectionError(f"Connection to {self.uri} lost"))
+                await connection.close()
+
+    async def _keepalive(self, connection):
+        while True:
+            await asyncio.sleep(self.keepalive_interval)
+            if self._connection is not connection:
+                return
+            if not self._pending:
+                try:
+                    await self.request("ping")
+                except (ConnectionError, MCPError) as e:
+                    logger.debug(f"Keepalive ping failed: {e}")
+
+    async def stream(self, command: str, params: Optional[Dict[str, Any]] = None) -> RequestStream:
+        """Send a request and return it as a stream of its intermediate messages"""
+        await self.connect()
+        await self._slots.acquire()
+        request_id = str(next(self._ids))
+        stream = RequestStream(command)
+        stream._reply.add_done_callback(lambda _: self._slots.release())
+        self._pending[request_id] = stream
+        try:
+            await self._connection.send(json.dumps({"command": command, "params": params or {}, "requestId": request_id}))
+        except (AttributeError, websockets.WebSocketException) as e:
+            self._pending.pop(request_id, None)
+            stream._finish(error=ConnectionError(f"Could not send {command} request: {e}"))
+        return stream
+
+    async def request(self, command: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Send a request and return its result; raises MCPError if the server returned an error"""
+        stream = await self.stream(command, params)
+        return await stream.result()
+
+    async def batch(self, requests: Iterable[Tuple[str, Dict[str, Any]]],
+                    return_exceptions: bool = False) -> List[Any]:
+        """Send (command, params) requests all at once and return their results in order"""
+        return await asyncio.gather(*(self.request(command, params) for command, params in requests),
+                                    return_exceptions=return_exceptions)
+
+    async def generate(self, prompt: Optional[str] = None, **spec) -> Dict[str, Any]:
+        """Generate and save a test from a prompt or from spec fields (targetUrl, endpoints, ...)"""
+        return await self.request("generate", {"prompt": prompt} if prompt is not None else spec)
+
+    def _run_params(self, test_id: Optional[str], script: Optional[str], config: Optional[Dict[str, Any]],
+                    runner: Optional[str], seed: Optional[int]) -> Dict[str, Any]:
+        if test_id is not None:
+            params = {"test_id": test_id}
+        elif script is not None:
+            params = {"script": script, "config": config or {}}
+        else:
+            raise ValueError("run requires a test_id or a script")
+        if runner is not None:
+            params["runner"] = runner
+        if seed is not None:
+            params["seed"] = seed
+        return params
+
+    async def run(self, test_id: Optional[str] = None, script: Optional[str] = None,
+                  config: Optional[Dict[str, Any]] = None, runner: Optional[str] = None,
+                  seed: Optional[int] = None) -> Dict[str, Any]:
+        """Run a saved test by ID, or a script with its config, and return the results"""
+        return await self.request("run", self._run_params(test_id, script, config, runner, seed))
+
+    async def stream_run(self, test_id: Optional[str] = None, script: Optional[str] = None,
+                         config: Optional[Dict[str, Any]] = None, runner: Optional[str] = None,
+                         seed: Optional[int] = None) -> RequestStream:
+        """
+        Start a run whose milestones and per-second stats are streamed: iterate over the
+        returned stream for "event" messages, then await its result().
+        """
+        return await self.stream("run", {**self._run_params(test_id, script, config, runner, seed), "stream": True})
+
+    async def subscribe(self, run_id: str) -> RequestStream:
+        """
+        Follow a run in progress, whoever started it: iterate over the returned stream for a
+        snapshot of the run so far and then its events, and await result() for its result.
+        result() raises MCPError if the server ends the subscription for falling behind.
+        """
+        if run_id in self._subscriptions:
+            raise ValueError(f"Already subscribed to run {run_id}")
+        await self.connect()
+        # Registered first: the snapshot may arrive before the reply to the subscribe request
+        stream = RequestStream("subscribe")
+        self._subscriptions[run_id] = stream
+        try:
+            await self.request("subscribe", {"run_id": run_id})
+        except Exception:
+            self._subscriptions.pop(run_id, None)
+            raise
+        return stream
+
+    async def unsubscribe(self, run_id: str) -> bool:
+        """Stop following a run; its stream ends with an empty result"""
+        stream = self._subscriptions.pop(run_id, None)
+        if stream is not None:
+            stream._finish({"result": {}})
+        return (await self.request("unsubscribe", {"run_id": run_id}))["unsubscribed"]
+
+    async def live_runs(self) -> List[Dict[str, Any]]:
+        """The runs in progress on the server"""
+        return (await self.request("live_runs"))["runs"]
+
+    async def list_tests(self) -> List[Dict[str, Any]]:
+        return (await self.request("list"))["tests"]
+
+    async def runs(self, test_id: str) -> Dict[str, Any]:
+        return (await self.request("runs", {"test_id": test_id}))["runs"]
+
+    async def parse_prompts(self, prompts: List[str]) -> List[Dict[str, Any]]:
+        return (await self.request("parse_prompts", {"prompts": prompts}))["specs"]
+
+    async def plan(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        return await self.request("plan", spec)
+
+    async def compact(self, **policy) -> Dict[str, Any]:
+        return await self.request("compact", policy)
+
+    async def stop(self, run_id: Optional[str] = None) -> Dict[str, Any]:
+        return await self.request("stop", {"run_id": run_id} if run_id else {})
+
+
+class MCPClient:
+    """
+    Synchronous wrapper around AsyncMCPClient, running it on an event loop in a background
+    thread. batch() pipelines many requests from synchronous code.
+    """
+
+    def __init__(self, uri: str = DEFAULT_URI, **options):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="mcp-client", daemon=True)
+        self._thread.start()
+        self._client = AsyncMCPClient(uri, **options)
+
+    def __enter__(self) -> "MCPClient":
+        self._call(self._client.connect())
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def close(self):
+        if self._loop.is_closed():
+            return
+        self._call(self._client.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def request(self, command: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return self._call(self._client.request(command, params))
+
+    def batch(self, requests: Iterable[Tuple[str, Dict[str, Any]]], return_exceptions: bool = False) -> List[Any]:
+        return self._call(self._client.batch(list(requests), return_exceptions))
+
+    def generate(self, prompt: Optional[str] = None, **spec) -> Dict[str, Any]:
+        return self._call(self._client.generate(prompt, **spec))
+
+    def run(self, test_id: Optional[str] = None, script: Optional[str] = None,
+            config: Optional[Dict[str, Any]] = None, runner: Optional[str] = None,
+            seed: Optional[int] = None) -> Dict[str, Any]:
+        return self._call(self._client.run(test_id, script, config, runner, seed))
+
+    def stream_run(self, test_id: Optional[str] = None, script: Optional[str] = None,
+                   config: Optional[Dict[str, Any]] = None, runner: Optional[str] = None,
+                   seed: Optional[int] = None) -> "SyncRequestStream":
+        """Start a streamed run: iterate over the returned stream for its events, then call result()"""
+        return SyncRequestStream(self, self._call(self._client.stream_run(test_id, script, config, runner, seed)))
+
+    def subscribe(self, run_id: str) -> "SyncRequestStream":
+        """Follow a run in progress: iterate over the returned stream for its events, then call result()"""
+        return SyncRequestStream(self, self._call(self._client.subscribe(run_id)))
+
+    def unsubscribe(self, run_id: str) -> bool:
+        return self._call(self._client.unsubscribe(run_id))
+
+    def live_runs(self) -> List[Dict[str, Any]]:
+        return self._call(self._client.live_runs())
+
+    def list_tests(self) -> List[Dict[str, Any]]:
+        return self._call(self._client.list_tests())
+
+    def runs(self, test_id: str) -> Dict[str, Any]:
+        return self._call(self._client.runs(test_id))
+
+    def parse_prompts(self, prompts: List[str]) -> List[Dict[str, Any]]:
+        return self._call(self._client.parse_prompts(prompts))
+
+    def plan(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        return self._call(self._client.plan(spec))
+
+    def compact(self, **policy) -> Dict[str, Any]:
+        return self._call(self._client.compact(**policy))
+
+    def stop(self, run_id: Optional[str] = None) -> Dict[str, Any]:
+        return self._call(self._client.stop(run_id))
+
+
+class SyncRequestStream:
+    """A RequestStream read from synchronous code"""
+
+    def __init__(self, client: MCPClient, stream: RequestStream):
+        self._client = client
+        self._stream = stream
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        while True:
+            try:
+                yield self._client._call(self._stream.__anext__())
+            except StopAsyncIteration:
+                return
+
+    def result(self) -> Dict[str, Any]:
+        return self._client._call(self._stream.result())
@@ -0,0 +1,286 @@
+# Connection lifecycle modes and per-request connection timing for generated scripts.
+# use_connections() gives a user's HttpSession its connection mode: "keepalive" reuses each
+# user's connections, "close" opens a new connection for every request, and "pool" shares
+# pool_size connections per host between all users of a process, with at most pool_size
+# requests in flight and the others waiting for one of them to finish. With
+# timing on, the urllib3 connections note when they resolved, connected, finished the TLS
+# handshake and received the response headers, and ConnectionTimings turns that into
+# per-endpoint distributions of each phase. urllib3 is only imported inside use_connections,
+# so the MCP server can use ConnectionTimings, and scripts import Locust first.
+import socket
+import time
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+CONNECTION_MODES = ("keepalive", "close", "pool")
+DEFAULT_POOL_SIZE = 10
+# Request phases, in order: waiting for a connection (request preparation and, in pool
+# mode, a free pooled connection), DNS lookup, TCP connect, TLS handshake, time to the
+# response headers, and reading the body
+PHASES = ("wait", "dns", "connect", "tls", "ttfb", "transfer")
+PERCENTILES = (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))
+
+# Pool managers and request slots shared by the users of a process in "pool" mode, by pool size and timing
+_pools: Dict[Tuple[int, bool], Tuple[Any, Any]] = {}
+
+
+def bucket(ms: float) -> float:
+    """Histogram bucket of a duration: two significant digits, so sub-millisecond phases stay apart"""
+    return float(f"{ms:.2g}") if ms > 0 else 0.0
+
+
+def _timed_pool_classes() -> Dict[str, Any]:
+    """urllib3 connection pools whose connections record their phase times"""
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+    from urllib3.util.connection import allowed_gai_family
+
+    class TimedConnection:
+        def _new_conn(self):
+            self._timing = timing = {"connect_start": time.time()}
+            try:
+                address = socket.getaddrinfo(self._dns_host, self.port, allowed_gai_family(), socket.SOCK_STREAM)[0][4][0]
+            except OSError:
+                # Fails again in urllib3's own lookup, raising its usual error
+                return super()._new_conn()
+            timing["resolved"] = time.time()
+            host = self._dns_host
+            self._dns_host = address
+            try:
+                sock = super()._new_conn()
+            finally:
+                self._dns_host = host
+            timing["connected"] = time.time()
+            return sock
+
+        def request(self, *args, **kwargs):
+            # Plain HTTP connections connect lazily, inside request()
+            self._request_sent = time.time()
+            return super().request(*args, **kwargs)
+
+        def getresponse(self):
+            response = super().getresponse()
+            timing = getattr(self, "_timing", None) or {}
+            self._timing = None
+            response.connection_timing = {**timing, "sent": self._request_sent, "headers": time.time()}
+            return response
+
+    class TimedHTTPConnection(TimedConnection, HTTPConnection):
+        pass
+
+    class TimedHTTPSConnection(TimedConnection, HTTPSConnection):
+        def connect(self):
+            super().connect()
+            self._timing["handshaken"] = time.time()
+
+    class TimedHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = TimedHTTPConnection
+
+    class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = TimedHTTPSConnection
+
+    return {"http": TimedHTTPConnectionPool, "https": TimedHTTPSConnectionPool}
+
+
+def _pool_manager(pool_size: int, timing: bool):
+    from urllib3 import PoolManager
+
+    manager = PoolManager(num_pools=DEFAULT_POOL_SIZE, maxsize=pool_size)
+    if timing:
+        manager.pool_classes_by_scheme = _timed_pool_classes()
+    return manager
+
+
+@lru_cache(maxsize=None)
+def _slot_adapter_class():
+    """
+    An adapter that sends a request only while holding one of its slots, so a pool never
+    needs more connections than there are slots. Unlike a blocking urllib3 pool, waiting for
+    a slot is safe to interrupt when Locust kills its users.
+    """
+    from locust.clients import LocustHttpAdapter
+
+    class SlotAdapter(LocustHttpAdapter):
+        def __init__(self, pool_manager, slots):
+            self.slots = slots
+            super().__init__(pool_manager)
+
+        def send(self, request, stream=False, **kwargs):
+            with self.slots:
+                response = super().send(request, stream=stream, **kwargs)
+                if not stream:
+                    # Read the body, which returns the connection to the pool, before giving up the slot
+                    response.content
+            return response
+
+    return SlotAdapter
+
+
+def use_connections(client, mode: str = "keepalive", pool_size: int = DEFAULT_POOL_SIZE, timing: bool = False,
+                    verify: Union[bool, str] = True):
+    """
+    Set the connection mode of a user's HttpSession, turn on connection timing, and set how
+    TLS certificates are verified: verify is False, or a CA bundle such as a test server's
+    self-signed certificate
+    """
+    import threading
+    from locust.clients import LocustHttpAdapter
+
+    if mode not in CONNECTION_MODES:
+        raise ValueError(f"Unknown connection mode: {mode}; expected one of {', '.join(CONNECTION_MODES)}")
+    adapter = None
+    if mode == "pool":
+        key = (pool_size, timing)
+        if key not in _pools:
+            # threading is monkey-patched by Locust, so this is a gevent semaphore
+            _pools[key] = (_pool_manager(pool_size, timing), threading.BoundedSemaphore(pool_size))
+        adapter = _slot_adapter_class()(*_pools[key])
+    elif timing:
+        adapter = LocustHttpAdapter(pool_manager=_pool_manager(DEFAULT_POOL_SIZE, True))
+    if adapter is not None:
+        client.mount("https://", adapter)
+        client.mount("http://", adapter)
+    if verify is not True:
+        client.verify = verify
+    if mode == "close":
+        # The server closes the connection after responding, so every request opens a new one
+        client.headers["Connection"] = "close"
+
+
+def request_phases(timing: Dict[str, float], start_time: float, response_time: float) -> Dict[str, float]:
+    """
+    Milliseconds spent in each phase of a request, from the times its connection noted and
+    the start time and response time of Locust's request event. Requests on a reused
+    connection have no dns, connect or tls phase.
+    """
+    sent = timing["sent"]
+    phases = {}
+    start = min(sent, timing.get("connect_start", sent))
+    if "resolved" in timing:
+        phases["dns"] = timing["resolved"] - timing["connect_start"]
+    if "connected" in timing:
+        phases["connect"] = timing["connected"] - timing["resolved"]
+        sent = max(sent, timing["connected"])
+    if "handshaken" in timing:
+        phases["tls"] = timing["handshaken"] - timing["connected"]
+        sent = max(sent, timing["handshaken"])
+    phases["wait"] = start - start_time
+    phases["ttfb"] = timing["headers"] - sent
+    phases["transfer"] = start_time + response_time / 1000 - timing["headers"]
+    return {phase: max(0.0, seconds * 1000) for phase, seconds in phases.items()}
+
+
+class ConnectionTimings:
+    """
+    Per-endpoint distributions of the request phases of a run, or of one of its processes,
+    as histograms of {bucketed ms: count} like Locust's response times
+    """
+
+    def __init__(self):
+        self.endpoints: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        # Counts reported by the last delta(), per endpoint
+        self._reported: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    def _endpoint(self, name: str, method: str) -> Dict[str, Any]:
+        endpoint = self.endpoints.get((name, method))
+        if endpoint is None:
+            endpoint = self.endpoints[(name, method)] = {
+                "name": name, "method": method, "requests": 0, "new_connections": 0,
+                "phases": {phase: {"count": 0, "total": 0.0, "min": None, "max": None, "histogram": {}} for phase in PHASES}
+            }
+        return endpoint
+
+    def record(self, method: str, name: str, response: Any, start_time: Optional[float], response_time: float) -> bool:
+        """Record the phases of one request from Locust's request event; False if its connection wasn't timed"""
+        timing = getattr(getattr(response, "raw", None), "connection_timing", None)
+        if timing is None or start_time is None:
+            return False
+        endpoint = self._endpoint(name, method)
+        endpoint["requests"] += 1
+        if "connect_start" in timing:
+            endpoint["new_connections"] += 1
+        for phase, ms in request_phases(timing, start_time, response_time).items():
+            stats = endpoint["phases"][phase]
+            stats["count"] += 1
+            stats["total"] += ms
+            stats["min"] = ms if stats["min"] is None else min(stats["min"], ms)
+            stats["max"] = ms if stats["max"] is None else max(stats["max"], ms)
+            key = bucket(ms)
+            stats["histogram"][key] = stats["histogram"].get(key, 0) + 1
+        return True
+
+    def delta(self) -> List[Dict[str, Any]]:
+        """The endpoints with requests since the last call, and their phases since then"""
+        deltas = []
+        for key, endpoint in self.endpoints.items():
+            last = self._reported.get(key)
+            if last is not None and last["requests"] == endpoint["requests"]:
+                continue
+            last_phases = last["phases"] if last is not None else {}
+            phases = {}
+            for phase, stats in endpoint["phases"].items():
+                previous = last_phases.get(phase) or {"count": 0, "total": 0.0, "histogram": {}}
+                if stats["count"] == previous["count"]:
+                    continue
+                phases[phase] = {
+                    "count": stats["count"] - previous["count"],
+                    "total": stats["total"] - previous["total"],
+                    "min": stats["min"],
+                    "max": stats["max"],
+                    "histogram": {value: count - previous["histogram"].get(value, 0)
+                                  for value, count in stats["histogram"].items()
+                                  if count != previous["histogram"].get(value, 0)}
+                }
+            deltas.append({
+                "name": endpoint["name"], "method": endpoint["method"],
+                "requests": endpoint["requests"] - (last["requests"] if last is not None else 0),
+                "new_connections": endpoint["new_connections"] - (last["new_connections"] if last is not None else 0),
+                "phases": phases
+            })
+            self._reported[key] = {
+                "requests": endpoint["requests"], "new_connections": endpoint["new_connections"],
+                "phases": {phase: {"count": stats["count"], "total": stats["total"], "histogram": dict(stats["histogram"])}
+                           for phase, stats in endpoint["phases"].items()}
+            }
+        return deltas
+
+    def merge(self, deltas: Iterable[Dict[str, Any]]):
+        """Add endpoints reported by delta(), e.g. by the processes of a run"""
+        for delta in deltas:
+            endpoint = self._endpoint(delta["name"], delta["method"])
+            endpoint["requests"] += delta["requests"]
+            endpoint["new_connections"] += delta["new_connections"]
+            for phase, added in delta["phases"].items():
+                stats = endpoint["phases"][phase]
+                stats["count"] += added["count"]
+                stats["total"] += added["total"]
+                if added["min"] is not None and (stats["min"] is None or added["min"] < stats["min"]):
+                    stats["min"] = added["min"]
+                if added["max"] is not None and (stats["max"] is None or added["max"] > stats["max"]):
+                    stats["max"] = added["max"]
+                for value, count in added["histogram"].items():
+                    # Keys are strings once an event has been through JSON
+                    value = float(value)
+                    stats["histogram"][value] = stats["histogram"].get(value, 0) + count
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Per endpoint, the request and new connection counts and each phase's distribution in ms"""
+        # windowed_stats imports the script generator, which imports this module
+        from locust_mcp.windowed_stats import percentile
+
+        summary = []
+        for endpoint in self.endpoints.values():
+            phases = {}
+            for phase, stats in endpoint["phases"].items():
+                if not stats["count"]:
+                    continue
+                phases[phase] = {
+                    "count": stats["count"],
+                    "avg": round(stats["total"] / stats["count"], 3),
+                    "min": round(stats["min"], 3),
+                    "max": round(stats["max"], 3),
+                    **{name: percentile(stats["histogram"], stats["count"], percent) for name, percent in PERCENTILES}
+                }
+            summary.append({"name": endpoint["name"], "method": endpoint["method"], "requests": endpoint["requests"],
+                            "new_connections": endpoint["new_connections"], "phases": phases})
+        return summary
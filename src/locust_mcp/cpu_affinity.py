@@ -0,0 +1,289 @@
+# CPU placement of the server and the load generator processes. The server keeps its event
+# loop on reserved cores; every run leases a disjoint set of the remaining cores, so runs
+# on one machine don't compete for CPU time with each other or with the server. Processes
+# are confined to their cores with sched_setaffinity, or with a cgroup v2 cpuset when a
+# delegated cgroup is configured. Processes the server starts inherit its cores, so those
+# that are not runs are given all cores back. Linux only; elsewhere pinning is off.
+import logging
+import os
+import threading
+from typing import Dict, Any, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PINNING_MODES = ("off", "auto", "affinity", "cpuset")
+# The dedicated cores of a run, for its locust processes to pin their workers to
+CORES_ENV = "LOCUST_MCP_CPU_CORES"
+
+
+def affinity_supported() -> bool:
+    return hasattr(os, "sched_setaffinity")
+
+
+def current_cores() -> List[int]:
+    """CPU cores this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def parse_core_list(value: str) -> List[int]:
+    """Cores from a Linux CPU list such as "0-3,6"; empty for an empty string"""
+    cores = set()
+    for part in value.replace(" ", "").split(","):
+        if not part:
+            continue
+        try:
+            if "-" in part:
+                first, last = (int(bound) for bound in part.split("-", 1))
+                if first > last:
+                    raise ValueError
+                cores.update(range(first, last + 1))
+            else:
+                cores.add(int(part))
+        except ValueError:
+            raise ValueError(f"Invalid CPU list: {value!r}")
+    return sorted(cores)
+
+
+def format_core_list(cores: Iterable[int]) -> str:
+    """The Linux CPU list of cores, e.g. "0-3,6" """
+    ranges: List[List[int]] = []
+    for core in sorted(cores):
+        if ranges and core == ranges[-1][1] + 1:
+            ranges[-1][1] = core
+        else:
+            ranges.append([core, core])
+    return ",".join(str(first) if first == last else f"{first}-{last}" for first, last in ranges)
+
+
+def set_affinity(pid: int, cores: Iterable[int]) -> bool:
+    """Confine a process (0 for this one) to cores; False if that is not possible"""
+    try:
+        os.sched_setaffinity(pid, set(cores))
+        return True
+    except (AttributeError, OSError) as e:
+        logger.warning(f"Could not pin process {pid or os.getpid()} to cores {format_core_list(cores)}: {e}")
+        return False
+
+
+class CpusetGroups:
+    """
+    Per-run cgroup v2 child groups of a delegated cgroup with the cpuset controller, e.g. a
+    systemd slice with Delegate=yes. Unlike an affinity mask, a cpuset can't be widened by
+    the processes inside it.
+    """
+
+    def __init__(self, parent: str):
+        self.parent = parent
+
+    def available(self) -> bool:
+        """Whether child groups with their own cpuset can be created under the parent"""
+        control = os.path.join(self.parent, "cgroup.subtree_control")
+        try:
+            with open(control) as f:
+                if "cpuset" in f.read().split():
+                    return True
+            # Only possible while the parent has no processes of its own
+            with open(control, "w") as f:
+                f.write("+cpuset")
+            return True
+        except OSError as e:
+            logger.warning(f"cpuset controller not available in {self.parent}: {e}")
+            return False
+
+    def create(self, name: str, cores: Iterable[int]) -> Optional[str]:
+        """Create a child group limited to cores; returns its path, or None on failure"""
+        path = os.path.join(self.parent, name)
+        try:
+            os.makedirs(path, exist_ok=True)
+            with open(os.path.join(path, "cpuset.cpus"), "w") as f:
+                f.write(format_core_list(cores))
+            return path
+        except OSError as e:
+            logger.warning(f"Could not create cgroup {path}: {e}")
+            self.remove(path)
+            return None
+
+    @staticmethod
+    def add(path: str, pid: int) -> bool:
+        try:
+            with open(os.path.join(path, "cgroup.procs"), "w") as f:
+                f.write(str(pid))
+            return True
+        except OSError as e:
+            logger.warning(f"Could not move process {pid} into cgroup {path}: {e}")
+            return False
+
+    @staticmethod
+    def remove(path: str):
+        """Remove a child group; it must have no processes left"""
+        try:
+            os.rmdir(path)
+        except OSError as e:
+            if os.path.isdir(path):
+                logger.warning(f"Could not remove cgroup {path}: {e}")
+
+
+class CoreLease:
+    """The cores leased to one run, and how its processes are confined to them"""
+
+    def __init__(self, allocator: "CoreAllocator", cores: List[int], shared: bool):
+        self.allocator = allocator
+        self.cores = cores
+        # Too few free cores: the run floats over all run cores, shared with other runs
+        self.shared = shared
+        self.cgroup: Optional[str] = None
+        self.method: Optional[str] = None
+
+    @property
+    def env(self) -> Dict[str, str]:
+        """Environment for locust processes; workers only pin themselves to dedicated cores"""
+        return {} if self.shared else {CORES_ENV: format_core_list(self.cores)}
+
+    def apply(self, pid: int, name: str = "", cgroup: bool = False) -> bool:
+        """
+        Confine a process, and any processes it starts later, to the leased cores. With
+        cgroup=True the process is moved into a cpuset group called name when cpusets are
+        configured; otherwise, or if that fails, its affinity mask is set.
+        """
+        groups = self.allocator.cpuset_groups
+        if cgroup and groups is not None and self.cgroup is None:
+            self.cgroup = groups.create(name, self.cores)
+        if self.cgroup is not None and CpusetGroups.add(self.cgroup, pid):
+            self.method = "cpuset"
+            return True
+        if set_affinity(pid, self.cores):
+            self.method = "affinity"
+            return True
+        return False
+
+    def layout(self, processes: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """The core layout of the run, recorded in its results"""
+        return {
+            **self.allocator.layout(),
+            "method": self.method,
+            "cores": self.cores,
+            "shared": self.shared,
+            "processes": processes or []
+        }
+
+    def release(self):
+        if self.cgroup is not None:
+            CpusetGroups.remove(self.cgroup)
+            self.cgroup = None
+        self.allocator.release(self)
+
+
+class CoreAllocator:
+    """
+    Hands out disjoint sets of cores to concurrent runs, keeping server_cores for the
+    server, by default one core per server worker process. In "auto" mode pinning is on
+    when there are at least two cores, using cpusets when cpuset_parent is given;
+    "affinity" and "cpuset" turn it on regardless.
+    """
+
+    def __init__(self, mode: str = "auto", server_cores: Optional[List[int]] = None,
+                 cpuset_parent: Optional[str] = None, cores: Optional[List[int]] = None,
+                 server_workers: int = 1):
+        if mode not in PINNING_MODES:
+            raise ValueError(f"Unknown CPU pinning mode: {mode}; expected one of {', '.join(PINNING_MODES)}")
+        self.all_cores = sorted(cores) if cores is not None else current_cores()
+        if mode == "auto":
+            mode = "off" if len(self.all_cores) < 2 else ("cpuset" if cpuset_parent else "affinity")
+        if mode != "off" and not affinity_supported():
+            logger.warning("CPU pinning is not supported on this platform; it is off")
+            mode = "off"
+        self.cpuset_groups: Optional[CpusetGroups] = None
+        if mode == "cpuset":
+            groups = CpusetGroups(cpuset_parent) if cpuset_parent else None
+            if groups is not None and groups.available():
+                self.cpuset_groups = groups
+            else:
+                logger.warning("No usable cpuset cgroup; pinning runs with affinity masks instead")
+                mode = "affinity"
+        self.mode = mode
+
+        if server_cores is None:
+            # The first core per server worker, so the workers don't share one core, as
+            # long as at least one core is left for runs
+            server_cores = self.all_cores[:min(max(1, server_workers), len(self.all_cores) - 1)]
+        unknown = set(server_cores) - set(self.all_cores)
+        if unknown:
+            raise ValueError(f"Server cores {format_core_list(unknown)} are not available to this process")
+        self.server_cores = sorted(server_cores)
+        # Runs share the server cores only if nothing else is left
+        self.run_cores = [core for core in self.all_cores if core not in self.server_cores] or self.all_cores
+        self._free = list(self.run_cores)
+        self._lock = threading.Lock()
+        # A SharedState of a multi-process server, whose workers lease cores through it
+        # instead of from their own free lists, so their runs get disjoint cores too
+        self.shared = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def pin_server(self) -> bool:
+        """Confine this process, and so the server's event loop, to the server cores"""
+        if not self.enabled or not self.server_cores:
+            return False
+        if set_affinity(0, self.server_cores):
+            logger.info(f"Server pinned to cores {format_core_list(self.server_cores)}")
+            return True
+        return False
+
+    def unpinned_cores(self) -> Optional[List[int]]:
+        """
+        Cores for processes the server starts that are not runs, e.g. the batch generation
+        pool: all of them, instead of the server cores they inherit. None when not pinned.
+        """
+        return list(self.all_cores) if self.enabled and self.server_cores else None
+
+    def acquire(self, count: int) -> Optional[CoreLease]:
+        """
+        Lease count dedicated cores, the lowest free ones; when fewer are free the run gets
+        all run cores, shared. None when pinning is off.
+        """
+        if not self.enabled:
+            return None
+        count = max(1, count)
+        with self._lock:
+            if self.shared is not None:
+                cores = self.shared.lease_cores(os.getpid(), self.run_cores, count)
+                if cores is not None:
+                    return CoreLease(self, cores, shared=False)
+                free = self.shared.free_core_count(self.run_cores)
+            elif count <= len(self._free):
+                cores, self._free = self._free[:count], self._free[count:]
+                return CoreLease(self, cores, shared=False)
+            else:
+                free = len(self._free)
+        logger.warning(f"{count} cores requested but only {free} free; the run shares cores")
+        return CoreLease(self, list(self.run_cores), shared=True)
+
+    def release(self, lease: CoreLease):
+        if lease.shared:
+            return
+        with self._lock:
+            if self.shared is not None:
+                self.shared.release_cores(lease.cores)
+            else:
+                self._free = sorted(set(self._free) | set(lease.cores))
+
+    def layout(self) -> Dict[str, Any]:
+        """The machine-wide part of a run's core layout"""
+        return {
+            "mode": self.mode,
+            "available_cores": self.all_cores,
+            "server_cores": self.server_cores
+        }
+
+
+def run_layout(allocator: Optional[CoreAllocator], lease: Optional[CoreLease],
+               processes: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """The core layout recorded with a run's results, also when it was not pinned"""
+    if lease is not None:
+        return lease.layout(processes)
+    layout = allocator.layout() if allocator is not None else {"mode": "off", "available_cores": current_cores(), "server_cores": []}
+    return {**layout, "method": None, "cores": None, "shared": True, "processes": processes or []}
@@ -0,0 +1,277 @@
+# Translation of curl command lines into the request configs the script generator renders.
+# Commands are split like a POSIX shell would (shlex), so quoting, multi-line commands and
+# the $'...' strings of browsers' "Copy as cURL" work, and options are applied with curl's
+# own semantics: the method follows from -X, the body options and -G/-I; -d bodies default
+# to form encoding; redirects are only followed with -L; and without --compressed or an
+# Accept-Encoding header the response is requested uncompressed, as curl does.
+import codecs
+import os
+import re
+import shlex
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qsl, quote_plus
+
+# Accept-Encoding curl sends with --compressed
+COMPRESSED_ENCODINGS = "deflate, gzip, br, zstd"
+FORM_CONTENT_TYPE = "application/x-www-form-urlencoded"
+# Headers the HTTP client sets itself from the request it sends
+CLIENT_MANAGED_HEADERS = {"content-length", "connection", "keep-alive", "transfer-encoding"}
+
+# Body options, and how curl treats an @file argument of each
+DATA_OPTIONS = {
+    "-d": "ascii", "--data": "ascii", "--data-ascii": "ascii",
+    "--data-binary": "binary", "--data-raw": "raw", "--data-urlencode": "urlencode", "--json": "json"
+}
+# Options that take an argument without affecting the request; skipped with it
+IGNORED_WITH_ARGUMENT = {
+    "-o", "--output", "-w", "--write-out", "-c", "--cookie-jar", "-D", "--dump-header",
+    "--connect-timeout", "--retry", "--retry-delay", "--retry-max-time", "-x", "--proxy",
+    "-U", "--proxy-user", "--cacert", "--capath", "-E", "--cert", "--key", "--cert-type",
+    "--key-type", "--resolve", "--connect-to", "-r", "--range", "-Y", "--speed-limit",
+    "-y", "--speed-time", "--limit-rate", "--max-redirs", "--interface", "--dns-servers",
+    "-K", "--config", "--stderr", "--trace", "--trace-ascii", "-z", "--time-cond",
+    "--max-filesize", "--proto", "--proto-redir", "--url-query", "-Q", "--quote"
+}
+# Short flags without an argument, for splitting combined flags such as -sSL
+SHORT_FLAGS = set("sSvLkiIGfgNnql#")
+# Short options with an argument, which may be attached as in -XPOST
+SHORT_WITH_ARGUMENT = {"-X", "-H", "-d", "-b", "-u", "-A", "-e", "-m", "-F", "-T"}
+
+ANSI_C_STRING = re.compile(r"\$'((?:[^'\\]|\\.)*)'", re.DOTALL)
+LINE_CONTINUATION = re.compile(r"\\\r?\n")
+
+
+def _ansi_c_to_quoted(match: re.Match) -> str:
+    """A bash $'...' string as an ordinary shell-quoted word"""
+    text = match.group(1).encode("latin-1", "backslashreplace")
+    return shlex.quote(codecs.decode(text, "unicode_escape"))
+
+
+def split_command(command: str) -> List[str]:
+    """Split a curl command line into words like a POSIX shell, dropping the leading curl"""
+    command = LINE_CONTINUATION.sub(" ", command.strip())
+    command = ANSI_C_STRING.sub(_ansi_c_to_quoted, command)
+    try:
+        words = shlex.split(command)
+    except ValueError as e:
+        raise ValueError(f"Invalid curl command: {e}")
+    if not words or words[0] != "curl":
+        raise ValueError("Command must start with curl")
+    return words[1:]
+
+
+def _expand_short_flags(words: List[str]) -> List[str]:
+    """Split combined short flags such as -sSL, or -sXPOST, into separate options"""
+    expanded = []
+    for word in words:
+        if len(word) > 2 and word[0] == "-" and word[1] in SHORT_FLAGS:
+            flags = word[1:]
+            while flags and flags[0] in SHORT_FLAGS:
+                expanded.append("-" + flags[0])
+                flags = flags[1:]
+            if flags:
+                expanded.append("-" + flags)
+        else:
+            expanded.append(word)
+    return expanded
+
+
+def _body_file(path: str) -> str:
+    if path == "-":
+        raise ValueError("Request bodies from stdin (@-) are not supported")
+    path = os.path.abspath(os.path.expanduser(path))
+    if not os.path.isfile(path):
+        raise ValueError(f"Body file not found: {path}")
+    return path
+
+
+def _has_header(headers: Dict[str, Optional[str]], name: str) -> bool:
+    """Whether a header is set or removed, by case-insensitive name"""
+    return any(key.lower() == name for key in headers)
+
+
+def _looks_like_url(word: str) -> bool:
+    return "://" in word or "." in word or word.startswith("localhost")
+
+
+def parse_curl(command: str) -> Dict[str, Any]:
+    """
+    Parse a curl command into its request: method, host, path, query params (as pairs,
+    so repeated keys are kept), headers, cookies, and a body given as "data" (the exact
+    body text), "data_file" (a file streamed from disk) or "form" (multipart fields and
+    files), plus auth, verify, timeout and allow_redirects. Words after the URL that are
+    not curl options, such as "with 5 users", are ignored.
+    """
+    words = _expand_short_flags(split_command(command))
+    method = None
+    url = None
+    headers: Dict[str, Optional[str]] = {}
+    cookies: Dict[str, str] = {}
+    data_parts: List[str] = []
+    data_file = None
+    form: List[Tuple[str, Dict[str, str]]] = []
+    json_body = False
+    compressed = False
+    get = False
+    head = False
+    auth = None
+    verify = True
+    timeout = None
+    follow = False
+    upload = False
+
+    def value_of(i: int) -> str:
+        if i + 1 >= len(words):
+            raise ValueError(f"Option {words[i]} requires a value")
+        return words[i + 1]
+
+    i = 0
+    while i < len(words):
+        word = words[i]
+        option, attached = word, None
+        if len(word) > 2 and word[:2] in SHORT_WITH_ARGUMENT:
+            option, attached = word[:2], word[2:]
+
+        def argument() -> str:
+            nonlocal i
+            if attached is not None:
+                return attached
+            i += 1
+            return value_of(i - 1)
+
+        if option in ("-X", "--request"):
+            method = argument().upper()
+        elif option in ("-H", "--header"):
+            header = argument()
+            name, sep, value = header.partition(":")
+            if sep and name.strip():
+                # "Name:" removes a header the client would add; None does the same in requests
+                headers[name.strip()] = value.strip() or None
+            elif header.endswith(";"):
+                # "Name;" sends the header with an empty value
+                headers[header[:-1].strip()] = ""
+        elif option in DATA_OPTIONS:
+            kind = DATA_OPTIONS[option]
+            value = argument()
+            if kind == "json":
+                json_body = True
+            if kind == "urlencode":
+                name, sep, content = value.partition("=")
+                if not sep and "@" in value:
+                    raise ValueError("--data-urlencode with a file is not supported")
+                # "=content" and "content" encode the content alone
+                data_parts.append(f"{name}={quote_plus(content)}" if name else quote_plus(content if sep else value))
+            elif value.startswith("@") and kind != "raw":
+                if data_parts or data_file:
+                    raise ValueError("A file body can't be combined with other body options")
+                data_file = _body_file(value[1:])
+            else:
+                data_parts.append(value)
+        elif option in ("-F", "--form", "--form-string"):
+            name, sep, value = argument().partition("=")
+            if not sep:
+                raise ValueError(f"Invalid form field: {name}")
+            if option != "--form-string" and value.startswith("@"):
+                path = value[1:].split(";", 1)[0]
+                form.append((name, {"file": _body_file(path)}))
+            elif option != "--form-string" and value.startswith("<"):
+                form.append((name, {"content": _body_file(value[1:])}))
+            else:
+                form.append((name, {"value": value}))
+        elif option in ("-T", "--upload-file"):
+            if data_parts or data_file:
+                raise ValueError("A file body can't be combined with other body options")
+            data_file = _body_file(argument())
+            upload = True
+        elif option in ("-b", "--cookie"):
+            value = argument()
+            if "=" not in value:
+                raise ValueError(f"Cookie files are not supported: {value}")
+            for pair in value.split(";"):
+                name, sep, cookie = pair.strip().partition("=")
+                if sep:
+                    cookies[name] = cookie
+        elif option in ("-u", "--user"):
+            user, _, password = argument().partition(":")
+            auth = [user, password]
+        elif option in ("-A", "--user-agent"):
+            headers["User-Agent"] = argument()
+        elif option in ("-e", "--referer"):
+            headers["Referer"] = argument()
+        elif option in ("-m", "--max-time"):
+            timeout = float(argument())
+        elif option == "--url":
+            url = argument()
+        elif option == "--compressed":
+            compressed = True
+        elif option in ("-G", "--get"):
+            get = True
+        elif option in ("-I", "--head"):
+            head = True
+        elif option in ("-k", "--insecure"):
+            verify = False
+        elif option in ("-L", "--location"):
+            follow = True
+        elif option in IGNORED_WITH_ARGUMENT:
+            argument()
+        elif word.startswith("-") and len(word) > 1:
+            # Flags that don't change the request: -s, -v, -i, --http2, ...
+            pass
+        elif url is None and _looks_like_url(word):
+            url = word
+        i += 1
+
+    if url is None:
+        raise ValueError("No valid URL found in curl command")
+    if "://" not in url:
+        url = "http://" + url
+    parsed_url = urlparse(url)
+    if parsed_url.scheme not in ("http", "https") or not parsed_url.netloc:
+        raise ValueError(f"Unsupported URL in curl command: {url}")
+    query_params = parse_qsl(parsed_url.query, keep_blank_values=True)
+
+    data = "&".join(data_parts) if data_parts else None
+    if get and data is not None:
+        # -G sends the body options as the query string
+        query_params.extend(parse_qsl(data, keep_blank_values=True))
+        data = None
+    if form and (data is not None or data_file):
+        raise ValueError("-F can't be combined with -d or a file body")
+
+    if method is None:
+        if head:
+            method = "HEAD"
+        elif upload:
+            method = "PUT"
+        elif data is not None or data_file or form:
+            method = "POST"
+        else:
+            method = "GET"
+
+    # Content types curl adds for its body options, unless one was given
+    if not _has_header(headers, "content-type"):
+        if json_body:
+            headers["Content-Type"] = "application/json"
+        elif (data is not None or data_file) and not upload:
+            headers["Content-Type"] = FORM_CONTENT_TYPE
+    if json_body and not _has_header(headers, "accept"):
+        headers["Accept"] = "application/json"
+    if not _has_header(headers, "accept-encoding"):
+        headers["Accept-Encoding"] = COMPRESSED_ENCODINGS if compressed else "identity"
+    headers = {key: value for key, value in headers.items() if key.lower() not in CLIENT_MANAGED_HEADERS}
+
+    return {
+        "method": method,
+        "host": f"{parsed_url.scheme}://{parsed_url.netloc}",
+        "path": parsed_url.path or "/",
+        "query_params": query_params,
+        "headers": headers,
+        "cookies": cookies,
+        "data": data,
+        "data_file": data_file,
+        "form": form,
+        "auth": auth,
+        "verify": verify,
+        "timeout": timeout,
+        "allow_redirects": follow
+    }
@@ -0,0 +1,176 @@
+import csv
+import hashlib
+import json
+import logging
+import mmap
+import os
+import random
+import tempfile
+from array import array
+from typing import Dict, Any, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: cursors are kept per process instead
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+FEEDER_MODES = ("sequential", "random", "unique")
+INDEX_DIR = os.path.join(tempfile.gettempdir(), "locust-mcp-feeders")
+# Environment variable set by LocustTestRunner so all worker processes of a run share one cursor
+RUN_ID_ENV = "LOCUST_MCP_RUN_ID"
+INDEX_FLUSH_ROWS = 1 << 20
+
+
+def _index_path(path: str) -> str:
+    """Index location for a data file, keyed by path, size and modification time"""
+    stat = os.stat(path)
+    key = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return os.path.join(INDEX_DIR, hashlib.sha1(key.encode()).hexdigest() + ".idx")
+
+
+def build_index(path: str) -> str:
+    """
+    Build (or reuse) the row offset index of a CSV or JSONL data file and return its path.
+    The index is an array of native uint64 row start offsets followed by the end
+    offset of the last row, written in batches so that memory stays bounded.
+    """
+    index_path = _index_path(path)
+    if os.path.exists(index_path):
+        return index_path
+
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    is_csv = not path.lower().endswith((".jsonl", ".ndjson"))
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    offsets = array("Q")
+    offset = 0
+    with open(path, "rb") as data, open(tmp_path, "wb") as index:
+        if is_csv:
+            # The header line is not a row
+            offset += len(data.readline())
+        for line in data:
+            if line.strip():
+                offsets.append(offset)
+                if len(offsets) >= INDEX_FLUSH_ROWS:
+                    offsets.tofile(index)
+                    offsets = array("Q")
+            offset += len(line)
+        offsets.append(offset)
+        offsets.tofile(index)
+
+    # Several processes may race to build the same index; the rename makes that harmless
+    os.replace(tmp_path, index_path)
+    logger.info(f"Built data feeder index for {path}: {index_path}")
+    return index_path
+
+
+class _SharedCursor:
+    """Row counter shared by every process of a run through a locked, memory-mapped file"""
+
+    def __init__(self, path: str):
+        self._file = open(path, "a+b")
+        if os.fstat(self._file.fileno()).st_size < 8:
+            self._file.write(b"\0" * 8)
+            self._file.flush()
+        self._map = mmap.mmap(self._file.fileno(), 8)
+
+    def next(self) -> int:
+        fcntl.lockf(self._file, fcntl.LOCK_EX)
+        try:
+            value = int.from_bytes(self._map[:8], "little")
+            self._map[:8] = (value + 1).to_bytes(8, "little")
+        finally:
+            fcntl.lockf(self._file, fcntl.LOCK_UN)
+        return value
+
+
+class _LocalCursor:
+    def __init__(self):
+        self._value = 0
+
+    def next(self) -> int:
+        value = self._value
+        self._value += 1
+        return value
+
+
+class DataFeeder:
+    """
+    Serves rows of a CSV or JSONL data file to virtual users.
+
+    The data file and its offset index are memory-mapped rather than loaded, so a
+    large file is shared through the page cache by every user and worker process.
+    Modes:
+      - sequential: every call takes the next row, wrapping around at the end
+      - random: every call takes a uniformly random row
+      - unique: like sequential, but meant to be called once per user so each user
+        keeps its own row (rows are reused with a warning once they run out)
+    Sequential and unique cursors are shared across the worker processes of a run.
+    """
+
+    def __init__(self, path: str, mode: str = "sequential", seed: Optional[int] = None):
+        if mode not in FEEDER_MODES:
+            raise ValueError(f"Unknown data feeder mode: {mode}. Expected one of {', '.join(FEEDER_MODES)}")
+        self.path = path
+        self.mode = mode
+        self.is_csv = not path.lower().endswith((".jsonl", ".ndjson"))
+        # Unseeded feeders share the random module, which runs with a seed set per worker process
+        self._random = random.Random(seed) if seed is not None else random
+
+        index_path = build_index(path)
+        self._data_file = open(path, "rb")
+        self._index_file = open(index_path, "rb")
+        # Empty files can't be mapped, but then there are no rows to serve either
+        self._data = mmap.mmap(self._data_file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else b""
+        self._index_map = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._offsets = memoryview(self._index_map).cast("Q")
+        self.rows = len(self._offsets) - 1
+        if self.rows <= 0:
+            raise ValueError(f"Data file has no rows: {path}")
+
+        self.columns: List[str] = []
+        if self.is_csv:
+            with open(path, "r", newline="") as f:
+                self.columns = next(csv.reader(f), [])
+
+        run_id = os.environ.get(RUN_ID_ENV)
+        if run_id and fcntl is not None:
+            self._cursor = _SharedCursor(f"{index_path}.{run_id}.cursor")
+        else:
+            self._cursor = _LocalCursor()
+        self._exhausted = False
+
+    def row(self, number: int) -> Dict[str, Any]:
+        """Read and parse a single row by its zero-based number"""
+        raw = self._data[self._offsets[number]:self._offsets[number + 1]].decode("utf-8").rstrip("\r\n")
+        if self.is_csv:
+            values = next(csv.reader([raw]), [])
+            return dict(zip(self.columns, values))
+        return json.loads(raw)
+
+    def next_row(self) -> Dict[str, Any]:
+        """Draw the next row according to the feeder mode"""
+        if self.mode == "random":
+            return self.row(self._random.randrange(self.rows))
+        position = self._cursor.next()
+        if self.mode == "unique" and position >= self.rows and not self._exhausted:
+            self._exhausted = True
+            logger.warning(f"More users than rows in {self.path}; rows will be reused")
+        return self.row(position % self.rows)
+
+
+def fill_template(value: Any, row: Dict[str, Any]) -> Any:
+    """Substitute {column} placeholders from a data row into strings nested in value"""
+    if isinstance(value, str):
+        if "{" not in value:
+            return value
+        try:
+            return value.format_map(row)
+        except (KeyError, ValueError, IndexError):
+            return value
+    if isinstance(value, dict):
+        return {key: fill_template(item, row) for key, item in value.items()}
+    if isinstance(value, list):
+        return [fill_template(item, row) for item in value]
+    return value
@@ -0,0 +1,240 @@
+# Bounded aggregation of a run's failed requests. Failures are grouped by signature: the
+# response status, the exception type, and the exception message with the parts that vary
+# from request to request (numbers, IDs, addresses) replaced by placeholders. Every group
+# counts its failures per endpoint and keeps a reservoir sample of a few full responses, so
+# memory is capped however many requests fail: at most max_groups groups, each with at most
+# samples responses of at most sample_bytes body bytes, and failures beyond max_groups are
+# only counted. The same class merges the groups reported by a run's locust processes,
+# keeping each process's sample and drawing from them in proportion to their failures.
+import hashlib
+import os
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from locust_mcp.sampling import sampling_random
+
+# Defaults, overridable through the environment of the locust processes
+DEFAULT_MAX_GROUPS = 50
+DEFAULT_SAMPLES = 3
+DEFAULT_SAMPLE_BYTES = 2048
+# Upper bound on sample_bytes, so an interval's report stays one reasonably sized event line
+MAX_SAMPLE_BYTES = 16384
+# Per group: endpoints counted by name, and headers kept per sample
+MAX_ENDPOINTS = 10
+MAX_HEADERS = 32
+MAX_HEADER_VALUE = 256
+MAX_MESSAGE = 512
+# Raw messages remembered with their signature, so repeated failures skip the templating
+SIGNATURE_CACHE_SIZE = 1024
+# The group counting failures of new signatures once max_groups groups exist
+OVERFLOW_KEY = "other"
+
+MESSAGE_PATTERNS = (
+    (re.compile(r"0x[0-9a-fA-F]+"), "<addr>"),
+    (re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"), "<uuid>"),
+    (re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}\b"), "<ip>"),
+    (re.compile(r"\b(?=[0-9a-fA-F]*\d)[0-9a-fA-F]{16,}\b"), "<hex>"),
+    (re.compile(r"\d+"), "<n>"),
+)
+
+
+def template_message(message: str) -> str:
+    """A failure message with the parts that vary between requests replaced by placeholders"""
+    for pattern, placeholder in MESSAGE_PATTERNS:
+        message = pattern.sub(placeholder, message)
+    return message[:MAX_MESSAGE]
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+class FailureGroups:
+    """The failures of a run, or of one of its processes, grouped by signature"""
+
+    def __init__(self, max_groups: int = DEFAULT_MAX_GROUPS, samples: int = DEFAULT_SAMPLES,
+                 sample_bytes: int = DEFAULT_SAMPLE_BYTES):
+        self.max_groups = max(1, max_groups)
+        self.samples = max(0, samples)
+        self.sample_bytes = min(max(0, sample_bytes), MAX_SAMPLE_BYTES)
+        self.groups: Dict[str, Dict[str, Any]] = {}
+        # Keys of groups changed since the last delta()
+        self._changed: set = set()
+        # Merged reports that didn't name their source count as a source each
+        self._anonymous_sources = 0
+        self._signatures: Dict[Tuple[Any, str, str], Tuple[str, str]] = {}
+
+    @classmethod
+    def from_env(cls) -> "FailureGroups":
+        return cls(_env_int("LOCUST_MCP_FAILURE_GROUPS", DEFAULT_MAX_GROUPS),
+                   _env_int("LOCUST_MCP_FAILURE_SAMPLES", DEFAULT_SAMPLES),
+                   _env_int("LOCUST_MCP_FAILURE_SAMPLE_BYTES", DEFAULT_SAMPLE_BYTES))
+
+    def _signature(self, status: Optional[int], exception_type: str, message: str) -> Tuple[str, str]:
+        cache_key = (status, exception_type, message)
+        signature = self._signatures.get(cache_key)
+        if signature is None:
+            template = template_message(message)
+            digest = hashlib.sha1(f"{status}|{exception_type}|{template}".encode()).hexdigest()[:12]
+            if len(self._signatures) >= SIGNATURE_CACHE_SIZE:
+                self._signatures.clear()
+            signature = self._signatures[cache_key] = (digest, template)
+        return signature
+
+    def _group(self, key: str, status: Optional[int], exception_type: str, message: str) -> Dict[str, Any]:
+        group = self.groups.get(key)
+        if group is None:
+            if len(self.groups) >= self.max_groups and key != OVERFLOW_KEY:
+                return self._group(OVERFLOW_KEY, None, "", "Failures beyond the group limit")
+            group = self.groups[key] = {
+                "key": key, "status": status, "exception": exception_type, "message": message,
+                "count": 0, "first_seen": None, "last_seen": None, "endpoints": {},
+                "samples": [], "sampled": 0, "new_slots": set(),
+                # Merged groups: per source, the failures it saw and its own sample by slot
+                "sources": {}
+            }
+        return group
+
+    def _add_endpoint(self, group: Dict[str, Any], endpoint: str, count: int):
+        endpoints = group["endpoints"]
+        if endpoint not in endpoints and len(endpoints) >= MAX_ENDPOINTS:
+            endpoint = OVERFLOW_KEY
+        endpoints[endpoint] = endpoints.get(endpoint, 0) + count
+
+    def _offer(self, group: Dict[str, Any], sample_factory: Callable[[], Dict[str, Any]]):
+        """Reservoir sampling: each sample offered to the group is kept with equal probability"""
+        if group["key"] == OVERFLOW_KEY or not self.samples:
+            return
+        group["sampled"] += 1
+        if len(group["samples"]) < self.samples:
+            slot = len(group["samples"])
+            group["samples"].append(None)
+        else:
+            slot = sampling_random.randrange(group["sampled"])
+            if slot >= self.samples:
+                return
+        # Only built when kept, so most failures of a busy group never copy their response
+        group["samples"][slot] = sample_factory()
+        group["new_slots"].add(slot)
+
+    def record(self, method: str, name: str, exception: BaseException, response: Any, now: float):
+        """Record one failed request, from Locust's request event"""
+        status = getattr(response, "status_code", None)
+        exception_type = type(exception).__name__
+        # Cut before templating, so the cache holds bounded keys
+        key, template = self._signature(status, exception_type, str(exception)[:4 * MAX_MESSAGE])
+        group = self._group(key, status, exception_type, template)
+        group["count"] += 1
+        if group["first_seen"] is None:
+            group["first_seen"] = now
+        group["last_seen"] = now
+        self._add_endpoint(group, f"{method} {name}", 1)
+        self._offer(group, lambda: self._sample(method, name, exception, response, now))
+        self._changed.add(group["key"])
+
+    def _sample(self, method: str, name: str, exception: BaseException, response: Any, now: float) -> Dict[str, Any]:
+        headers = getattr(response, "headers", None) or {}
+        content = getattr(response, "content", None)
+        body = content[:self.sample_bytes] if isinstance(content, (bytes, bytearray)) else b""
+        return {
+            "time": now,
+            "endpoint": f"{method} {name}",
+            "status": getattr(response, "status_code", None),
+            "error": str(exception)[:MAX_MESSAGE],
+            "headers": {str(key): str(value)[:MAX_HEADER_VALUE]
+                        for key, value in list(headers.items())[:MAX_HEADERS]},
+            "body": bytes(body).decode("utf-8", errors="replace"),
+            "body_bytes": len(content) if isinstance(content, (bytes, bytearray)) else 0
+        }
+
+    def delta(self) -> List[Dict[str, Any]]:
+        """
+        The groups changed since the last call: counts since then, and the samples kept since
+        then with their slots, for a process to report its failures periodically
+        """
+        deltas = []
+        for key in self._changed:
+            group = self.groups[key]
+            deltas.append({
+                **{field: group[field] for field in ("key", "status", "exception", "message", "first_seen", "last_seen")},
+                "count": group["count"] - group.get("reported", 0),
+                "endpoints": {endpoint: count - group.get("reported_endpoints", {}).get(endpoint, 0)
+                              for endpoint, count in group["endpoints"].items()
+                              if count != group.get("reported_endpoints", {}).get(endpoint, 0)},
+                "samples": [group["samples"][slot] for slot in sorted(group["new_slots"])],
+                "slots": sorted(group["new_slots"])
+            })
+            group["reported"] = group["count"]
+            group["reported_endpoints"] = dict(group["endpoints"])
+            group["new_slots"] = set()
+        self._changed.clear()
+        return deltas
+
+    def merge(self, deltas: Iterable[Dict[str, Any]], source: Any = None):
+        """
+        Add groups reported by delta() or summary(), e.g. by the processes of a run. The
+        deltas of one process are merged with the same source, e.g. its pid, so its sample
+        is kept as it reports it; a summary, or deltas without a source, are a source of
+        their own.
+        """
+        if source is None:
+            self._anonymous_sources += 1
+            source = ("merged", self._anonymous_sources)
+        for delta in deltas:
+            group = self._group(delta["key"], delta.get("status"), delta.get("exception", ""), delta.get("message", ""))
+            group["count"] += delta.get("count", 0)
+            if delta.get("first_seen") is not None and (group["first_seen"] is None or delta["first_seen"] < group["first_seen"]):
+                group["first_seen"] = delta["first_seen"]
+            if delta.get("last_seen") is not None and (group["last_seen"] is None or delta["last_seen"] > group["last_seen"]):
+                group["last_seen"] = delta["last_seen"]
+            for endpoint, count in (delta.get("endpoints") or {}).items():
+                self._add_endpoint(group, endpoint, count)
+            if group["key"] != OVERFLOW_KEY and self.samples:
+                reported = group["sources"].setdefault(source, {"seen": 0, "samples": {}})
+                reported["seen"] += delta.get("count", 0)
+                samples = delta.get("samples") or []
+                for slot, sample in zip(delta.get("slots") or range(len(samples)), samples):
+                    reported["samples"][slot] = sample
+            self._changed.add(group["key"])
+
+    def _merged_samples(self, group: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Up to samples of the group's samples, as if drawn from all of its failures: each
+        source's sample is uniform over the failures it saw, so a source is picked in
+        proportion to its failures not drawn yet, and one of its samples at random
+        """
+        pools = [[reported["seen"], [sample for sample in reported["samples"].values() if sample is not None]]
+                 for reported in group["sources"].values()]
+        pools = [pool for pool in pools if pool[0] > 0 and pool[1]]
+        drawn = []
+        while pools and len(drawn) < self.samples:
+            pick = sampling_random.randrange(sum(seen for seen, _ in pools))
+            for index, pool in enumerate(pools):
+                if pick < pool[0]:
+                    break
+                pick -= pool[0]
+            drawn.append(pool[1].pop(sampling_random.randrange(len(pool[1]))))
+            pool[0] -= 1
+            if not pool[0] or not pool[1]:
+                del pools[index]
+        return sorted(drawn, key=lambda sample: sample.get("time") or 0)
+
+    @property
+    def total(self) -> int:
+        return sum(group["count"] for group in self.groups.values())
+
+    def summary(self, samples: bool = True) -> List[Dict[str, Any]]:
+        """The groups, most frequent first, as returned with run results"""
+        fields = ("key", "status", "exception", "message", "count", "first_seen", "last_seen", "endpoints")
+        groups = sorted(self.groups.values(), key=lambda group: group["count"], reverse=True)
+        return [
+            {**{field: group[field] for field in fields},
+             **({"samples": self._samples(group)} if samples else {})}
+            for group in groups
+        ]
+
+    def _samples(self, group: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if group["sources"]:
+            return self._merged_samples(group)
+        return [sample for sample in group["samples"] if sample is not None]
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import time
+import uuid
+from typing import Callable, Dict, Any, Optional
+
+from locust_mcp.cpu_affinity import CoreAllocator, CoreLease, run_layout
+from locust_mcp.locust_worker import worker_main
+from locust_mcp.run_hooks import RunRecorder
+from locust_mcp.script_cache import validate_script
+from locust_mcp.test_runner import finish_result, prepare_data_file, remove_data_cursor
+
+logger = logging.getLogger(__name__)
+
+# How long a finished worker process gets to exit before it is terminated
+WORKER_EXIT_TIMEOUT = 5
+
+
+def exchange(conn, job: Dict[str, Any], listener: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    Blocking: send a run request to a worker and wait for its result message, passing the
+    hook events it streams meanwhile to listener.
+    """
+    conn.send(job)
+    ready = None
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return {"type": "result", "success": False, "statistics": None,
+                    "error": "Locust worker process exited unexpectedly"}
+        if message.get("type") == "ready":
+            ready = message["time"]
+        elif message.get("type") == "event":
+            if listener is not None:
+                listener(message["event"])
+        elif message.get("type") == "result":
+            if ready is not None:
+                message.setdefault("timing", {})["ready"] = ready
+            return message
+
+
+def build_result(message: Dict[str, Any], marks: Dict[str, float], config: Dict[str, Any],
+                 allocator: Optional[CoreAllocator] = None, lease: Optional[CoreLease] = None,
+                 pid: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Convert a worker result message into the runner result format, with the run's timing,
+    phases and the core layout of the worker process pid.
+    """
+    recorder = RunRecorder({**marks, **(message.get("timing") or {}), "finished": time.time()})
+    recorder.intervals = message.get("intervals") or []
+    # The worker sent its drift alerts live; the trends are rebuilt here from its intervals
+    for interval in recorder.intervals:
+        recorder.trends.add(interval, recorder.marks.get("ramp_complete"))
+    recorder.failures.merge(message.get("failures") or [])
+    recorder.connections.merge(message.get("connections") or [])
+    for point in message.get("exemplars") or []:
+        recorder.exemplars.add(point)
+    processes = [{"pid": pid, "worker_index": None, "cores": lease.cores if lease else None}] if pid else []
+    result = {
+        "success": message.get("success", False),
+        "statistics": json.loads(message["statistics_json"]) if message.get("statistics_json") else None,
+        "error": message.get("error"),
+        "cpu_layout": run_layout(allocator, lease, processes)
+    }
+    return finish_result(result, recorder, config)
+
+
+class LocustLibraryRunner:
+    """
+    Runs Locust tests through Locust's library API instead of the locust command line.
+    Each run gets a fresh, isolated worker process; stats are read from the live
+    Environment rather than parsed from console output.
+    """
+
+    def __init__(self, cpu_allocator: Optional[CoreAllocator] = None):
+        self._context = multiprocessing.get_context("spawn")
+        self._active: Dict[str, Any] = {}
+        # Pins each worker process to its own core when given
+        self._cpu_allocator = cpu_allocator
+
+    def _start_worker(self):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=worker_main, args=(child_conn,), daemon=True)
+        process.start()
+        child_conn.close()
+        return process, parent_conn
+
+    async def run(self, params: Dict[str, Any],
+                  listener: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Run a Locust test in a new worker process, passing the run's hook events to listener."""
+        script = params.get("script", "")
+        config = params.get("config", {})
+
+        if not script:
+            return {"error": "No test script provided"}
+        try:
+            validate_script(script)
+        except ValueError as e:
+            return {"success": False, "statistics": None, "error": str(e)}
+        if config.get("processes"):
+            logger.warning("The library runner uses a single process; ignoring 'processes'")
+
+        marks = {"requested": time.time(), "acquired": time.time()}
+        run_id = params.get("run_id") or uuid.uuid4().hex
+        try:
+            index_path = await prepare_data_file(config)
+        except (OSError, ValueError) as e:
+            return {"success": False, "statistics": None, "error": f"Data file error: {e}"}
+
+        loop = asyncio.get_running_loop()
+        lease = self._cpu_allocator.acquire(1) if self._cpu_allocator else None
+        process, conn = self._start_worker()
+        if lease is not None:
+            lease.apply(process.pid, f"run-{run_id}", cgroup=True)
+        marks["spawned"] = time.time()
+        self._active[run_id] = conn
+        try:
+            job = {"type": "run", "run_id": run_id, "script": script, "config": config, "stream": listener is not None}
+            message = await loop.run_in_executor(None, exchange, conn, job, listener)
+            result = build_result(message, marks, config, self._cpu_allocator, lease, process.pid)
+            result["timing"]["pooled"] = False
+            return result
+        finally:
+            self._active.pop(run_id, None)
+            conn.close()
+            await loop.run_in_executor(None, process.join, WORKER_EXIT_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+            remove_data_cursor(index_path, run_id)
+            if lease is not None:
+                lease.release()
+
+    async def stop(self, run_id: Optional[str] = None) -> Dict[str, Any]:
+        """Ask every active worker, or only run_id's, to stop its run; each run still returns its results."""
+        stopped = 0
+        for key, conn in list(self._active.items()):
+            if run_id is not None and key != run_id:
+                continue
+            try:
+                conn.send({"type": "stop"})
+                stopped += 1
+            except OSError:
+                pass
+        return {
+            "success": True,
+            "stopped": stopped,
+            "message": f"Stop requested for {stopped} library run(s)"
+        }
@@ -1,83 +1,261 @@
-from typing import Dict, Any, List
-import json
+from typing import Dict, Any, List, Optional, TextIO, Tuple
+import io
+import os
 import re
 import shlex
-from urllib.parse import urlparse, parse_qs
+from locust_mcp.connection_timing import CONNECTION_MODES, DEFAULT_POOL_SIZE
+from locust_mcp.curl_parser import parse_curl
+from locust_mcp.data_feeder import FEEDER_MODES
+from locust_mcp.script_cache import validate_script
+
+# Prefix added to request names in mixed scripts so results can be broken down by source row
+ROW_NAME_PREFIX = "[row {}] "
+ROW_NAME_PATTERN = re.compile(r'^\[row ([^\]]+)\] ')
+
+RUN_TIME_UNITS = {"s": 1, "m": 60, "h": 3600}
+
+# Seconds a simulated user waits between tasks, as between(min, max)
+DEFAULT_THINK_TIME = (1, 5)
+
+# HTTP methods with a shortcut on Locust's HttpSession; anything else goes through request()
+CLIENT_METHODS = {"get", "post", "put", "patch", "delete", "head", "options"}
+
+def _check_literal(value: Any):
+    """Reject values whose repr() is not a Python literal, so interpolated values can't break a script"""
+    if value is None or isinstance(value, (str, bool, int)):
+        return
+    if isinstance(value, float):
+        if value != value or value in (float("inf"), float("-inf")):
+            raise ValueError(f"Cannot use {value} in a generated script")
+        return
+    if isinstance(value, (list, tuple)):
+        for item in value:
+            _check_literal(item)
+        return
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _check_literal(key)
+            _check_literal(item)
+        return
+    raise ValueError(f"Cannot use a {type(value).__name__} value in a generated script")
+
+def _literal(value: Any) -> str:
+    """Python source for a JSON-compatible value (unlike json.dumps, true/false/null become True/False/None)."""
+    _check_literal(value)
+    return repr(value)
+
+def _literal_block(value: Dict[str, Any], indent: int) -> str:
+    """Python source for a dict literal with one item per line, continuation lines indented by indent spaces"""
+    if not value:
+        return "{}"
+    pad = " " * indent
+    items = ",\n".join(f"{pad}{_literal(key)}: {_literal(item)}" for key, item in value.items())
+    return "{\n" + items + "\n" + " " * (indent - 4) + "}"
+
+def _request_call(method: str, args: str) -> str:
+    """Source for a request on self.client; methods without an HttpSession shortcut go through request()"""
+    if method.lower() in CLIENT_METHODS:
+        return f"self.client.{method.lower()}({args})"
+    return f"self.client.request({_literal(method.upper())}, {args})"
+
+def _curl_request_lines(config: Dict[str, Any], args: List[str], body: Optional[str], indent: int) -> List[str]:
+    """
+    Source lines for the request of a parsed curl command, with args (path first) ahead of
+    its keyword arguments. body names the module-level constant holding a "data" body;
+    files are opened per request, so they are streamed from disk rather than held in memory.
+    """
+    method = config["method"]
+    args = list(args)
+    opened = []
+    if config.get("query_params"):
+        args.append(f"params={_literal(config['query_params'])}")
+    if config.get("data") is not None:
+        args.append(f"data={body}")
+    elif config.get("data_file"):
+        opened.append(config["data_file"])
+        args.append("data=body_1")
+    if config.get("form"):
+        files = []
+        for name, field in config["form"]:
+            if "value" in field:
+                files.append(f"({_literal(name)}, (None, {_literal(field['value'])}))")
+            else:
+                opened.append(field.get("file") or field["content"])
+                filename = _literal(os.path.basename(field["file"])) if "file" in field else "None"
+                files.append(f"({_literal(name)}, ({filename}, body_{len(opened)}))")
+        args.append(f"files=[{', '.join(files)}]")
+    if config.get("auth"):
+        args.append(f"auth={_literal(tuple(config['auth']))}")
+    if config.get("verify") is False:
+        args.append("verify=False")
+    if config.get("timeout"):
+        args.append(f"timeout={_literal(float(config['timeout']))}")
+    # curl follows redirects only with -L; requests follows them for all methods but HEAD
+    follow = bool(config.get("allow_redirects"))
+    if follow != (method.upper() != "HEAD"):
+        args.append(f"allow_redirects={follow}")
+
+    pad = " " * indent
+    call = _request_call(method, ", ".join(args))
+    if not opened:
+        return [pad + call]
+    files = ", ".join(f"open({_literal(path)}, 'rb') as body_{i}" for i, path in enumerate(opened, 1))
+    return [f"{pad}with {files}:", f"{pad}    {call}"]
+
+def _curl_body_constant(config: Dict[str, Any], name: str) -> List[str]:
+    """A module-level constant with the encoded body of a parsed curl command, if it has one"""
+    if config.get("data") is None:
+        return []
+    return [f"{name} = {_literal(config['data'])}.encode()"]
+
+def parse_run_time(run_time: str) -> int:
+    """Convert a Locust run time such as '30s', '2m' or '1h30m' into seconds."""
+    parts = re.findall(r'(\d+)\s*([smh]?)', str(run_time).lower())
+    if not parts:
+        raise ValueError(f"Invalid run time: {run_time}")
+    return sum(int(value) * RUN_TIME_UNITS[unit or "s"] for value, unit in parts)
+
+def think_time_range(params: Dict[str, Any]) -> Tuple[float, float]:
+    """The (min, max) seconds of the between() wait time from a spec's thinkTime or a config's think_time."""
+    think_time = params.get("thinkTime") or params.get("think_time") or {}
+    think_min = float(think_time.get("min", DEFAULT_THINK_TIME[0]))
+    think_max = float(think_time.get("max", max(think_min, DEFAULT_THINK_TIME[1])))
+    if think_min < 0 or think_max < think_min:
+        raise ValueError(f"Invalid think time: {think_time}")
+    return think_min, think_max
 
 class LocustScriptGenerator:
     """Generator class for creating Locust test scripts."""
     
     def _parse_curl_command(self, curl_command: str, users: int = 10, run_time: str = "30s") -> Dict[str, Any]:
-        """Parse a curl command into a dictionary of parameters."""
-        # Find URL in the curl command
-        url_match = re.search(r'curl\s+["\']?(https?://[^\s\'\"]+)["\']?', curl_command)
-        if not url_match:
-            raise ValueError("No valid URL found in curl command")
-            
-        url = url_match.group(1)
-        parsed_url = urlparse(url)
-        
-        config = {
-            "method": "GET",
-            "headers": {},
-            "cookies": {},
-            "data": None,
-            "users": users,
-            "run_time": run_time,
-            "host": f"{parsed_url.scheme}://{parsed_url.netloc}",
-            "path": parsed_url.path,
-            "query_params": {k: v[0] for k, v in parse_qs(parsed_url.query).items() if v}
-        }
-        
-        # Parse headers
-        header_matches = re.finditer(r'-H\s+["\']([^:]+):\s*([^"\']+)["\']', curl_command)
-        for match in header_matches:
-            key, value = match.groups()
-            key = key.strip()
-            value = value.strip()
-            if not any(skip in key.lower() for skip in ['sec-', 'accept-encoding', 'connection', 'keep-alive']):
-                config["headers"][key] = value
-                
+        """Parse a curl command into a dictionary of parameters (see curl_parser.parse_curl)."""
+        config = parse_curl(curl_command)
+        config["users"] = users
+        config["run_time"] = run_time
         return config
 
     def generate_from_curl(self, curl_command: str, users: int = 10, run_time: str = "30s") -> str:
         """Generate a Locust test script from a curl command."""
         config = self._parse_curl_command(curl_command, users, run_time)
-        
+        return self.generate_from_config(config)
+
+    def generate_from_config(self, config: Dict[str, Any], validate: bool = True) -> str:
+        """
+        Generate a Locust test script from an already parsed curl configuration.
+        Batch generation passes validate=False: compiling costs several times more than
+        generating, and every value is emitted through _literal, so the script is valid by
+        construction; the runners still validate it before it is run.
+        """
         # Format script with proper indentation
+        body = _curl_body_constant(config, "BODY")
         script_lines = [
             "from locust import HttpUser, task, between",
             "",
+            *body,
+            *([""] if body else []),
             "class PerformanceTest(HttpUser):",
-            f"    host = \"{config['host']}\"  # Base URL without path",
+            f"    host = {_literal(config['host'])}  # Base URL without path",
             "    wait_time = between(1, 5)",
             "",
             "    def on_start(self):",
             "        # Set default headers that will be used for all requests",
-            f"        self.headers = {json.dumps(config['headers'], indent=12)}",
-            "",
-            "    @task(1)",
-            "    def test_get_1(self):",
-            f"        path = \"{config['path']}\""
+            f"        self.headers = {_literal_block(config['headers'], 12)}"
         ]
-        
-        # Add query parameters if present
-        if config["query_params"]:
-            script_lines.append(f"        params = {json.dumps(config['query_params'])}")
-        
-        # Add the request with proper parameters
+        if config.get("cookies"):
+            script_lines.extend([
+                "        # Cookies from the curl command, kept in the session like curl's cookie engine",
+                f"        self.client.cookies.update({_literal(config['cookies'])})"
+            ])
         method = config["method"].lower()
-        request_params = ["headers=self.headers"]
-        
-        if config["query_params"]:
-            request_params.append("params=params")
-        if config["data"] and method in ["post", "put", "patch"]:
-            request_params.append(f"json={json.dumps(config['data'])}")
-        
-        params_str = ", ".join(request_params)
-        script_lines.append(f"        self.client.{method}(path, {params_str})")
+        script_lines.extend([
+            "",
+            "    @task(1)",
+            f"    def test_{method if method.isidentifier() else 'request'}_1(self):",
+            f"        path = {_literal(config['path'])}"
+        ])
+        script_lines.extend(_curl_request_lines(config, ["path", "headers=self.headers"], "BODY", 8))
         
-        return "\n".join(script_lines)
+        script = "\n".join(script_lines)
+        if validate:
+            validate_script(script)
+        return script
+
+    def generate_mixed(self, cases: List[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+        """
+        Combine many curl test cases into a single mixed-workload script.
+        Each case needs a curl_command and may set sr_no, users and duration.
+        Cases are grouped into one user class per host, weighted by the sum of
+        their users, and every case becomes a task weighted by its own users.
+        Returns the script together with its run configuration.
+        """
+        if not cases:
+            raise ValueError("At least one test case is required")
+
+        hosts: Dict[str, List[Dict[str, Any]]] = {}
+        rows = []
+        for idx, case in enumerate(cases, 1):
+            sr_no = str(case.get("sr_no", idx))
+            users = int(case.get("users", 1))
+            duration = case.get("duration", "30s")
+            config = self._parse_curl_command(case["curl_command"], users, duration)
+            config["sr_no"] = sr_no
+            config["index"] = idx
+            hosts.setdefault(config["host"], []).append(config)
+            rows.append({
+                "sr_no": sr_no,
+                "host": config["host"],
+                "method": config["method"],
+                "path": config["path"],
+                "weight": users,
+                "run_time": duration
+            })
+
+        script_lines = [
+            "from locust import HttpUser, task, between",
+            ""
+        ]
+        for configs in hosts.values():
+            for config in configs:
+                script_lines.extend(_curl_body_constant(config, f"BODY_ROW_{config['index']}"))
+
+        for class_idx, (host, configs) in enumerate(hosts.items(), 1):
+            script_lines.extend([
+                "",
+                f"class HostUser{class_idx}(HttpUser):",
+                f"    host = {_literal(host)}",
+                f"    weight = {max(sum(c['users'] for c in configs), 1)}",
+                "    wait_time = between(1, 5)",
+                ""
+            ])
+            for config in configs:
+                name = ROW_NAME_PREFIX.format(config["sr_no"]) + config["path"]
+                request_params = [_literal(config["path"]), f"name={_literal(name)}"]
+                if config["headers"]:
+                    request_params.append(f"headers={_literal(config['headers'])}")
+                # Per request rather than in the session shared by the host's rows, so
+                # each row replays only its own session's cookies
+                if config.get("cookies"):
+                    request_params.append(f"cookies={_literal(config['cookies'])}")
+
+                script_lines.extend([
+                    f"    @task({max(config['users'], 1)})",
+                    f"    def row_{config['index']}(self):",
+                    *_curl_request_lines(config, request_params, f"BODY_ROW_{config['index']}", 8),
+                    ""
+                ])
+
+        run_time = max((row["run_time"] for row in rows), key=parse_run_time)
+        mixed_config = {
+            # No single host: each user class carries its own, so --host must not override them
+            "host": None,
+            "users": sum(row["weight"] for row in rows),
+            "spawn_rate": 1,
+            "run_time": run_time,
+            "rows": rows
+        }
+        script = "\n".join(script_lines)
+        validate_script(script)
+        return script, mixed_config
 
     def generate(self, params: Dict[str, Any]) -> str:
         """Generate a Locust test script based on the provided parameters."""
@@ -86,52 +264,239 @@ class LocustScriptGenerator:
             users = params.get("users", 10)
             run_time = params.get("runTime", "30s")
             return self.generate_from_curl(params["prompt"], users, run_time)
-            
+
+        out = io.StringIO()
+        self.write_script(params, out)
+        script = out.getvalue()
+        validate_script(script)
+        return script
+
+    def write_script(self, params: Dict[str, Any], out: TextIO) -> None:
+        """
+        Write a Locust test script for the provided parameters to a file-like object.
+        Tasks are rendered one endpoint at a time, so endpoints may be a lazy iterator
+        and large specs are never held as one big list of lines.
+        """
         target_url = params.get("targetUrl", "http://localhost:8000")
         endpoints = params.get("endpoints", [])
-        users = params.get("users", 10)
-        spawn_rate = params.get("spawnRate", 1)
-        
+
+        if isinstance(endpoints, list):
+            imports = set()
+            for endpoint in endpoints:
+                imports |= self._task_imports(endpoint)
+        else:
+            # Can't look ahead in an iterator, so import everything a task might need
+            imports = {"random", "uuid"}
+        for module in sorted(imports):
+            out.write(f"import {module}\n")
+
+        data_file = params.get("dataFile")
+        feeder_mode = None
+        if data_file:
+            feeder_mode = data_file.get("mode", "sequential")
+            if feeder_mode not in FEEDER_MODES:
+                raise ValueError(f"Unknown data feeder mode: {feeder_mode}")
+            out.write(
+                "from locust_mcp.data_feeder import DataFeeder, fill_template\n"
+            )
+
+        connections = params.get("connections")
+        if connections:
+            mode = connections.get("mode", "keepalive")
+            if mode not in CONNECTION_MODES:
+                raise ValueError(f"Unknown connection mode: {mode}")
+            pool_size = int(connections.get("poolSize", DEFAULT_POOL_SIZE))
+            if pool_size < 1:
+                raise ValueError(f"Invalid connection pool size: {pool_size}")
+            verify = connections.get("verify", True)
+            out.write("from locust_mcp.connection_timing import use_connections\n")
+
+        tracing = params.get("tracing")
+        if tracing:
+            sample_rate = float(tracing.get("sampleRate", 1.0))
+            if not 0 <= sample_rate <= 1:
+                raise ValueError(f"Invalid trace sample rate: {sample_rate}")
+            out.write("from locust_mcp.trace_context import use_tracing\n")
+
+        out.write("from locust import HttpUser, task, between\n\n")
+        if data_file:
+            # Module level, so all users of a worker process share one memory-mapped feeder
+            out.write(f"FEEDER = DataFeeder({_literal(data_file['path'])}, mode={_literal(feeder_mode)})\n\n")
+
+        think_min, think_max = think_time_range(params)
+        out.write(
+            "class PerformanceTest(HttpUser):\n"
+            f"    host = {_literal(target_url)}\n"
+            f"    wait_time = between({think_min:g}, {think_max:g})\n"
+            "\n"
+        )
+        if connections or tracing or feeder_mode == "unique":
+            out.write("    def on_start(self):\n")
+            if connections:
+                verify_arg = "" if verify is True else f", verify={_literal(verify)}"
+                out.write(
+                    f"        use_connections(self.client, mode={_literal(mode)}, pool_size={pool_size}, "
+                    f"timing={_literal(bool(connections.get('timing', True)))}{verify_arg})\n"
+                )
+            if tracing:
+                out.write(f"        use_tracing(self.client, sample_rate={sample_rate:g})\n")
+            if feeder_mode == "unique":
+                out.write(
+                    "        # Each user keeps its own row for its whole lifetime\n"
+                    "        self.row = FEEDER.next_row()\n"
+                )
+            out.write("\n")
+        for idx, endpoint in enumerate(endpoints, 1):
+            out.write(self._render_task(idx, endpoint, feeder_mode))
+
+    def _task_imports(self, endpoint: Dict[str, Any]) -> set:
+        """Modules the task generated for an endpoint needs"""
+        imports = set()
+        if endpoint.get("samples"):
+            imports.add("random")
+        for generator in (endpoint.get("pathParams") or {}).values():
+            imports.add("random")
+            if generator.get("type") == "uuid":
+                imports.add("uuid")
+        return imports
+
+    def _param_expression(self, generator: Dict[str, Any]) -> str:
+        """
+        Python expression producing a fresh value for a path parameter. Every value is drawn
+        from the random module, so seeded runs request the same paths.
+        """
+        kind = generator.get("type")
+        if kind == "int":
+            return f"random.randint({int(generator.get('min', 1))}, {int(generator.get('max', 10000))})"
+        if kind == "choice":
+            return f"random.choice({_literal(generator['values'])})"
+        if kind == "uuid":
+            return "str(uuid.UUID(int=random.getrandbits(128), version=4))"
+        return "f'{random.getrandbits(32):08x}'"
+
+    def _render_task(self, idx: int, endpoint: Dict[str, Any], feeder_mode: Optional[str] = None) -> str:
+        """Render the @task method for one endpoint, filling {column} placeholders from a data row if a feeder is used"""
+        method = endpoint.get("method", "GET").lower()
+        path = endpoint.get("path", "/")
+        data = endpoint.get("data")
+        headers = endpoint.get("headers", {})
+        weight = int(endpoint.get("weight", 1))
+        name = endpoint.get("name")
+
+        task_lines = [
+            f"    @task({weight})",
+            f"    def test_{re.sub(r'[^0-9a-z_]', '_', method)}_{idx}(self):",
+        ]
+
+        def templated(source: str) -> str:
+            return f"fill_template({source}, row)" if feeder_mode else source
+
+        if feeder_mode == "unique":
+            task_lines.append("        row = self.row")
+        elif feeder_mode:
+            task_lines.append("        row = FEEDER.next_row()")
+
+        if endpoint.get("samples"):
+            # Templated paths pick one of the concrete paths they were recorded with
+            choice = f"random.choice({_literal(endpoint['samples'])})"
+            task_lines.append(f"        path = {templated(choice)}")
+            path_expr = "path"
+            name = name or path
+        elif endpoint.get("pathParams"):
+            values = ", ".join(
+                f"{_literal(key)}: {self._param_expression(generator)}"
+                for key, generator in endpoint["pathParams"].items()
+            )
+            row_values = "**row, " if feeder_mode else ""
+            task_lines.append(f"        path = {_literal(path)}.format(**{{{row_values}{values}}})")
+            path_expr = "path"
+            name = name or path
+        elif feeder_mode and "{" in path:
+            task_lines.append(f"        path = {templated(_literal(path))}")
+            path_expr = "path"
+            name = name or path
+        else:
+            path_expr = _literal(path)
+
+        request_params = []
+        if name:
+            request_params.append(f"name={_literal(name)}")
+        if headers:
+            request_params.append(f"headers={templated(_literal(headers))}")
+        if endpoint.get("params"):
+            request_params.append(f"params={templated(_literal(endpoint['params']))}")
+        if data and method in ["post", "put", "patch"]:
+            request_params.append(f"json={templated(_literal(data))}")
+
+        params_str = "".join(f", {param}" for param in request_params)
+        task_lines.append(f"        {_request_call(method, path_expr + params_str)}")
+        task_lines.append("")
+        return "\n".join(task_lines) + "\n"
+
+    def generate_replay(self, schedule_path: str, target_url: str, speed: float = 1.0, max_concurrency: int = 1000) -> str:
+        """
+        Generate a script that replays a recorded schedule with its original inter-arrival times.
+        The schedule is a file of [offset seconds, method, target, template] JSON lines written by
+        TrafficImporter.write_replay_schedule; it is streamed by a single user that fires each
+        request on time from a greenlet pool, then stops the run once the schedule is exhausted.
+        """
+        if speed <= 0:
+            raise ValueError("Replay speed must be positive")
+
         script_lines = [
-            "from locust import HttpUser, task, between",
+            "import json",
+            "import time",
+            "from gevent import sleep",
+            "from gevent.pool import Pool",
+            "from locust import HttpUser, task, constant",
             "",
-            f"class PerformanceTest(HttpUser):",
-            f"    host = \"{target_url}\"",
-            "    wait_time = between(1, 5)",
+            f"SCHEDULE_PATH = {_literal(schedule_path)}",
+            f"SPEED = {float(speed)}",
+            f"MAX_CONCURRENCY = {int(max_concurrency)}",
+            "",
+            "class ReplayUser(HttpUser):",
+            f"    host = {_literal(target_url)}",
+            "    fixed_count = 1",
+            "    wait_time = constant(0)",
+            "",
+            "    @task",
+            "    def replay(self):",
+            "        pool = Pool(MAX_CONCURRENCY)",
+            "        start = time.monotonic()",
+            "        with open(SCHEDULE_PATH) as schedule:",
+            "            for line in schedule:",
+            "                offset, method, target, name = json.loads(line)",
+            "                delay = offset / SPEED - (time.monotonic() - start)",
+            "                if delay > 0:",
+            "                    sleep(delay)",
+            "                pool.spawn(self.client.request, method, target, name=name)",
+            "        pool.join()",
+            "        self.environment.runner.quit()",
             ""
         ]
-
-        for idx, endpoint in enumerate(endpoints, 1):
-            method = endpoint.get("method", "GET").lower()
-            path = endpoint.get("path", "/")
-            data = endpoint.get("data")
-            headers = endpoint.get("headers", {})
-            weight = endpoint.get("weight", 1)
-            
-            task_lines = [
-                f"    @task({weight})",
-                f"    def test_{method}_{idx}(self):",
-            ]
-
-            request_params = []
-            if headers:
-                request_params.append(f"headers={json.dumps(headers)}")
-            if data and method in ["post", "put", "patch"]:
-                request_params.append(f"json={json.dumps(data)}")
-            
-            params_str = ", ".join(request_params)
-            task_lines.append(f"        self.client.{method}(\"{path}\"{', ' + params_str if params_str else ''})")
-            task_lines.append("")
-            
-            script_lines.extend(task_lines)
-
-        return "\n".join(script_lines)
+        script = "\n".join(script_lines)
+        validate_script(script)
+        return script
 
     def generate_config(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Generate Locust configuration based on the provided parameters."""
-        return {
+        config = {
             "host": params.get("targetUrl", "http://localhost:8000"),
             "users": params.get("users", 10),
             "spawn_rate": params.get("spawnRate", 1),
             "run_time": params.get("runTime", "30s")
         }
+        if params.get("dataFile"):
+            config["data_file"] = params["dataFile"]
+        if params.get("processes"):
+            config["processes"] = params["processes"]
+        if params.get("thinkTime"):
+            config["think_time"] = params["thinkTime"]
+        if params.get("seed") is not None:
+            config["seed"] = int(params["seed"])
+        # Measurement window: "warmup" and "cooldown" are seconds or durations ("warmup" may
+        # also be "ramp"), and "steadyState" trims the window to the detected steady state
+        for key, config_key in (("warmup", "warmup"), ("cooldown", "cooldown"), ("steadyState", "steady_state")):
+            if params.get(key):
+                config[config_key] = params[key]
+        return config
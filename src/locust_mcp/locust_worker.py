@@ -0,0 +1,116 @@
+# Worker process side of the library runners: runs generated scripts through Locust's
+# library API instead of the locust command line. The MCP server imports this module too,
+# so gevent and locust are only imported inside worker processes, after monkey-patching.
+import inspect
+import json
+import os
+import time
+import types
+from typing import Dict, Any
+
+from locust_mcp.data_feeder import RUN_ID_ENV
+from locust_mcp.locust_generator import parse_run_time
+from locust_mcp.run_hooks import RunRecorder, install, seed_random
+from locust_mcp.script_cache import compile_script
+
+
+def execute_run(job: Dict[str, Any], conn) -> Dict[str, Any]:
+    """Run one test inside an already monkey-patched worker process and return its results."""
+    import gevent
+    import locust
+    from gevent.socket import wait_read
+    from locust.env import Environment
+    from locust.event import Events
+
+    timing: Dict[str, float] = {"received": time.time()}
+    config = job.get("config", {})
+    os.environ[RUN_ID_ENV] = job["run_id"]
+
+    # Fresh event hooks per run, so listeners registered by earlier scripts don't leak into this one
+    events = Events()
+    locust.events = events
+    module = types.ModuleType(f"locustfile_{job['run_id']}")
+    try:
+        # Cached by content, so a pooled worker, or a fresh one finding the bytecode on disk, skips compiling
+        code = compile_script(job["script"])
+        module.__file__ = code.co_filename
+        exec(code, module.__dict__)
+    except Exception as e:
+        return {"success": False, "statistics": None, "error": f"Failed to load test script: {e}"}
+
+    user_classes = [
+        item for item in vars(module).values()
+        if inspect.isclass(item) and issubclass(item, locust.User) and item.abstract is False
+    ]
+    if not user_classes:
+        return {"success": False, "statistics": None, "error": "No User classes found in test script"}
+
+    env = Environment(user_classes=user_classes, host=config.get("host") or None, events=events)
+    runner = env.create_local_runner()
+    # Streamed runs also send their hook events to the runner as they happen
+    recorder = RunRecorder(timing, (lambda event: conn.send({"type": "event", "event": event})) if job.get("stream") else None)
+    install(events, recorder.record)
+    events.init.fire(environment=env, runner=runner, web_ui=None)
+
+    def watch_for_stop():
+        while True:
+            wait_read(conn.fileno())
+            message = conn.recv()
+            if message.get("type") == "stop":
+                runner.quit()
+                return
+
+    watcher = gevent.spawn(watch_for_stop)
+    # The hub caches its clock and hasn't run while this process blocked on the pipe,
+    # so refresh it or the run time timer below would start in the past
+    gevent.get_hub().loop.update_now()
+    # Seeded on every run, so a pooled worker repeats a seeded run regardless of its earlier runs
+    seed_random(config.get("seed"))
+    runner.start(int(config.get("users", 10)), spawn_rate=float(config.get("spawn_rate", 1)))
+    stopper = gevent.spawn_later(parse_run_time(config.get("run_time", "30s")), runner.quit)
+    runner.greenlet.join()
+    stopper.kill()
+    watcher.kill()
+    timing.setdefault("stopped", time.time())
+    events.quitting.fire(environment=env, reverse=True)
+    recorder.finish()
+
+    return {
+        "success": True,
+        # Serialized like `locust --json` so results look the same as from the CLI runner
+        "statistics_json": json.dumps(env.stats.serialize_stats()),
+        "error": None,
+        "timing": timing,
+        "intervals": recorder.intervals,
+        "failures": recorder.failures.summary(),
+        "connections": recorder.connections.delta(),
+        "exemplars": recorder.exemplars.events()
+    }
+
+
+def worker_main(conn, max_runs: int = 1):
+    """
+    Worker process entry point: monkey-patch, import Locust, report ready, then serve up to
+    max_runs run requests received over conn.
+    """
+    from gevent import monkey
+    monkey.patch_all()
+    import locust  # noqa: F401 - imported up front so a run can start immediately
+
+    conn.send({"type": "ready", "time": time.time(), "pid": os.getpid()})
+    runs = 0
+    while runs < max_runs:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job.get("type") == "exit":
+            return
+        if job.get("type") != "run":
+            continue
+        runs += 1
+        try:
+            result = execute_run(job, conn)
+        except Exception as e:
+            result = {"success": False, "statistics": None, "error": str(e)}
+        conn.send({"type": "result", **result})
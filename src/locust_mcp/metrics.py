@@ -0,0 +1,176 @@
+import bisect
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Default latency buckets in seconds, from 1 ms to 5 minutes
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape_label(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+
+    def samples(self, extra: Sequence[Tuple[str, str]] = ()) -> List[str]:
+        """Sample lines without the header; extra (name, value) labels are added to each"""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return self.header() + self.samples()
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, optionally split by labels"""
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, *labels: str):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self, extra: Sequence[Tuple[str, str]] = ()) -> List[str]:
+        names = self.label_names + tuple(name for name, _ in extra)
+        values = tuple(value for _, value in extra)
+        return [f"{self.name}{_format_labels(names, labels + values)} {_format_value(value)}"
+                for labels, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    """Value that goes up and down; either set directly or read from a callback at scrape time"""
+    metric_type = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation)
+        self.callback = callback
+        self._value = 0.0
+
+    def set(self, value: float):
+        self._value = value
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+    def value(self) -> float:
+        if self.callback is not None:
+            try:
+                return float(self.callback())
+            except Exception:
+                return float("nan")
+        return self._value
+
+    def samples(self, extra: Sequence[Tuple[str, str]] = ()) -> List[str]:
+        value = self.value()
+        labels = _format_labels([name for name, _ in extra], [value for _, value in extra])
+        return [f"{self.name}{labels} {'NaN' if value != value else _format_value(value)}"]
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram, optionally split by labels"""
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._series: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self, extra: Sequence[Tuple[str, str]] = ()) -> List[str]:
+        names = self.label_names + tuple(name for name, _ in extra)
+        values = tuple(value for _, value in extra)
+        lines = []
+        for labels, (counts, total) in sorted(self._series.items()):
+            labels = labels + values
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                label_str = _format_labels(names + ("le",), labels + (le,))
+                lines.append(f"{self.name}_bucket{label_str} {cumulative}")
+            label_str = _format_labels(names, labels)
+            lines.append(f"{self.name}_sum{label_str} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, label_names))
+
+    def gauge(self, name: str, documentation: str, callback: Optional[Callable[[], float]] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, callback))
+
+    def histogram(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, label_names, buckets))
+
+    def samples(self, **labels: str) -> Dict[str, List[str]]:
+        """Each metric's sample lines, without headers, with labels added to every sample"""
+        extra = tuple(labels.items())
+        return {name: metric.samples(extra) for name, metric in self._metrics.items()}
+
+    def render(self, samples: Optional[Iterable[Dict[str, List[str]]]] = None) -> str:
+        """
+        Render the metrics; or, given samples() of registries with the same metrics, e.g.
+        of other processes labelled with their pid, render those under this one's headers
+        """
+        if samples is None:
+            samples = [self.samples()]
+        samples = list(samples)
+        lines: List[str] = []
+        for name, metric in self._metrics.items():
+            lines.extend(metric.header())
+            for series in samples:
+                lines.extend(series.get(name, []))
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,232 @@
+import json
+import logging
+from typing import Dict, Any, Iterator, List, Optional
+
+from locust_mcp.prompt_generator import LoadTestSpec
+
+logger = logging.getLogger(__name__)
+
+HTTP_METHODS = ["get", "put", "post", "delete", "options", "head", "patch", "trace"]
+# Nested schemas deeper than this are cut off when building example bodies
+MAX_EXAMPLE_DEPTH = 6
+
+# Example values for string formats, used when a schema gives no example of its own
+STRING_FORMAT_EXAMPLES = {
+    "date": "2024-01-01",
+    "date-time": "2024-01-01T00:00:00Z",
+    "email": "user@example.com",
+    "uuid": "00000000-0000-4000-8000-000000000000",
+    "uri": "https://example.com",
+    "hostname": "example.com",
+    "ipv4": "127.0.0.1",
+    "byte": "dGVzdA==",
+}
+
+
+def load_document(path: str) -> Dict[str, Any]:
+    """Load an OpenAPI document from a JSON or YAML file."""
+    with open(path, "r") as f:
+        if path.lower().endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("PyYAML is required to import YAML OpenAPI documents (pip install pyyaml)")
+            # CSafeLoader is several times faster on large specs when libyaml is available
+            loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+            return yaml.load(f, Loader=loader)
+        return json.load(f)
+
+
+class OpenAPIImporter:
+    """
+    Converts an OpenAPI 3 document into a load test specification with one endpoint per operation.
+    $ref targets are resolved lazily, the first time an operation needs them, and cached by
+    reference together with the example values built from them.
+    """
+
+    def __init__(self, document: Dict[str, Any]):
+        if not str(document.get("openapi", "")).startswith("3"):
+            raise ValueError("Only OpenAPI 3 documents are supported")
+        self.document = document
+        self._refs: Dict[str, Any] = {}
+        self._examples: Dict[str, Any] = {}
+
+    def resolve(self, node: Any) -> Any:
+        """Follow $ref chains to the referenced node"""
+        seen = set()
+        while isinstance(node, dict) and "$ref" in node:
+            ref = node["$ref"]
+            if ref in seen:
+                raise ValueError(f"Circular $ref: {ref}")
+            seen.add(ref)
+            if ref not in self._refs:
+                self._refs[ref] = self._lookup(ref)
+            node = self._refs[ref]
+        return node
+
+    def _lookup(self, ref: str) -> Any:
+        if not ref.startswith("#/"):
+            raise ValueError(f"Only local $ref values are supported: {ref}")
+        node = self.document
+        for part in ref[2:].split("/"):
+            part = part.replace("~1", "/").replace("~0", "~")
+            if not isinstance(node, dict) or part not in node:
+                raise ValueError(f"Unresolvable $ref: {ref}")
+            node = node[part]
+        return node
+
+    def example(self, schema: Any, depth: int = 0, refs: tuple = ()) -> Any:
+        """Build an example value for a schema, memoized per $ref"""
+        if isinstance(schema, dict) and "$ref" in schema:
+            ref = schema["$ref"]
+            if ref in refs:
+                # Recursive schema: stop instead of expanding forever
+                return None
+            if ref not in self._examples:
+                self._examples[ref] = self.example(self.resolve(schema), depth, refs + (ref,))
+            return self._examples[ref]
+
+        if not isinstance(schema, dict) or depth > MAX_EXAMPLE_DEPTH:
+            return None
+        for key in ("example", "default"):
+            if key in schema:
+                return schema[key]
+        if schema.get("examples") and isinstance(schema["examples"], list):
+            return schema["examples"][0]
+        if schema.get("enum"):
+            return schema["enum"][0]
+
+        if "allOf" in schema:
+            merged: Dict[str, Any] = {}
+            for part in schema["allOf"]:
+                value = self.example(part, depth + 1, refs)
+                if isinstance(value, dict):
+                    merged.update(value)
+            return merged
+        for key in ("oneOf", "anyOf"):
+            if schema.get(key):
+                return self.example(schema[key][0], depth + 1, refs)
+
+        schema_type = schema.get("type")
+        if isinstance(schema_type, list):
+            schema_type = next((t for t in schema_type if t != "null"), None)
+        if schema_type == "object" or (schema_type is None and "properties" in schema):
+            return {
+                name: self.example(prop, depth + 1, refs)
+                for name, prop in (schema.get("properties") or {}).items()
+            }
+        if schema_type == "array":
+            item = self.example(schema.get("items", {}), depth + 1, refs)
+            return [] if item is None else [item]
+        if schema_type == "integer":
+            return schema.get("minimum", 1)
+        if schema_type == "number":
+            return schema.get("minimum", 1.0)
+        if schema_type == "boolean":
+            return True
+        if schema_type == "string":
+            return STRING_FORMAT_EXAMPLES.get(schema.get("format"), "string")
+        return None
+
+    def path_param_generator(self, parameter: Dict[str, Any]) -> Dict[str, Any]:
+        """Describe how generated scripts should fill a path parameter"""
+        schema = self.resolve(parameter.get("schema") or {})
+        if schema.get("enum"):
+            return {"type": "choice", "values": schema["enum"]}
+        if schema.get("type") in ("integer", "number"):
+            return {
+                "type": "int",
+                "min": int(schema.get("minimum", 1)),
+                "max": int(schema.get("maximum", 10000))
+            }
+        if schema.get("format") == "uuid":
+            return {"type": "uuid"}
+        return {"type": "string"}
+
+    def iter_endpoints(self, tags: Optional[List[str]] = None, path_prefix: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Yield one endpoint per operation, optionally filtered by tag or path prefix"""
+        tag_filter = set(tags) if tags else None
+        for path, path_item in (self.document.get("paths") or {}).items():
+            if path_prefix and not path.startswith(path_prefix):
+                continue
+            path_item = self.resolve(path_item)
+            shared_parameters = path_item.get("parameters", [])
+
+            for method in HTTP_METHODS:
+                operation = path_item.get(method)
+                if operation is None:
+                    continue
+                if tag_filter and not tag_filter.intersection(operation.get("tags", [])):
+                    continue
+                yield self._endpoint(method, path, operation, shared_parameters)
+
+    def _endpoint(self, method: str, path: str, operation: Dict[str, Any], shared_parameters: List[Any]) -> Dict[str, Any]:
+        # Operation parameters override path-level ones with the same name and location
+        parameters = {}
+        for parameter in list(shared_parameters) + list(operation.get("parameters", [])):
+            parameter = self.resolve(parameter)
+            parameters[(parameter.get("in"), parameter.get("name"))] = parameter
+
+        endpoint: Dict[str, Any] = {
+            "method": method.upper(),
+            "path": path,
+            "name": path,
+            "weight": 1
+        }
+        if operation.get("operationId"):
+            endpoint["operationId"] = operation["operationId"]
+
+        path_params = {}
+        query_params = {}
+        headers = {}
+        for (location, name), parameter in parameters.items():
+            if location == "path":
+                path_params[name] = self.path_param_generator(parameter)
+            elif parameter.get("required"):
+                value = parameter.get("example", self.example(parameter.get("schema") or {}))
+                if location == "query":
+                    query_params[name] = value
+                elif location == "header":
+                    headers[name] = str(value)
+        if path_params:
+            endpoint["pathParams"] = path_params
+        if query_params:
+            endpoint["params"] = query_params
+        if headers:
+            endpoint["headers"] = headers
+
+        request_body = self.resolve(operation.get("requestBody") or {})
+        content = request_body.get("content") or {}
+        media = content.get("application/json") or next(
+            (value for key, value in content.items() if key.endswith("+json")), None
+        )
+        if media is not None:
+            if "example" in media:
+                endpoint["data"] = media["example"]
+            else:
+                endpoint["data"] = self.example(media.get("schema") or {})
+        return endpoint
+
+    def server_url(self) -> Optional[str]:
+        servers = self.document.get("servers") or []
+        url = servers[0].get("url") if servers else None
+        # Relative server URLs need a host supplied by the caller
+        return url if url and url.startswith(("http://", "https://")) else None
+
+    def to_spec(
+        self,
+        tags: Optional[List[str]] = None,
+        path_prefix: Optional[str] = None,
+        target_url: Optional[str] = None,
+        **spec_fields: Any
+    ) -> LoadTestSpec:
+        """Build a LoadTestSpec with one endpoint per (filtered) operation."""
+        endpoints = list(self.iter_endpoints(tags, path_prefix))
+        if not endpoints:
+            raise ValueError("No operations matched the given filters")
+        logger.info(f"Imported {len(endpoints)} operations ({len(self._refs)} $ref targets resolved)")
+        return LoadTestSpec(
+            targetUrl=target_url or self.server_url() or "http://localhost:8000",
+            endpoints=endpoints,
+            **spec_fields
+        )
@@ -1,7 +1,36 @@
-from typing import Dict, Any, List
+import re
+from functools import lru_cache
+from typing import Dict, Any, Iterable, List, Optional, Union
 import json
 from pydantic import BaseModel
 
+# Distinct normalized prompts whose parsed specs are kept
+PROMPT_CACHE_SIZE = 4096
+
+METHODS = ('get', 'post', 'put', 'delete', 'patch')
+
+# One alternative per kind of token, scanned left to right in a single pass from word
+# starts only. Earlier alternatives win where they overlap: a URL is never searched for
+# users or methods, and "2 second think time" is a think time, not the run time. Method
+# tokens look ahead for their path without consuming it, so "get 10 users" still counts
+# the users.
+PROMPT_TOKEN = re.compile(
+    r'\b(?=[\dhsgpdj])(?:'
+    r'(?P<url>https?://\S+)'
+    r'|spawn\s*(?:rate|speed)?\s*(?:of)?\s*(?P<spawn>\d+)'
+    r'|(?P<number>\d+(?:\.\d+)?)\s*(?:'
+    r'(?P<think>(?:seconds?|secs?|s)\s+(?:of\s+)?think\s*time)'
+    r'|(?P<users>users?)\b'
+    r'|(?P<weight>times?\s*more)'
+    r'|(?P<unit>seconds?|secs?|s|minutes?|mins?|m|hours?|hrs?|h)\b)'
+    r'|(?P<method>get|post|put|delete|patch)\b(?=(?:\s+(?:from|to)?\s*(?P<path>[/\w]+))?)'
+    r'|(?P<json>json))',
+    re.IGNORECASE
+)
+# Curl prompts are passed through to the generator; only the run settings around them are read
+CURL_USERS = re.compile(r'with\s+(\d+)\s+users?')
+CURL_DURATION = re.compile(r'for\s+(\d+)\s*(s|seconds?|m|minutes?|h|hours?)')
+
 class LoadTestSpec(BaseModel):
     """Specification for a load test"""
     targetUrl: str
@@ -10,6 +39,123 @@ class LoadTestSpec(BaseModel):
     spawnRate: int = 1
     runTime: str = "30s"
     prompt: str = None  # Added to store original curl command if present
+    dataFile: Optional[Dict[str, Any]] = None  # {"path": CSV/JSONL file, "mode": sequential|random|unique}
+    warmup: Optional[Union[int, float, str]] = None  # seconds, a duration like "30s", or "ramp"
+    cooldown: Optional[Union[int, float, str]] = None
+    steadyState: bool = False
+    thinkTime: Optional[Dict[str, float]] = None  # {"min": seconds, "max": seconds}, default 1-5
+    targetRps: Optional[float] = None  # size users and spawn rate for this throughput with a latency probe
+    seed: Optional[int] = None  # makes think times, task choice and random data the same on every run
+    connections: Optional[Dict[str, Any]] = None  # {"mode": keepalive|close|pool, "poolSize": n, "timing": bool, "verify": bool or CA bundle}
+    tracing: Optional[Dict[str, Any]] = None  # {"sampleRate": 0 to 1}, sends W3C traceparent headers on that share of requests
+
+def _run_time(value: str, unit: str) -> str:
+    unit = unit.lower()
+    if unit.startswith('m'):
+        return f"{value}m"
+    if unit.startswith('h'):
+        return f"{value}h"
+    return f"{value}s"
+
+def normalize_prompt(prompt: str) -> str:
+    """Cache key of a prompt: curl commands exactly as given, anything else with whitespace collapsed"""
+    if prompt.lstrip().startswith('curl'):
+        return prompt
+    return ' '.join(prompt.split())
+
+def _parse_curl(prompt: str) -> Dict[str, Any]:
+    config = {
+        "targetUrl": "http://localhost:8000",  # Will be overridden by the generator
+        "endpoints": [],  # Will be handled by the generator
+        "prompt": prompt  # Pass through the curl command
+    }
+
+    # Look for users and run time in the prompt
+    users_match = CURL_USERS.search(prompt)
+    if users_match:
+        config["users"] = int(users_match.group(1))
+
+    time_match = CURL_DURATION.search(prompt)
+    if time_match:
+        config["runTime"] = _run_time(*time_match.groups())
+
+    return config
+
+def _parse_text(prompt: str) -> Dict[str, Any]:
+    config: Dict[str, Any] = {}
+    has_json = False
+    # First mention of each method: [path, weight]
+    endpoints: Dict[str, List[Any]] = {}
+    last_method = None
+
+    for token in PROMPT_TOKEN.finditer(prompt):
+        kind = token.lastgroup
+        if kind == 'path':
+            # The method token's lookahead is the last group that matched
+            kind = 'method'
+        if kind == 'method':
+            last_method = token.group('method').lower()
+            if last_method not in endpoints:
+                path = token.group('path') or "/"
+                if not path.startswith('/'):
+                    path = f"/{path}"
+                endpoints[last_method] = [path, 1]
+        elif kind == 'url':
+            config.setdefault("targetUrl", token.group('url'))
+        elif kind == 'spawn':
+            config.setdefault("spawnRate", int(token.group('spawn')))
+        elif kind == 'json':
+            has_json = True
+        else:
+            number = float(token.group('number'))
+            if kind == 'users':
+                config.setdefault("users", int(number))
+            elif kind == 'unit':
+                config.setdefault("runTime", _run_time(f"{int(number)}", token.group('unit')))
+            elif kind == 'think':
+                config.setdefault("thinkTime", {"min": number, "max": number})
+            elif kind == 'weight' and last_method is not None:
+                # "N times more" weights the method mentioned last before it
+                endpoints[last_method][1] = int(number)
+
+    endpoint_list = []
+    for method in METHODS:
+        if method not in endpoints:
+            continue
+        path, weight = endpoints[method]
+        # Check for request body for POST/PUT/PATCH
+        data = None
+        if method in ('post', 'put', 'patch') and has_json:
+            data = {"title": "Test Data", "body": "This is test data"}
+        endpoint_list.append({
+            "method": method.upper(),
+            "path": path,
+            "data": data,
+            "weight": weight
+        })
+
+    # If no specific endpoints were found, add a default GET endpoint
+    config["endpoints"] = endpoint_list or [{"method": "GET", "path": "/", "weight": 1}]
+    config.setdefault("targetUrl", "http://localhost:8000")
+    return config
+
+@lru_cache(maxsize=PROMPT_CACHE_SIZE)
+def _parse_normalized(prompt: str) -> Dict[str, Any]:
+    """The LoadTestSpec fields of a normalized prompt; callers must not modify the result"""
+    if prompt.lstrip().startswith('curl'):
+        return _parse_curl(prompt)
+    return _parse_text(prompt)
+
+def _build_spec(fields: Dict[str, Any]) -> LoadTestSpec:
+    """A spec from cached fields, with its own copies of the nested dicts"""
+    fields = dict(fields)
+    fields["endpoints"] = [
+        {key: dict(value) if isinstance(value, dict) else value for key, value in endpoint.items()}
+        for endpoint in fields["endpoints"]
+    ]
+    if "thinkTime" in fields:
+        fields["thinkTime"] = dict(fields["thinkTime"])
+    return LoadTestSpec(**fields)
 
 class PromptGenerator:
     """Converts natural language prompts into load test specifications"""
@@ -18,105 +164,28 @@ class PromptGenerator:
         """
         Parse a natural language prompt into a load test specification.
         Now handles both natural language and curl commands.
+        Prompts that only differ in whitespace are parsed once and then served from a cache.
         """
-        # Check if this is a curl command
-        if prompt.strip().startswith('curl'):
-            # Extract URL and command
-            curl_parts = prompt.split('\n')
-            main_command = curl_parts[0]
-            
-            config = LoadTestSpec(
-                targetUrl="http://localhost:8000",  # Will be overridden by the generator
-                endpoints=[],  # Will be handled by the generator
-                prompt=prompt  # Pass through the curl command
-            )
-            
-            # Look for users and run time in the prompt
-            users_match = re.search(r'with\s+(\d+)\s+users?', prompt)
-            if users_match:
-                config.users = int(users_match.group(1))
-                
-            time_match = re.search(r'for\s+(\d+)\s*(s|seconds?|m|minutes?|h|hours?)', prompt)
-            if time_match:
-                value, unit = time_match.groups()
-                if unit.startswith('m'):
-                    config.runTime = f"{value}m"
-                elif unit.startswith('h'):
-                    config.runTime = f"{value}h"
-                else:
-                    config.runTime = f"{value}s"
-                    
-            return config
-            
-        prompt_lower = prompt.lower()
-        
-        # Extract URL
-        import re
-        url_match = re.search(r'https?://[^\s]+', prompt)
-        target_url = url_match.group(0) if url_match else "http://localhost:8000"
-        
-        # Extract number of users
-        users_match = re.search(r'(\d+)\s*users?', prompt_lower)
-        users = int(users_match.group(1)) if users_match else 10
-        
-        # Extract run time
-        time_match = re.search(r'(\d+)\s*(s|seconds?|m|minutes?|h|hours?)', prompt_lower)
-        if time_match:
-            value, unit = time_match.groups()
-            if unit.startswith('m'):
-                run_time = f"{value}m"
-            elif unit.startswith('h'):
-                run_time = f"{value}h"
-            else:
-                run_time = f"{value}s"
-        else:
-            run_time = "30s"
-        
-        # Extract spawn rate
-        spawn_match = re.search(r'spawn\s*(?:rate|speed)?\s*(?:of)?\s*(\d+)', prompt_lower)
-        spawn_rate = int(spawn_match.group(1)) if spawn_match else 1
-        
-        # Determine endpoints and methods
-        endpoints = []
-        
-        # Check for common HTTP methods
-        for method in ['get', 'post', 'put', 'delete', 'patch']:
-            if method in prompt_lower:
-                path = "/"
-                weight = 1
-                
-                # Try to extract path
-                path_match = re.search(f'{method}\\s+(?:from|to)?\\s*([/\\w]+)', prompt_lower)
-                if path_match:
-                    path = path_match.group(1)
-                    if not path.startswith('/'):
-                        path = f"/{path}"
-                
-                # Check for request body for POST/PUT/PATCH
-                data = None
-                if method in ['post', 'put', 'patch'] and 'json' in prompt_lower:
-                    data = {"title": "Test Data", "body": "This is test data"}
-                
-                # Extract weight/priority
-                weight_match = re.search(f'{method}.*?(\\d+)\\s*times?\\s*more', prompt_lower)
-                if weight_match:
-                    weight = int(weight_match.group(1))
-                
-                endpoints.append({
-                    "method": method.upper(),
-                    "path": path,
-                    "data": data,
-                    "weight": weight
-                })
-        
-        # If no specific endpoints were found, add a default GET endpoint
-        if not endpoints:
-            endpoints = [{"method": "GET", "path": "/", "weight": 1}]
-            
-        return LoadTestSpec(
-            targetUrl=target_url,
-            endpoints=endpoints,
-            users=users,
-            spawnRate=spawn_rate,
-            runTime=run_time
-        )
+        return _build_spec(_parse_normalized(normalize_prompt(prompt)))
+
+    def parse_prompts(self, prompts: Iterable[str]) -> List[LoadTestSpec]:
+        """Parse many prompts at once; each distinct prompt in the batch is parsed only once"""
+        parsed: Dict[str, Dict[str, Any]] = {}
+        specs = []
+        for prompt in prompts:
+            key = normalize_prompt(prompt)
+            fields = parsed.get(key)
+            if fields is None:
+                fields = parsed[key] = _parse_normalized(key)
+            specs.append(_build_spec(fields))
+        return specs
+
+    @staticmethod
+    def cache_info():
+        """Hits, misses and size of the parsed prompt cache"""
+        return _parse_normalized.cache_info()
+
+    @staticmethod
+    def cache_clear():
+        """Empty the parsed prompt cache"""
+        _parse_normalized.cache_clear()
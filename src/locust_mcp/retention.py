@@ -0,0 +1,114 @@
+import os
+import re
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Set, Union
+from urllib.parse import urlparse
+
+AGE_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def parse_age(age: Union[int, float, str, None]) -> Optional[float]:
+    """Seconds from a number of seconds or an age such as '12h', '30d' or '1w2d'"""
+    if age is None or age == "":
+        return None
+    if isinstance(age, (int, float)):
+        return float(age)
+    parts = re.findall(r'(\d+(?:\.\d+)?)\s*([smhdw]?)', age.strip().lower())
+    if not parts or re.sub(r'[\d.\ssmhdw]', '', age.lower()):
+        raise ValueError(f"Invalid age: {age}")
+    return sum(float(value) * AGE_UNITS[unit or "s"] for value, unit in parts)
+
+
+def test_host(test_info: Dict[str, Any]) -> str:
+    """Host a stored test targets, from its config's host or targetUrl"""
+    config = test_info.get("config") or {}
+    url = config.get("host") or config.get("targetUrl") or ""
+    return urlparse(url).netloc or url
+
+
+def test_time(test_info: Dict[str, Any]) -> datetime:
+    try:
+        return datetime.fromisoformat(test_info["timestamp"])
+    except (KeyError, TypeError, ValueError):
+        return datetime.min
+
+
+class RetentionPolicy:
+    """
+    Which stored tests stay as loose files. A test is kept if any rule keeps it, like
+    restic's --keep-* options: it is younger than max_age, among the newest max_count tests,
+    or among the newest keep_per_host tests for its host. Without rules every test is kept.
+    Archived tests older than max_archive_age are deleted.
+    """
+
+    def __init__(self, max_age: Union[int, float, str, None] = None, max_count: Optional[int] = None,
+                 keep_per_host: Optional[int] = None, max_archive_age: Union[int, float, str, None] = None):
+        self.max_age = parse_age(max_age)
+        self.max_count = int(max_count) if max_count not in (None, "") else None
+        self.keep_per_host = int(keep_per_host) if keep_per_host not in (None, "") else None
+        self.max_archive_age = parse_age(max_archive_age)
+        for name in ("max_age", "max_count", "keep_per_host", "max_archive_age"):
+            value = getattr(self, name)
+            if value is not None and value < 0:
+                raise ValueError(f"Retention {name} must not be negative")
+
+    @classmethod
+    def from_params(cls, params: Dict[str, Any]) -> "RetentionPolicy":
+        """A policy from camelCase command params"""
+        return cls(
+            max_age=params.get("maxAge"),
+            max_count=params.get("maxCount"),
+            keep_per_host=params.get("keepPerHost"),
+            max_archive_age=params.get("maxArchiveAge")
+        )
+
+    @classmethod
+    def from_env(cls) -> "RetentionPolicy":
+        """A policy from the LOCUST_MCP_RETENTION_* environment variables"""
+        return cls(
+            max_age=os.environ.get("LOCUST_MCP_RETENTION_MAX_AGE"),
+            max_count=os.environ.get("LOCUST_MCP_RETENTION_MAX_COUNT"),
+            keep_per_host=os.environ.get("LOCUST_MCP_RETENTION_KEEP_PER_HOST"),
+            max_archive_age=os.environ.get("LOCUST_MCP_RETENTION_MAX_ARCHIVE_AGE")
+        )
+
+    @property
+    def is_set(self) -> bool:
+        return any(value is not None for value in (self.max_age, self.max_count, self.keep_per_host,
+                                                   self.max_archive_age))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "max_age": self.max_age,
+            "max_count": self.max_count,
+            "keep_per_host": self.keep_per_host,
+            "max_archive_age": self.max_archive_age
+        }
+
+    def kept(self, history: List[Dict[str, Any]], now: Optional[datetime] = None) -> Set[str]:
+        """IDs of the tests in history that stay as loose files"""
+        if self.max_age is None and self.max_count is None and self.keep_per_host is None:
+            return {test["id"] for test in history}
+        now = now or datetime.now()
+        newest_first = sorted(history, key=test_time, reverse=True)
+        keep: Set[str] = set()
+        if self.max_age is not None:
+            keep.update(test["id"] for test in newest_first
+                        if (now - test_time(test)).total_seconds() <= self.max_age)
+        if self.max_count is not None:
+            keep.update(test["id"] for test in newest_first[:self.max_count])
+        if self.keep_per_host is not None:
+            per_host: Dict[str, int] = defaultdict(int)
+            for test in newest_first:
+                host = test_host(test)
+                if per_host[host] < self.keep_per_host:
+                    per_host[host] += 1
+                    keep.add(test["id"])
+        return keep
+
+    def expired(self, test_info: Dict[str, Any], now: Optional[datetime] = None) -> bool:
+        """Whether an archived test is old enough to delete"""
+        if self.max_archive_age is None:
+            return False
+        return ((now or datetime.now()) - test_time(test_info)).total_seconds() > self.max_archive_age
@@ -0,0 +1,303 @@
+# Live fan-out of the events of runs in progress to any number of subscribers. Every run
+# is registered as a LiveRun while it runs; each of its events is serialized once and the
+# same text is queued for every subscriber, whose own sender task writes its queue to its
+# connection, so a slow subscriber never holds up the run or the others. Queues are
+# bounded: when a subscriber falls behind, its two oldest queued stats updates are
+# coalesced into one covering both intervals, so no requests go missing from its updates.
+# A subscriber whose queue is full of other events is too far behind and is ended with an
+# "unsubscribed" event. The snapshot and the result are always queued.
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+from locust_mcp.failure_groups import FailureGroups
+from locust_mcp.run_hooks import MARKS
+from locust_mcp.trace_context import slowest
+from locust_mcp.windowed_stats import percentile
+
+logger = logging.getLogger(__name__)
+
+# Messages queued per subscriber before its oldest stats updates are coalesced
+DEFAULT_QUEUE_SIZE = 16
+# Per-interval throughput samples of the run's recent past in the snapshot for late joiners
+SNAPSHOT_INTERVALS = 60
+# Drift alerts in the snapshot
+SNAPSHOT_ALERTS = 20
+
+Send = Callable[[str], Awaitable[None]]
+
+
+def coalesce_stats(earlier: Dict[str, Any], later: Dict[str, Any]) -> Dict[str, Any]:
+    """One stats update message covering the intervals of two, with the later one's totals"""
+    entries = {(delta["name"], delta["method"]): dict(delta, response_times=dict(delta.get("response_times") or {}))
+               for delta in earlier.get("entries") or []}
+    for delta in later.get("entries") or []:
+        entry = entries.get((delta["name"], delta["method"]))
+        if entry is None:
+            entries[(delta["name"], delta["method"])] = delta
+            continue
+        for field in ("num_requests", "num_failures", "total_response_time"):
+            entry[field] += delta[field]
+        for value, count in (delta.get("response_times") or {}).items():
+            entry["response_times"][value] = entry["response_times"].get(value, 0) + count
+        if entry.get("exemplars") or delta.get("exemplars"):
+            size = max(len(entry.get("exemplars", [])), len(delta.get("exemplars", [])))
+            entry["exemplars"] = slowest(entry.get("exemplars", []) + delta.get("exemplars", []), size)
+    return {**later, "start": earlier["start"], "entries": list(entries.values())}
+
+
+class Subscriber:
+    """One subscriber of a run: a bounded queue of serialized messages and the task sending them"""
+
+    def __init__(self, send: Send, queue_size: int = DEFAULT_QUEUE_SIZE):
+        self._send = send
+        self._queue_size = max(2, queue_size)
+        # (stats update message or None, text); stats updates can be coalesced
+        self._queue: Deque[Tuple[Optional[Dict[str, Any]], str]] = deque()
+        self._ready = asyncio.Event()
+        self._closed = False
+        self.coalesced = 0
+        self.task = asyncio.create_task(self._drain())
+
+    def put(self, text: str, stats: Optional[Dict[str, Any]] = None, essential: bool = False) -> bool:
+        """
+        Queue a message; stats is the message of a stats update. When the queue is full, its
+        two oldest stats updates are coalesced; without two, the message is only queued if
+        essential, i.e. the snapshot or the result. False if the subscriber is too far behind.
+        """
+        if self._closed:
+            return True
+        if len(self._queue) >= self._queue_size and not essential and not self._coalesce():
+            return False
+        self._queue.append((stats, text))
+        self._ready.set()
+        return True
+
+    def _coalesce(self) -> bool:
+        indexes = [index for index, (stats, _) in enumerate(self._queue) if stats is not None][:2]
+        if len(indexes) < 2:
+            return False
+        earlier, later = self._queue[indexes[0]][0], self._queue[indexes[1]][0]
+        merged = coalesce_stats(earlier, later)
+        # Into the later update's place, so the totals never appear earlier than they did
+        self._queue[indexes[1]] = (merged, json.dumps(merged))
+        del self._queue[indexes[0]]
+        self.coalesced += 1
+        return True
+
+    def close(self):
+        """Stop once the messages already queued are sent"""
+        self._closed = True
+        self._ready.set()
+
+    def end(self, text: str):
+        """Stop after sending text, dropping the messages not sent yet"""
+        self._queue.clear()
+        self._queue.append((None, text))
+        self.close()
+
+    @property
+    def alive(self) -> bool:
+        return not self.task.done()
+
+    async def _drain(self):
+        try:
+            while True:
+                while self._queue:
+                    _, text = self._queue.popleft()
+                    await self._send(text)
+                if self._closed:
+                    return
+                self._ready.clear()
+                await self._ready.wait()
+        except Exception as e:
+            # The connection is gone; the run drops this subscriber on its next event
+            logger.debug(f"Subscriber stopped: {str(e)}")
+            self._queue.clear()
+            self._closed = True
+
+
+class LiveRun:
+    """
+    A run in progress: its milestones and cumulative stats so far, for snapshots, and its
+    subscribers. Only used from the event loop.
+    """
+
+    def __init__(self, run_id: str, info: Dict[str, Any], queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.run_id = run_id
+        self.info = info
+        self.queue_size = queue_size
+        self.started = time.time()
+        self.marks: Dict[str, float] = {}
+        # Cumulative requests, failures, total response time and response time histogram per (name, method)
+        self.entries: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.response_times: Dict[float, int] = {}
+        self.recent: Deque[List[float]] = deque(maxlen=SNAPSHOT_INTERVALS)
+        self.failures = FailureGroups.from_env()
+        self.alerts: Deque[Dict[str, Any]] = deque(maxlen=SNAPSHOT_ALERTS)
+        self.subscribers: Dict[Hashable, Subscriber] = {}
+        self.finished = False
+
+    def _add_stats(self, event: Dict[str, Any]):
+        requests = failures = 0
+        for delta in event.get("entries") or []:
+            entry = self.entries.setdefault((delta["name"], delta["method"]), {
+                "num_requests": 0, "num_failures": 0, "total_response_time": 0
+            })
+            entry["num_requests"] += delta["num_requests"]
+            entry["num_failures"] += delta["num_failures"]
+            entry["total_response_time"] += delta["total_response_time"]
+            requests += delta["num_requests"]
+            failures += delta["num_failures"]
+            for value, count in (delta.get("response_times") or {}).items():
+                value = float(value)
+                self.response_times[value] = self.response_times.get(value, 0) + count
+        duration = max(event["time"] - event["start"], 1e-9)
+        self.recent.append([round(event["time"] - self.started, 3), requests, failures, round(requests / duration, 2)])
+
+    def totals(self) -> Dict[str, Any]:
+        """Whole-run totals over all requests so far"""
+        requests = sum(entry["num_requests"] for entry in self.entries.values())
+        failures = sum(entry["num_failures"] for entry in self.entries.values())
+        total_time = sum(entry["total_response_time"] for entry in self.entries.values())
+        return {
+            "num_requests": requests,
+            "num_failures": failures,
+            "avg_response_time": total_time / requests if requests else 0,
+            "median_response_time": percentile(self.response_times, requests, 0.5),
+            "p95_response_time": percentile(self.response_times, requests, 0.95),
+            "current_rps": self.recent[-1][3] if self.recent else 0
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """The run so far, compactly: milestones, totals per entry, recent throughput, failure groups and drift alerts"""
+        return {
+            "type": "snapshot",
+            "runId": self.run_id,
+            **self.info,
+            "started": self.started,
+            "timing": {key: round(self.marks[key] - self.started, 4) for key in MARKS if key in self.marks},
+            "totals": self.totals(),
+            "entries": [
+                {"name": name, "method": method, **entry,
+                 "avg_response_time": entry["total_response_time"] / entry["num_requests"] if entry["num_requests"] else 0}
+                for (name, method), entry in self.entries.items()
+            ],
+            # [seconds since the run started, requests, failures, requests per second]
+            "recent": list(self.recent),
+            # Without their samples, which subscribers get with the "failures" events
+            "failures": self.failures.summary(samples=False),
+            # The latest latency drift and throughput decay alerts
+            "alerts": list(self.alerts)
+        }
+
+    def _broadcast(self, message: Dict[str, Any], stats: bool = False, essential: bool = False):
+        for key, subscriber in list(self.subscribers.items()):
+            if not subscriber.alive:
+                del self.subscribers[key]
+        if not self.subscribers:
+            return
+        text = json.dumps(message)
+        for key, subscriber in list(self.subscribers.items()):
+            if not subscriber.put(text, message if stats else None, essential):
+                logger.warning(f"A subscriber of run {self.run_id} fell too far behind; ending its subscription")
+                del self.subscribers[key]
+                subscriber.end(json.dumps({"type": "event", "runId": self.run_id, "event": "unsubscribed",
+                                           "reason": "The subscriber fell too far behind the run"}))
+
+    def publish(self, event: Dict[str, Any]):
+        """Record a run hook event and send it to every subscriber"""
+        if self.finished:
+            return
+        kind = event.get("event")
+        message = {"type": "event", "runId": self.run_id, **event}
+        if kind == "stats":
+            self._add_stats(event)
+            if self.subscribers:
+                message["totals"] = self.totals()
+        elif kind == "failures":
+            self.failures.merge(event["groups"], event.get("pid"))
+        elif kind == "drift":
+            self.alerts.append(event)
+        elif kind in MARKS:
+            self.marks.setdefault(kind, event["time"])
+        self._broadcast(message, stats=kind == "stats")
+
+    def subscribe(self, key: Hashable, send: Send) -> Subscriber:
+        """Add a subscriber, replacing an earlier one with the same key; its first message is a snapshot"""
+        previous = self.subscribers.pop(key, None)
+        if previous is not None:
+            previous.close()
+        subscriber = Subscriber(send, self.queue_size)
+        subscriber.put(json.dumps(self.snapshot()), essential=True)
+        self.subscribers[key] = subscriber
+        return subscriber
+
+    def unsubscribe(self, key: Hashable) -> bool:
+        subscriber = self.subscribers.pop(key, None)
+        if subscriber is None:
+            return False
+        subscriber.close()
+        return True
+
+    def finish(self, result: Dict[str, Any]):
+        """Send the run's result to every subscriber, then end their subscriptions"""
+        self._broadcast({"type": "event", "runId": self.run_id, "event": "result", "result": result}, essential=True)
+        self.finished = True
+        for subscriber in self.subscribers.values():
+            subscriber.close()
+        self.subscribers.clear()
+
+
+class RunBroadcaster:
+    """The runs in progress on this server, by run ID, and their subscribers"""
+
+    def __init__(self, queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.runs: Dict[str, LiveRun] = {}
+
+    def start(self, run_id: str, **info) -> LiveRun:
+        live_run = LiveRun(run_id, info, self.queue_size)
+        self.runs[run_id] = live_run
+        return live_run
+
+    def listener(self, live_run: LiveRun) -> Callable[[Dict[str, Any]], None]:
+        """A run listener publishing to live_run; safe to call from any thread"""
+        loop = asyncio.get_running_loop()
+        return lambda event: loop.call_soon_threadsafe(live_run.publish, event)
+
+    def finish(self, run_id: str, result: Dict[str, Any]):
+        live_run = self.runs.pop(run_id, None)
+        if live_run is not None:
+            live_run.finish(result)
+
+    def subscribe(self, run_id: str, key: Hashable, send: Send) -> LiveRun:
+        live_run = self.runs.get(run_id)
+        if live_run is None:
+            raise ValueError(f"Run {run_id} is not in progress")
+        live_run.subscribe(key, send)
+        return live_run
+
+    def unsubscribe(self, run_id: str, key: Hashable) -> bool:
+        live_run = self.runs.get(run_id)
+        return live_run is not None and live_run.unsubscribe(key)
+
+    def drop(self, key: Hashable):
+        """End every subscription of key, e.g. a closed connection"""
+        for live_run in self.runs.values():
+            live_run.unsubscribe(key)
+
+    def live(self) -> List[Dict[str, Any]]:
+        """The runs in progress, with their subscriber counts"""
+        return [
+            {"run_id": run_id, **live_run.info, "started": live_run.started,
+             "subscribers": len(live_run.subscribers), "totals": live_run.totals()}
+            for run_id, live_run in self.runs.items()
+        ]
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(live_run.subscribers) for live_run in self.runs.values())
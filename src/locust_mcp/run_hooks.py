@@ -0,0 +1,329 @@
+# Run instrumentation shared by the runners. install() registers listeners on a Locust
+# Events object that report run milestones and per-interval stats through a callback; the
+# CLI runner appends CLI_HOOK_SOURCE to generated scripts so the locust process prints them
+# on stderr. Locust and gevent are only imported inside the listeners, so the MCP server
+# can use the helpers below.
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from locust_mcp.connection_timing import ConnectionTimings
+from locust_mcp.cpu_affinity import CORES_ENV, current_cores, parse_core_list, set_affinity
+from locust_mcp.failure_groups import FailureGroups
+from locust_mcp.trace_context import ExemplarReservoir, ExemplarSeries, IntervalExemplars, exemplar_count
+from locust_mcp.trend_analysis import TrendTracker
+
+EVENT_PREFIX = "LOCUST_MCP_EVENT "
+# The seed of a seeded run, for its locust processes to seed their random module with
+SEED_ENV = "LOCUST_MCP_SEED"
+# Seconds between stats samples; windows over the run are built from these intervals
+STATS_INTERVAL = 1.0
+# Approximate JSON size of one "failures" event; larger reports are split over several events
+FAILURES_EVENT_BYTES = 256 * 1024
+
+# Appended to scripts run through the locust command line; skipped if locust_mcp isn't importable there
+CLI_HOOK_SOURCE = """
+
+try:
+    from locust_mcp.run_hooks import install_cli_hooks
+except ImportError:
+    pass
+else:
+    install_cli_hooks()
+"""
+
+# Run milestones in the order they happen. The runners record when a run was requested,
+# got a slot or worker, wrote its script and spawned its process; worker processes record
+# when they were ready and received the run; the hooks record the Locust milestones; and
+# "finished" is when the results are back in the runner.
+MARKS = ("requested", "acquired", "script_written", "spawned", "ready", "received",
+         "started", "first_request", "ramp_complete", "stopped", "finished")
+
+# Phase name, start marks (first one present wins) and end mark
+PHASES = (
+    ("queue_wait", ("requested",), "acquired"),
+    ("script_write", ("acquired",), "script_written"),
+    ("process_spawn", ("script_written", "acquired"), "spawned"),
+    ("startup", ("spawned", "acquired"), "started"),
+    ("time_to_first_request", ("requested",), "first_request"),
+    ("ramp_up", ("started",), "ramp_complete"),
+    ("steady_state", ("ramp_complete",), "stopped"),
+    ("stats_collection", ("stopped",), "finished"),
+    ("total", ("requested",), "finished"),
+)
+
+
+def _stats_deltas(stats, previous: Dict[Tuple[str, str], Tuple]) -> List[Dict[str, Any]]:
+    """Changes of every stats entry since the previous sample, updating previous in place"""
+    deltas = []
+    for key, entry in list(stats.entries.items()):
+        last = previous.get(key)
+        # Entries restart from zero when Locust resets its stats
+        if last is None or entry.num_requests < last[0]:
+            last = (0, 0, 0, {})
+        if entry.num_requests == last[0] and entry.num_failures == last[1]:
+            continue
+        last_times = last[3]
+        deltas.append({
+            "name": key[0],
+            "method": key[1],
+            "num_requests": entry.num_requests - last[0],
+            "num_failures": entry.num_failures - last[1],
+            "total_response_time": entry.total_response_time - last[2],
+            "response_times": {
+                value: count - last_times.get(value, 0)
+                for value, count in entry.response_times.items()
+                if count != last_times.get(value, 0)
+            }
+        })
+        previous[key] = (entry.num_requests, entry.num_failures, entry.total_response_time, dict(entry.response_times))
+    return deltas
+
+
+def install(events, emit: Callable[[Dict[str, Any]], None], stats_interval: float = STATS_INTERVAL):
+    """
+    Register listeners on a Locust Events object that emit {"event", "time", ...} dicts:
+    the run milestones in MARKS, and every stats_interval seconds a "stats" event with the
+    requests made since the previous one. Stats are only sampled where they are complete,
+    i.e. not on the worker processes of a distributed run. Failed requests are grouped in
+    the process that made them, which emits a "failures" event with the groups that
+    changed every stats_interval seconds; likewise a "connections" event with the phase
+    timings of requests on connections timed by connection_timing.use_connections, and an
+    "exemplars" event with the slowest requests traced by trace_context.use_tracing.
+    """
+    seen_request = False
+    previous: Dict[Tuple[str, str], Tuple] = {}
+    sampler = None
+    last_sample = 0.0
+    failures = FailureGroups.from_env()
+    connections = ConnectionTimings()
+    exemplars = ExemplarReservoir(exemplar_count())
+    reporter = None
+
+    def sample(stats):
+        nonlocal last_sample
+        now = time.time()
+        emit({"event": "stats", "start": last_sample, "time": now, "entries": _stats_deltas(stats, previous)})
+        last_sample = now
+
+    def sample_periodically(stats):
+        import gevent
+        while True:
+            gevent.sleep(stats_interval)
+            sample(stats)
+
+    def report_failures():
+        batch, size = [], 0
+        for group in failures.delta():
+            group_size = len(json.dumps(group))
+            if batch and size + group_size > FAILURES_EVENT_BYTES:
+                emit({"event": "failures", "time": time.time(), "pid": os.getpid(), "groups": batch})
+                batch, size = [], 0
+            batch.append(group)
+            size += group_size
+        if batch:
+            emit({"event": "failures", "time": time.time(), "pid": os.getpid(), "groups": batch})
+
+    def report():
+        report_failures()
+        endpoints = connections.delta()
+        if endpoints:
+            emit({"event": "connections", "time": time.time(), "pid": os.getpid(), "endpoints": endpoints})
+        endpoints = exemplars.take()
+        if endpoints:
+            emit({"event": "exemplars", "time": time.time(), "pid": os.getpid(), "endpoints": endpoints})
+
+    def report_periodically():
+        import gevent
+        while True:
+            gevent.sleep(stats_interval)
+            report()
+
+    def on_test_start(environment, **kwargs):
+        nonlocal sampler, reporter, last_sample
+        import gevent
+        from locust.runners import MasterRunner, WorkerRunner
+
+        last_sample = time.time()
+        emit({"event": "started", "time": last_sample})
+        if sampler is None and not isinstance(environment.runner, WorkerRunner):
+            sampler = gevent.spawn(sample_periodically, environment.stats)
+        # The master of a distributed run makes no requests itself
+        if reporter is None and not isinstance(environment.runner, MasterRunner):
+            reporter = gevent.spawn(report_periodically)
+
+    def on_request(request_type=None, name=None, response_time=None, exception=None, response=None,
+                   start_time=None, **kwargs):
+        nonlocal seen_request
+        if not seen_request:
+            seen_request = True
+            emit({"event": "first_request", "time": time.time()})
+        if exception is not None:
+            failures.record(request_type, name, exception, response, time.time())
+        if response is not None:
+            connections.record(request_type, name, response, start_time, response_time or 0)
+            exemplars.record(request_type, name, response, response_time or 0, start_time or time.time())
+
+    def on_spawning_complete(user_count, **kwargs):
+        emit({"event": "ramp_complete", "time": time.time(), "user_count": user_count})
+
+    def on_test_stop(environment, **kwargs):
+        nonlocal sampler, reporter
+        if sampler is not None:
+            sampler.kill()
+            sampler = None
+            sample(environment.stats)
+        if reporter is not None:
+            reporter.kill()
+            reporter = None
+            report()
+        emit({"event": "stopped", "time": time.time()})
+
+    events.test_start.add_listener(on_test_start)
+    events.request.add_listener(on_request)
+    events.spawning_complete.add_listener(on_spawning_complete)
+    events.test_stop.add_listener(on_test_stop)
+
+
+def _emit_to_stderr(event: Dict[str, Any]):
+    sys.stderr.write(EVENT_PREFIX + json.dumps(event) + "\n")
+    sys.stderr.flush()
+
+
+def _worker_index(environment) -> Optional[int]:
+    """The index of a worker process of a distributed run; None for the master or the only process"""
+    from locust.runners import WorkerRunner
+
+    if isinstance(environment.runner, WorkerRunner):
+        return environment.runner.worker_index
+    return None
+
+
+def pin_process(environment, emit: Callable[[Dict[str, Any]], None]):
+    """
+    Pin a worker process of a distributed run to one of the run's dedicated cores, by its
+    worker index, and emit a "cpu" event with the cores the process runs on. The master,
+    or the only process, keeps the whole set it was started with.
+    """
+    cores = parse_core_list(os.environ.get(CORES_ENV, ""))
+    worker_index = _worker_index(environment)
+    if worker_index is not None and cores:
+        set_affinity(0, [cores[worker_index % len(cores)]])
+    emit({"event": "cpu", "time": time.time(), "pid": os.getpid(),
+          "worker_index": worker_index, "cores": current_cores()})
+
+
+def seed_random(seed: Optional[int], worker_index: Optional[int] = None):
+    """
+    Seed the random module of a locust process for a seeded run, before its users start.
+    Think times, task choice, random feeder rows and generated path values all draw from
+    it, so they repeat from run to run. Each worker process gets its own sequence.
+    """
+    if seed is not None:
+        random.seed(f"{seed}:{worker_index or 0}")
+
+
+def install_cli_hooks():
+    """Install the run hooks in a locust command line process, reporting on stderr."""
+    import locust
+    install(locust.events, _emit_to_stderr)
+
+    # Workers are forked after this module is imported and get their index on connecting
+    def on_test_start(environment, **kwargs):
+        pin_process(environment, _emit_to_stderr)
+        seed = os.environ.get(SEED_ENV)
+        seed_random(int(seed) if seed else None, _worker_index(environment))
+
+    locust.events.test_start.add_listener(on_test_start)
+
+
+def parse_event_line(line: str) -> Optional[Dict[str, Any]]:
+    """Return the event on a line of locust stderr output, or None for ordinary output"""
+    if not line.startswith(EVENT_PREFIX):
+        return None
+    try:
+        return json.loads(line[len(EVENT_PREFIX):])
+    except ValueError:
+        return None
+
+
+class RunRecorder:
+    """
+    Collects the milestones, stats intervals, failure groups, connection timings and
+    exemplars reported by a run's hooks, and passes every event on to listener, if given,
+    as it arrives. Exemplars are also attached to the entries of the intervals their
+    requests counted in. Stats intervals after the ramp-up also feed the run's trends, one
+    interval behind, as its exemplars are reported after it; the "drift" events they raise
+    follow the next interval to listener, or are passed on by finish().
+    """
+
+    def __init__(self, marks: Optional[Dict[str, float]] = None,
+                 listener: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.marks = marks if marks is not None else {}
+        self.listener = listener
+        self.intervals: List[Dict[str, Any]] = []
+        # Merged from the reports of all of the run's locust processes
+        self.failures = FailureGroups.from_env()
+        self.connections = ConnectionTimings()
+        self.exemplars = ExemplarSeries(exemplar_count(), STATS_INTERVAL)
+        self.interval_exemplars = IntervalExemplars(exemplar_count())
+        # The latest interval, not yet added to the trends
+        self.unanalyzed: Optional[Dict[str, Any]] = None
+        self.trends = TrendTracker.from_env(STATS_INTERVAL)
+        # The cores each locust process ran on
+        self.processes: List[Dict[str, Any]] = []
+
+    def record(self, event: Dict[str, Any]):
+        kind = event.get("event")
+        alerts = []
+        if kind == "stats":
+            self.intervals.append(event)
+            self.interval_exemplars.attach(self.intervals)
+            if self.unanalyzed is not None:
+                alerts = self.trends.add(self.unanalyzed, self.marks.get("ramp_complete"))
+            self.unanalyzed = event
+        elif kind == "failures":
+            self.failures.merge(event["groups"], event.get("pid"))
+        elif kind == "connections":
+            self.connections.merge(event["endpoints"])
+        elif kind == "exemplars":
+            self.exemplars.add(event)
+            self.interval_exemplars.add(event, self.intervals)
+        elif kind == "cpu":
+            self.processes.append({key: event[key] for key in ("pid", "worker_index", "cores")})
+        elif kind in MARKS:
+            # With --processes every worker reports its own milestones; the first one counts
+            self.marks.setdefault(kind, event["time"])
+        if self.listener is not None:
+            self.listener(event)
+            for alert in alerts:
+                self.listener(alert)
+
+    def finish(self):
+        """Add the last interval to the trends, once the run has ended"""
+        if self.unanalyzed is None:
+            return
+        alerts = self.trends.add(self.unanalyzed, self.marks.get("ramp_complete"))
+        self.unanalyzed = None
+        if self.listener is not None:
+            for alert in alerts:
+                self.listener(alert)
+
+
+def phase_durations(marks: Dict[str, float]) -> Dict[str, float]:
+    """Durations in seconds of the run phases whose start and end marks were both recorded"""
+    phases = {}
+    for name, starts, end in PHASES:
+        start = next((marks[key] for key in starts if key in marks), None)
+        if start is not None and end in marks:
+            phases[name] = round(max(marks[end] - start, 0.0), 4)
+    return phases
+
+
+def relative_timing(marks: Dict[str, float]) -> Dict[str, float]:
+    """Milestone times in seconds since the run was requested"""
+    origin = marks["requested"]
+    return {key: round(marks[key] - origin, 4) for key in MARKS[1:] if key in marks}
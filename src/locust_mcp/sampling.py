@@ -0,0 +1,10 @@
+# Random numbers for the sampling done in locust processes: which requests are traced, and
+# which failed responses are kept. Separate from the random module, so sampling doesn't
+# change a seeded run's choices. Reseeded in forked processes, such as the workers of
+# --processes, which would otherwise all draw the same sequence.
+import os
+import random
+
+sampling_random = random.Random()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=sampling_random.seed)
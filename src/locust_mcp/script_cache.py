@@ -0,0 +1,162 @@
+import hashlib
+import importlib.machinery
+import importlib.util
+import logging
+import os
+import py_compile
+import stat
+import sys
+import threading
+from collections import OrderedDict
+from types import CodeType
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _user_cache_base() -> str:
+    if os.name == "nt":
+        return os.path.expandvars("%LOCALAPPDATA%")
+    if sys.platform == "darwin":
+        return os.path.expanduser("~/Library/Caches")
+    return os.path.expanduser("~/.cache")
+
+
+# Content-addressed copies of test scripts; Python keeps their bytecode in __pycache__ beside
+# them. Per user, next to the test store's cache, since these files are executed.
+SCRIPT_CACHE_DIR = os.path.join(_user_cache_base(), "ms-locust", "scripts")
+MAX_CACHED_SCRIPTS = 1000
+# Compiled code objects kept in memory per process
+MAX_CACHED_CODE = 256
+
+_code_cache: "OrderedDict[str, CodeType]" = OrderedDict()
+_code_lock = threading.Lock()
+
+
+def script_hash(source: str) -> str:
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def _prune(directory: str, keep: int):
+    """Remove the least recently used cached scripts (and their bytecode) beyond keep"""
+    scripts = [entry for entry in os.scandir(directory) if entry.name.endswith(".py")]
+    if len(scripts) <= keep:
+        return
+    scripts.sort(key=lambda entry: entry.stat().st_mtime)
+    for entry in scripts[:len(scripts) - keep]:
+        try:
+            os.unlink(entry.path)
+            stem = entry.name[:-3]
+            pycache = os.path.join(directory, "__pycache__")
+            for name in os.listdir(pycache) if os.path.isdir(pycache) else []:
+                if name.startswith(stem + "."):
+                    os.unlink(os.path.join(pycache, name))
+        except OSError:
+            pass
+
+
+def _private_directory(directory: str):
+    """
+    Create directory readable and writable only by this user, or check that an existing one
+    is. Raises PermissionError if another user owns it, as they could plant scripts in it.
+    """
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if not hasattr(os, "getuid"):
+        return
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        raise PermissionError(f"Script cache directory {directory} is not a directory owned by this user")
+    if info.st_mode & 0o077:
+        os.chmod(directory, 0o700)
+
+
+def _has_source(path: str, source: str) -> bool:
+    try:
+        with open(path, encoding="utf-8", newline="") as f:
+            return f.read() == source
+    except (OSError, UnicodeDecodeError):
+        return False
+
+
+def script_path(source: str, directory: str = SCRIPT_CACHE_DIR) -> str:
+    """
+    Path of a content-addressed copy of a script, written on first use together with its
+    bytecode in __pycache__, in a directory private to this user. An existing copy is only
+    reused if it holds the script, and the bytecode is checked against the source hash on
+    import, so a file planted under the expected name is replaced or ignored rather than
+    run. Every later import of the script, by Locust or by compile_script in any process,
+    loads the bytecode without compiling, even where PYTHONDONTWRITEBYTECODE stops Python
+    from writing bytecode itself.
+    """
+    _private_directory(directory)
+    path = os.path.join(directory, f"locustfile_{script_hash(source)[:32]}.py")
+    if _has_source(path, source):
+        # Marks it recently used for _prune; the bytecode is checked by hash, not by mtime
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+        f.write(source)
+    try:
+        py_compile.compile(
+            tmp_path, cfile=importlib.util.cache_from_source(path), dfile=path, doraise=True,
+            invalidation_mode=py_compile.PycInvalidationMode.CHECKED_HASH
+        )
+    except (py_compile.PyCompileError, OSError) as e:
+        # Without bytecode the script is simply compiled on import
+        logger.debug(f"Could not cache bytecode for {path}: {e}")
+    os.replace(tmp_path, path)
+    _prune(directory, MAX_CACHED_SCRIPTS)
+    return path
+
+
+def _cached_code(key: str) -> Optional[CodeType]:
+    with _code_lock:
+        code = _code_cache.get(key)
+        if code is not None:
+            _code_cache.move_to_end(key)
+        return code
+
+
+def _cache_code(key: str, code: CodeType):
+    with _code_lock:
+        _code_cache[key] = code
+        if len(_code_cache) > MAX_CACHED_CODE:
+            _code_cache.popitem(last=False)
+
+
+def compile_script(source: str) -> CodeType:
+    """
+    Compile a test script for execution, reusing the code object from an earlier compile of
+    the same content in this process, or else the bytecode Python cached for its
+    content-addressed copy. Raises SyntaxError for invalid scripts.
+    """
+    key = "run:" + script_hash(source)
+    code = _cached_code(key)
+    if code is None:
+        path = script_path(source)
+        # get_code() loads the bytecode script_path() cached, like a regular import would
+        code = importlib.machinery.SourceFileLoader(os.path.basename(path)[:-3], path).get_code(None)
+        _cache_code(key, code)
+    return code
+
+
+def validate_script(source: str) -> CodeType:
+    """
+    Compile a script in memory, raising ValueError with the location of any syntax error.
+    Scripts validated before are not compiled again.
+    """
+    key = "check:" + script_hash(source)
+    code = _cached_code(key)
+    if code is not None:
+        return code
+    try:
+        code = compile(source, "locustfile.py", "exec", dont_inherit=True)
+    except SyntaxError as e:
+        line = f": {e.text.strip()}" if e.text else ""
+        raise ValueError(f"Script does not compile (line {e.lineno}: {e.msg}){line}") from e
+    _cache_code(key, code)
+    return code
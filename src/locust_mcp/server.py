@@ -1,40 +1,126 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
-from typing import Dict, Any, Optional, List
+from typing import Callable, Dict, Any, Optional, List, Set, Tuple
 import json
 import logging
 import os
 import asyncio
+import tempfile
+import time
 from datetime import datetime, timedelta
+from functools import cached_property
 from locust_mcp.prompt_generator import PromptGenerator
-from locust_mcp.test_store import TestStore
+from locust_mcp.test_store import TestStore, new_run_id
+from locust_mcp.retention import RetentionPolicy
 from locust_mcp.locust_generator import LocustScriptGenerator
 from locust_mcp.test_runner import LocustTestRunner
+from locust_mcp.cpu_affinity import CoreAllocator, parse_core_list
+from locust_mcp.metrics import MetricsRegistry
+from locust_mcp.run_broadcast import RunBroadcaster
 
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
+LOG_LEVEL = os.environ.get("LOCUST_MCP_LOG_LEVEL", "DEBUG")
+
+def configure_logging():
+    """Configure logging for the server process; done on startup rather than on import"""
+    logging.basicConfig(
+        level=LOG_LEVEL,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
 # Constants for connection management
 HEARTBEAT_INTERVAL = 30  # seconds
 CONNECTION_TIMEOUT = 60  # seconds
-MAX_REQUESTS_PER_MINUTE = 60
+# Sized for pipelined clients, which can have MAX_PENDING_REQUESTS requests in flight
+MAX_REQUESTS_PER_MINUTE = int(os.environ.get("LOCUST_MCP_MAX_REQUESTS_PER_MINUTE", "600"))  # 0 disables the limit
+# Commands that don't count towards the rate limit: keepalives and following runs
+RATE_LIMIT_EXEMPT = {"ping", "subscribe", "unsubscribe"}
+# Requests with a requestId handled at once per connection; further messages are read once one finishes
+MAX_PENDING_REQUESTS = int(os.environ.get("LOCUST_MCP_MAX_PENDING_REQUESTS", "256"))
+# Run events queued per subscriber before its oldest stats updates are coalesced
+SUBSCRIBER_QUEUE_SIZE = int(os.environ.get("LOCUST_MCP_SUBSCRIBER_QUEUE_SIZE", "16"))
+# Server worker processes sharing the port; with more than one they share state through STATE_DB
+WORKERS = int(os.environ.get("LOCUST_MCP_WORKERS", "1"))
+# SQLite database of the state shared by server workers; setting it also shares state when the
+# workers are started by uvicorn itself. Empty puts it next to the test history.
+STATE_DB = os.environ.get("LOCUST_MCP_STATE_DB", "")
+SHARED = WORKERS > 1 or bool(STATE_DB)
+# What the request rate limit counts: "connection", or "client" for all connections from one
+# host. With shared state that is the default, so the limit doesn't grow with the workers.
+RATE_LIMIT_SCOPE = os.environ.get("LOCUST_MCP_RATE_LIMIT_SCOPE", "client" if SHARED else "connection")
+
+KNOWN_COMMANDS = {
+    "generate", "run", "runs", "plan", "parse_prompts", "list", "compact", "stop", "ping", "subscribe", "unsubscribe", "live_runs", "generate_mixed", "import_traffic", "import_openapi", "generate_batch"
+}
+
+# Pre-warmed Locust worker processes; 0 starts the pool lazily on the first pooled run
+POOL_SIZE = int(os.environ.get("LOCUST_MCP_POOL_SIZE", "0"))
+# Runs per pooled worker before it is replaced; 0 uses the pool's default
+POOL_MAX_RUNS_PER_WORKER = int(os.environ.get("LOCUST_MCP_POOL_MAX_RUNS", "0"))
+# Concurrent locust command line runs; 0 means unlimited
+MAX_CONCURRENT_RUNS = int(os.environ.get("LOCUST_MCP_MAX_CONCURRENT_RUNS", "0"))
+# Seconds between background compactions under the LOCUST_MCP_RETENTION_* policy; 0 disables them
+COMPACTION_INTERVAL = float(os.environ.get("LOCUST_MCP_COMPACTION_INTERVAL", "3600"))
+# Pinning of the server and of runs to CPU cores: off, auto, affinity or cpuset
+CPU_PINNING = os.environ.get("LOCUST_MCP_CPU_PINNING", "auto")
+# Cores reserved for the server, as a CPU list like "0" or "0-1"; empty reserves the first
+# core per server worker
+SERVER_CORES = os.environ.get("LOCUST_MCP_SERVER_CORES", "")
+# A delegated cgroup v2 directory in which runs get their own cpuset groups
+CPUSET_CGROUP = os.environ.get("LOCUST_MCP_CPUSET_CGROUP", "")
 
 app = FastAPI()
 
 # Initialize core components
 prompt_generator = PromptGenerator()
-test_store = TestStore()
 script_generator = LocustScriptGenerator()
-test_runner = LocustTestRunner()
+# Shared by all runners, so concurrent runs get disjoint cores whichever runner they use
+cpu_allocator = CoreAllocator(CPU_PINNING, parse_core_list(SERVER_CORES) or None, CPUSET_CGROUP or None,
+                              server_workers=WORKERS)
+test_runner = LocustTestRunner(MAX_CONCURRENT_RUNS or None, cpu_allocator)
+
+class Components:
+    """
+    Server components with startup cost or side effects, created on first use so that
+    importing the server stays fast; the modules behind the optional ones are only
+    imported then, too.
+    """
+
+    @cached_property
+    def test_store(self) -> TestStore:
+        # The history is loaded in the background by the startup hook
+        return TestStore(load=False, shared=SHARED)
+
+    @cached_property
+    def library_runner(self):
+        from locust_mcp.library_runner import LocustLibraryRunner
+        return LocustLibraryRunner(cpu_allocator)
+
+    @cached_property
+    def worker_pool(self):
+        from locust_mcp.worker_pool import LocustWorkerPool, DEFAULT_POOL_SIZE, DEFAULT_MAX_RUNS_PER_WORKER
+        return LocustWorkerPool(POOL_SIZE or DEFAULT_POOL_SIZE, POOL_MAX_RUNS_PER_WORKER or DEFAULT_MAX_RUNS_PER_WORKER,
+                                cpu_allocator)
+
+    @cached_property
+    def traffic_importer(self):
+        from locust_mcp.traffic_importer import TrafficImporter
+        return TrafficImporter()
+
+    def created(self, name: str) -> bool:
+        return name in self.__dict__
+
+components = Components()
 
 class ConnectionManager:
     def __init__(self):
         self.active_connections: Dict[WebSocket, Dict] = {}
-        self.request_counts: Dict[WebSocket, List[datetime]] = {}
+        # By connection, or by client host with the "client" rate limit scope
+        self.request_counts: Dict[Any, List[datetime]] = {}
+        # Requests are handled concurrently; their replies are sent one whole message at a time
+        self.send_locks: Dict[WebSocket, asyncio.Lock] = {}
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
@@ -43,21 +129,41 @@ class ConnectionManager:
             "connected_at": datetime.now()
         }
         self.request_counts[websocket] = []
+        self.send_locks[websocket] = asyncio.Lock()
         logger.info("New WebSocket connection established")
 
     def disconnect(self, websocket: WebSocket):
         self.active_connections.pop(websocket, None)
         self.request_counts.pop(websocket, None)
+        self.send_locks.pop(websocket, None)
         logger.info("WebSocket connection closed")
 
+    async def send_text(self, websocket: WebSocket, text: str):
+        lock = self.send_locks.get(websocket)
+        if lock is None:
+            raise WebSocketDisconnect()
+        async with lock:
+            await websocket.send_text(text)
+
+    async def send_json(self, websocket: WebSocket, data: Dict[str, Any]):
+        await self.send_text(websocket, json.dumps(data))
+
     async def check_rate_limit(self, websocket: WebSocket) -> bool:
         """Check if the client has exceeded rate limits"""
+        if not MAX_REQUESTS_PER_MINUTE:
+            return True
+        key = websocket
+        if RATE_LIMIT_SCOPE == "client":
+            key = websocket.client.host if websocket.client else "unknown"
+            # Counted across all server workers
+            if shared_state is not None:
+                return shared_state.record_request(key, time.time(), 60) <= MAX_REQUESTS_PER_MINUTE
         now = datetime.now()
-        requests = self.request_counts.get(websocket, [])
+        requests = self.request_counts.get(key, [])
         
         # Remove requests older than 1 minute
         requests = [t for t in requests if now - t < timedelta(minutes=1)]
-        self.request_counts[websocket] = requests
+        self.request_counts[key] = requests
         
         # Add current request
         requests.append(now)
@@ -78,7 +184,7 @@ class ConnectionManager:
                         continue
                         
                     if now - conn_info["last_heartbeat"] >= timedelta(seconds=HEARTBEAT_INTERVAL):
-                        await ws.send_json({"type": "heartbeat"})
+                        await self.send_json(ws, {"type": "heartbeat"})
                         conn_info["last_heartbeat"] = now
                         
                 except Exception:
@@ -96,11 +202,240 @@ class ConnectionManager:
 
 # Create connection manager instance
 manager = ConnectionManager()
+# Runs in progress, whose events are broadcast to the connections subscribed to them
+live_runs = RunBroadcaster(SUBSCRIBER_QUEUE_SIZE)
+# With several server workers: the state they share, this worker's control socket server,
+# and the subscriptions of this worker's connections to runs of other workers
+shared_state = None
+control_server: Optional[asyncio.AbstractServer] = None
+relays: Dict[Tuple[WebSocket, str], asyncio.Task] = {}
+
+# Server metrics, exposed in the Prometheus text format on /metrics
+metrics = MetricsRegistry()
+command_duration = metrics.histogram(
+    "locust_mcp_command_duration_seconds", "Time to handle a WebSocket command", ["command"]
+)
+command_errors = metrics.counter(
+    "locust_mcp_command_errors_total", "WebSocket commands that returned an error", ["command"]
+)
+run_phase_duration = metrics.histogram(
+    "locust_mcp_run_phase_seconds", "Duration of each phase of a test run", ["runner", "phase"]
+)
+runs_in_flight = metrics.gauge("locust_mcp_runs_in_flight", "Test runs currently in progress")
+metrics.gauge(
+    "locust_mcp_run_subscribers", "Subscriptions to the events of runs in progress",
+    callback=lambda: live_runs.subscriber_count
+)
+metrics.gauge(
+    "locust_mcp_active_connections", "Open WebSocket connections",
+    callback=lambda: len(manager.active_connections)
+)
+metrics.gauge(
+    "locust_mcp_stored_tests", "Tests in the test store history",
+    callback=lambda: len(components.test_store.history) if components.test_store.history_loaded else float("nan")
+)
+metrics.gauge(
+    "locust_mcp_pool_idle_workers", "Pre-warmed pool workers waiting for a run",
+    callback=lambda: components.worker_pool.idle_workers if components.created("worker_pool") else 0
+)
+
+async def compaction_loop(policy: RetentionPolicy):
+    """Periodically archive tests the retention policy no longer keeps, off the event loop"""
+    while True:
+        await asyncio.sleep(COMPACTION_INTERVAL)
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, components.test_store.compact, policy)
+        except Exception as e:
+            logger.error(f"Error compacting tests: {str(e)}")
+
+async def stop_local_runs(run_id: Optional[str] = None) -> int:
+    """Stop this worker's runs in progress, or only run_id; returns how many were stopped"""
+    runners = [test_runner] + [getattr(components, name) for name in ("library_runner", "worker_pool")
+                               if components.created(name)]
+    stopped = 0
+    for runner in runners:
+        stopped += (await runner.stop(run_id)).get("stopped", 0)
+    return stopped
+
+async def handle_control(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Serve a request of another server worker on this worker's control socket"""
+    try:
+        message = json.loads(await reader.readline())
+        if message.get("command") == "stop":
+            writer.write(json.dumps({"stopped": await stop_local_runs(message.get("run_id"))}).encode() + b"\n")
+        elif message.get("command") == "subscribe":
+            await serve_relay(message["run_id"], reader, writer)
+        elif message.get("command") == "metrics":
+            writer.write(json.dumps({"samples": metrics.samples(worker=str(os.getpid()))}).encode() + b"\n")
+        else:
+            writer.write(json.dumps({"error": f"Unknown control command: {message.get('command')}"}).encode() + b"\n")
+        await writer.drain()
+    except Exception as e:
+        logger.error(f"Error handling control request: {str(e)}")
+    finally:
+        writer.close()
+
+async def serve_relay(run_id: str, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Subscribe another worker to a run of this one, until the run ends or that worker hangs up"""
+    async def send(text: str):
+        writer.write(text.encode() + b"\n")
+        await writer.drain()
+
+    try:
+        live_run = live_runs.subscribe(run_id, writer, send)
+    except ValueError as e:
+        writer.write(json.dumps({"error": str(e)}).encode() + b"\n")
+        return
+    # Written before the subscriber's first send, so it precedes the snapshot
+    writer.write(json.dumps({"run_id": run_id}).encode() + b"\n")
+    hangup = asyncio.create_task(reader.read())
+    try:
+        await asyncio.wait({live_run.subscribers[writer].task, hangup}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        hangup.cancel()
+        live_runs.unsubscribe(run_id, writer)
+
+async def relay_run(websocket: WebSocket, run_id: str) -> Dict[str, Any]:
+    """Subscribe a connection to a run of another server worker, relaying that worker's messages"""
+    from locust_mcp.shared_state import control_connect
+    owner = shared_state.run_owner(run_id)
+    if owner is None or owner["pid"] == os.getpid():
+        raise ValueError(f"Run {run_id} is not in progress")
+    reader, writer = await control_connect(owner["control_path"], {"command": "subscribe", "run_id": run_id})
+    reply = json.loads(await reader.readline() or b'{"error": "The worker running the run went away"}')
+    if reply.get("error"):
+        writer.close()
+        raise ValueError(reply["error"])
+    key = (websocket, run_id)
+
+    async def relay():
+        try:
+            async for line in reader:
+                await manager.send_text(websocket, line.decode().rstrip("\n"))
+        except Exception as e:
+            logger.debug(f"Relay of run {run_id} stopped: {str(e)}")
+        finally:
+            writer.close()
+            if relays.get(key) is asyncio.current_task():
+                del relays[key]
+
+    previous = relays.pop(key, None)
+    if previous is not None:
+        previous.cancel()
+    relays[key] = asyncio.create_task(relay())
+    return {"run_id": run_id, "worker": owner["pid"]}
+
+def drop_relays(websocket: WebSocket, run_id: Optional[str] = None) -> bool:
+    """End a connection's relayed subscriptions, or only the one to run_id"""
+    keys = [key for key in relays if key[0] is websocket and run_id in (None, key[1])]
+    for key in keys:
+        relays.pop(key).cancel()
+    return bool(keys)
+
+async def forward_stop(run_id: Optional[str] = None) -> int:
+    """Ask the other server workers to stop their runs, or the owner of run_id to stop it"""
+    from locust_mcp.shared_state import control_request
+    if run_id is not None:
+        owner = shared_state.run_owner(run_id)
+        workers = [owner] if owner is not None else []
+    else:
+        workers = shared_state.workers()
+    stopped = 0
+    for worker in workers:
+        if worker["pid"] == os.getpid():
+            continue
+        try:
+            reply = await control_request(worker["control_path"], {"command": "stop", "run_id": run_id})
+            stopped += reply.get("stopped", 0)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not forward stop to server worker {worker['pid']}: {str(e)}")
+    return stopped
+
+def control_path() -> str:
+    """This worker's control socket; pids are unique on the machine, and short enough for a socket path"""
+    return os.path.join(tempfile.gettempdir(), f"locust-mcp-{os.getpid()}.sock")
+
+async def start_shared_state():
+    """Join the other server workers: register this one and listen for their control requests"""
+    global shared_state, control_server
+    from locust_mcp.shared_state import SharedState, CONTROL_LINE_LIMIT
+    state = SharedState(STATE_DB or os.path.join(components.test_store.tests_dir, "server-state.db"))
+    state.prune()
+    path = control_path()
+    if os.path.exists(path):
+        os.unlink(path)
+    control_server = await asyncio.start_unix_server(handle_control, path, limit=CONTROL_LINE_LIMIT)
+    state.register_worker(os.getpid(), path)
+    cpu_allocator.shared = state
+    shared_state = state
+    asyncio.create_task(shared_state_loop())
+    logger.info(f"Server worker {os.getpid()} sharing state through {state.path}")
+
+async def stop_shared_state():
+    global shared_state
+    if shared_state is None:
+        return
+    shared_state.unregister_worker(os.getpid())
+    control_server.close()
+    try:
+        os.unlink(control_path())
+    except OSError:
+        pass
+    cpu_allocator.shared = None
+    shared_state.close()
+    shared_state = None
+
+async def shared_state_loop():
+    """Remove the state of server workers that died, and expired rate limit windows"""
+    while shared_state is not None:
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        try:
+            shared_state.prune()
+            shared_state.forget_requests(time.time() - 60)
+        except Exception as e:
+            logger.error(f"Error pruning shared state: {str(e)}")
+
+async def worker_metrics() -> List[Dict[str, List[str]]]:
+    """The metrics of every server worker, this one's included, labelled with the worker's pid"""
+    from locust_mcp.shared_state import control_request
+    samples = [metrics.samples(worker=str(os.getpid()))]
+    for worker in shared_state.workers():
+        if worker["pid"] == os.getpid():
+            continue
+        try:
+            samples.append((await control_request(worker["control_path"], {"command": "metrics"}))["samples"])
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not read the metrics of server worker {worker['pid']}: {str(e)}")
+    return samples
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    # Whichever worker is scraped, it reports the metrics of all of them
+    samples = await worker_metrics() if shared_state is not None else None
+    return PlainTextResponse(metrics.render(samples), media_type="text/plain; version=0.0.4")
 
 # Start heartbeat task when app starts
 @app.on_event("startup")
 async def startup_event():
+    configure_logging()
+    # Keep the event loop off the run cores; run processes are pinned to theirs explicitly
+    cpu_allocator.pin_server()
     asyncio.create_task(manager.heartbeat())
+    if SHARED:
+        await start_shared_state()
+    # Read the test history off the event loop; anything that needs it first waits for it
+    asyncio.get_running_loop().run_in_executor(None, components.test_store.load_history)
+    if POOL_SIZE > 0:
+        await components.worker_pool.start()
+    retention = RetentionPolicy.from_env()
+    if retention.is_set and COMPACTION_INTERVAL > 0:
+        asyncio.create_task(compaction_loop(retention))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if components.created("worker_pool"):
+        await components.worker_pool.close()
+    await stop_shared_state()
 
 class MCPRequest(BaseModel):
     command: str
@@ -109,6 +444,8 @@ class MCPRequest(BaseModel):
 class MCPResponse(BaseModel):
     result: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
+    # Echoed from the request, so clients can match replies to concurrent requests
+    requestId: Optional[Any] = None
 
 class Endpoint(BaseModel):
     method: str
@@ -117,150 +454,513 @@ class Endpoint(BaseModel):
     headers: Optional[Dict[str, Any]] = None
     weight: Optional[int] = 1
 
+def run_event_sender(websocket: WebSocket, request_id: Any, run_id: str) -> Callable[[Dict[str, Any]], None]:
+    """A run listener that sends the run's hook events to the client as "event" messages"""
+    loop = asyncio.get_running_loop()
+
+    def send(event: Dict[str, Any]):
+        # Called on the event loop by the CLI runner, and from executor threads by the others
+        asyncio.run_coroutine_threadsafe(
+            manager.send_json(websocket, {"type": "event", "requestId": request_id, "runId": run_id, **event}), loop
+        )
+
+    return send
+
+async def execute_command(websocket: WebSocket, request: MCPRequest, message: Dict[str, Any]) -> MCPResponse:
+    """Run one MCP command and return its response"""
+    if request.command == "generate":
+        try:
+            if "prompt" in request.params:
+                test_spec = prompt_generator.parse_prompt(request.params["prompt"])
+                script = script_generator.generate(test_spec.dict())
+                config = test_spec.dict()
+            else:
+                script = script_generator.generate(request.params)
+                config = script_generator.generate_config(request.params)
+                if request.params.get("targetRps"):
+                    from locust_mcp.capacity_planner import plan_capacity, apply_plan
+                    # Size users for the requested throughput from a probe of the endpoints
+                    plan = await asyncio.get_running_loop().run_in_executor(
+                        None, plan_capacity, request.params
+                    )
+                    apply_plan(config, plan)
+
+            description = request.params.get("prompt", "Generated test")
+            test_info = components.test_store.save_test(script, config, description)
+
+            response = MCPResponse(result={
+                "test_id": test_info["id"],
+                "script": script,
+                "config": config,
+                "script_path": test_info["script_path"],
+                "config_path": test_info["config_path"]
+            })
+        except Exception as e:
+            logger.error(f"Error generating script: {str(e)}")
+            response = MCPResponse(error=str(e))
+
+    elif request.command == "run":
+        try:
+            if "test_id" in request.params:
+                test_data = components.test_store.get_test(request.params["test_id"])
+                if test_data is None:
+                    raise ValueError(f"Test with ID {request.params['test_id']} not found")
+                script = test_data["script"]
+                config = test_data["config"]
+            else:
+                script = request.params.get("script", "")
+                config = request.params.get("config", {})
+            # A "seed" repeats the run's random choices; it overrides the seed the test was generated with
+            if request.params.get("seed") is not None:
+                config = {**config, "seed": int(request.params["seed"])}
+
+            # "library" drives Locust's API in a fresh worker process instead of spawning the CLI,
+            # "pool" does the same on a pre-warmed worker
+            runner_name = request.params.get("runner")
+            if runner_name == "library":
+                runner = components.library_runner
+            elif runner_name == "pool":
+                runner = components.worker_pool
+            else:
+                runner_name, runner = "cli", test_runner
+            # Every run can be followed live through "subscribe"; with "stream", the requesting
+            # client also gets the run's milestones and per-second stats as they happen
+            run_id = new_run_id()
+            live_run = live_runs.start(run_id, test_id=request.params.get("test_id"), runner=runner_name)
+            publish = live_runs.listener(live_run)
+            if shared_state is not None:
+                # Other workers find the run here to route stops and subscriptions to this one
+                shared_state.add_run(run_id, os.getpid(), request.params.get("test_id"), runner_name)
+            sender = run_event_sender(websocket, message.get("requestId"), run_id) if request.params.get("stream") else None
+
+            def listener(event: Dict[str, Any]):
+                publish(event)
+                if sender is not None:
+                    sender(event)
+
+            runs_in_flight.inc()
+            try:
+                results = await runner.run({
+                    "script": script,
+                    "config": config,
+                    "run_id": run_id
+                }, listener)
+                results["run_id"] = run_id
+                for phase, duration in (results.get("phases") or {}).items():
+                    run_phase_duration.observe(duration, runner_name, phase)
+                if "test_id" in request.params:
+                    await asyncio.get_running_loop().run_in_executor(
+                        None, components.test_store.save_run, request.params["test_id"], results, run_id
+                    )
+            except Exception as e:
+                results = {"success": False, "statistics": None, "error": str(e), "run_id": run_id}
+                raise
+            finally:
+                runs_in_flight.dec()
+                live_runs.finish(run_id, results)
+                if shared_state is not None:
+                    shared_state.remove_run(run_id)
+            response = MCPResponse(result=results)
+        except Exception as e:
+            logger.error(f"Error running test: {str(e)}")
+            response = MCPResponse(error=str(e))
+
+    elif request.command == "subscribe":
+        try:
+            run_id = request.params.get("run_id")
+            if not run_id:
+                raise ValueError("subscribe requires the 'run_id' of a run in progress")
+            # The subscription's messages carry the runId instead of a requestId: a snapshot of
+            # the run so far, its events, and finally its result
+            if run_id in live_runs.runs or shared_state is None:
+                live_run = live_runs.subscribe(run_id, websocket, lambda text: manager.send_text(websocket, text))
+                result = {"run_id": run_id, "subscribers": len(live_run.subscribers)}
+            else:
+                # A run of another server worker, whose messages are relayed through this one
+                result = await relay_run(websocket, run_id)
+            response = MCPResponse(result=result)
+        except Exception as e:
+            logger.error(f"Error subscribing to run: {str(e)}")
+            response = MCPResponse(error=str(e))
+
+    elif request.command == "unsubscribe":
+        run_id = request.params.get("run_id")
+        unsubscribed = live_runs.unsubscribe(run_id, websocket) or drop_relays(websocket, run_id)
+        response = MCPResponse(result={"unsubscribed": unsubscribed})
+
+    elif request.command == "live_runs":
+        runs = live_runs.live()
+        if shared_state is not None:
+            # Runs of other server workers have no totals here; subscribing to one gets them
+            for run in runs:
+                run["worker"] = os.getpid()
+            runs += [{"run_id": run["run_id"], "test_id": run["test_id"], "runner": run["runner"],
+                      "started": run["started"], "worker": run["worker"]}
+                     for run in shared_state.runs() if run["worker"] != os.getpid()]
+        response = MCPResponse(result={"runs": runs})
+
+    elif request.command == "runs":
+        try:
+            runs = await asyncio.get_running_loop().run_in_executor(
+                None, components.test_store.get_runs, request.params["test_id"]
+            )
+            response = MCPResponse(result={"runs": runs})
+        except Exception as e:
+            logger.error(f"Error reading runs: {str(e)}")
+            response = MCPResponse(error=str(e))
+
+    elif request.command == "compact":
+        try:
+            # Command params override the LOCUST_MCP_RETENTION_* policy
+            policy = RetentionPolicy.from_params(request.params) if request.params else RetentionPolicy.from_env()
+            summary = await asyncio.get_running_loop().run_in_executor(
+                None, components.test_store.compact, policy
+            )
+            response = MCPResponse(result=summary)
+        except Exception as e:
+            logger.error(f"Error compacting tests: {str(e)}")
+            response = MCPResponse(error=str(e))
+
+    elif request.command == "plan":
+        try:
+            from locust_mcp.capacity_planner import plan_capacity
+            plan = await asyncio.get_running_loop().run_in_executor(None, plan_capacity, request.params)
+            response = MCPResponse(result=plan)
+        except Exception as e:
+            logger.error(f"Error planning capacity: {str(e)}")
+            response = MCPResponse(error=str(e))
+
+    elif request.command == "parse_prompts":
+        try:
+            prompts = request.params.get("prompts")
+            if not isinstance(prompts, list):
+                raise ValueError("parse_prompts requires a list of 'prompts'")
+            specs = prompt_generator.parse_prompts(prompts)
+            response = MCPResponse(result={"specs": [spec.dict() for spec in specs]})
+        except Exception as e:
+            logger.error(f"Error parsing prompts: {str(e)}")
+            response = MCPResponse(error=str(e))
+
+    elif request.command == "ping":
+        # Lets clients keep an idle connection open and check that it is alive
+        response = MCPResponse(result={"time": time.time()})
+
+    elif request.command == "list":
+        try:
+            tests = components.test_store.list_tests()
+            response = MCPResponse(result={"tests": tests})
+        except Exception as e:
+            logger.error(f"Error listing tests: {str(e)}")
+            response = MCPResponse(error=str(e))
+
+    elif request.command == "stop":
+        try:
+            # Without a run_id, every run in progress on every server worker is stopped
+            run_id = request.params.get("run_id")
+            local = run_id is None or run_id in live_runs.runs
+            if not local and (shared_state is None or shared_state.run_owner(run_id) is None):
+                raise ValueError(f"Run {run_id} is not in progress")
+            stopped = await stop_local_runs(run_id)
+            if shared_state is not None and (run_id is None or not local):
+                stopped += await forward_stop(run_id)
+            response = MCPResponse(result={
+                "success": True,
+                "stopped": stopped,
+                "message": f"Stopped {stopped} run(s)"
+            })
+        except Exception as e:
+            logger.error(f"Error stopping tests: {str(e)}")
+            response = MCPResponse(error=str(e))
+
+    elif request.command == "generate_mixed":
+        try:
+            from locust_mcp.batch_generator import iter_test_cases, normalize_case
+            if "cases" in request.params:
+                raw_cases = enumerate(request.params["cases"], 1)
+            elif "path" in request.params:
+                raw_cases = iter_test_cases(request.params["path"])
+            else:
+                raise ValueError("generate_mixed requires 'cases' or a 'path' to a CSV or JSONL file")
+
+            cases = [normalize_case(row_no, raw) for row_no, raw in raw_cases]
+            script, config = script_generator.generate_mixed(cases)
+            description = request.params.get("description", f"Mixed workload of {len(cases)} test cases")
+            test_info = components.test_store.save_test(script, config, description)
+
+            response = MCPResponse(result={
+                "test_id": test_info["id"],
+                "script": script,
+                "config": config,
+                "script_path": test_info["script_path"],
+                "config_path": test_info["config_path"]
+            })
+        except Exception as e:
+            logger.error(f"Error generating mixed workload: {str(e)}")
+            response = MCPResponse(error=str(e))
+
+    elif request.command == "import_traffic":
+        try:
+            if "path" not in request.params:
+                raise ValueError("import_traffic requires a 'path' to an access log or HAR file")
+            path = request.params["path"]
+            fmt = request.params.get("format")
+            loop = asyncio.get_running_loop()
+
+            if request.params.get("replay"):
+                speed = float(request.params.get("speed", 1.0))
+                replay_dir = os.path.join(components.test_store.cache_dir, 'replay')
+                os.makedirs(replay_dir, exist_ok=True)
+                schedule_path = os.path.join(
+                    replay_dir, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+                )
+                schedule = await loop.run_in_executor(
+                    None, components.traffic_importer.write_replay_schedule, path, schedule_path, fmt
+                )
+                target_url = request.params.get("targetUrl") or schedule["host"] or "http://localhost:8000"
+                script = script_generator.generate_replay(schedule_path, target_url, speed)
+                config = {
+                    "host": target_url,
+                    "users": 1,
+                    "spawn_rate": 1,
+                    # The replay user stops the run itself; this is only an upper bound
+                    "run_time": f"{int(schedule['duration'] / speed) + 10}s",
+                    "replay": schedule
+                }
+            else:
+                spec = await loop.run_in_executor(
+                    None, components.traffic_importer.to_spec, path, fmt, request.params.get("targetUrl")
+                )
+                for key in ("users", "spawnRate", "runTime"):
+                    if key in request.params:
+                        spec[key] = request.params[key]
+                script = script_generator.generate(spec)
+                config = script_generator.generate_config(spec)
+
+            test_info = components.test_store.save_test(script, config, request.params.get("description", f"Traffic from {path}"))
+            response = MCPResponse(result={
+                "test_id": test_info["id"],
+                "script": script,
+                "config": config,
+                "script_path": test_info["script_path"],
+                "config_path": test_info["config_path"]
+            })
+        except Exception as e:
+            logger.error(f"Error importing traffic: {str(e)}")
+            response = MCPResponse(error=str(e))
+
+    elif request.command == "import_openapi":
+        try:
+            from locust_mcp.openapi_importer import OpenAPIImporter, load_document
+            params = request.params
+
+            def import_openapi():
+                if "document" in params:
+                    document = params["document"]
+                elif "path" in params:
+                    document = load_document(params["path"])
+                else:
+                    raise ValueError("import_openapi requires a 'document' or a 'path' to an OpenAPI file")
+                spec_fields = {key: params[key] for key in ("users", "spawnRate", "runTime") if key in params}
+                spec = OpenAPIImporter(document).to_spec(
+                    tags=params.get("tags"),
+                    path_prefix=params.get("pathPrefix"),
+                    target_url=params.get("targetUrl"),
+                    **spec_fields
+                ).dict()
+                return spec, script_generator.generate(spec)
+
+            spec, script = await asyncio.get_running_loop().run_in_executor(None, import_openapi)
+            config = script_generator.generate_config(spec)
+            description = params.get("description", f"OpenAPI import of {len(spec['endpoints'])} operations")
+            test_info = components.test_store.save_test(script, config, description)
+            response = MCPResponse(result={
+                "test_id": test_info["id"],
+                "script": script,
+                "config": config,
+                "operations": len(spec["endpoints"]),
+                "script_path": test_info["script_path"],
+                "config_path": test_info["config_path"]
+            })
+        except Exception as e:
+            logger.error(f"Error importing OpenAPI document: {str(e)}")
+            response = MCPResponse(error=str(e))
+
+    elif request.command == "generate_batch":
+        try:
+            from locust_mcp.batch_generator import generate_batch, DEFAULT_CHUNK_SIZE
+            if "path" not in request.params:
+                raise ValueError("generate_batch requires a 'path' to a CSV or JSONL file")
+
+            loop = asyncio.get_running_loop()
+            request_id = message.get("requestId")
+
+            def report_progress(state: Dict[str, Any]):
+                # Called from the executor thread, so hand the send back to the event loop
+                asyncio.run_coroutine_threadsafe(
+                    manager.send_json(websocket, {"type": "progress", "requestId": request_id, **state}),
+                    loop
+                )
+
+            summary = await loop.run_in_executor(None, lambda: generate_batch(
+                request.params["path"],
+                output_path=request.params.get("outputPath"),
+                workers=request.params.get("workers"),
+                chunk_size=request.params.get("chunkSize", DEFAULT_CHUNK_SIZE),
+                progress=report_progress if request.params.get("progress") else None,
+                cores=cpu_allocator.unpinned_cores()
+            ))
+            response = MCPResponse(result=summary)
+        except Exception as e:
+            logger.error(f"Error generating batch: {str(e)}")
+            response = MCPResponse(error=str(e))
+
+    else:
+        error_msg = f"Unknown command: {request.command}"
+        logger.error(error_msg)
+        response = MCPResponse(error=error_msg)
+
+    return response
+
+
+async def handle_message(websocket: WebSocket, message: Dict[str, Any]):
+    """Handle one client message and send its reply"""
+    request_id = message.get("requestId")
+    try:
+        # Check rate limit; the message is rejected, and the next one read
+        if message.get("command") not in RATE_LIMIT_EXEMPT and not await manager.check_rate_limit(websocket):
+            await manager.send_json(websocket, {
+                "requestId": request_id,
+                "error": f"Rate limit exceeded. Maximum {MAX_REQUESTS_PER_MINUTE} requests per minute allowed."
+            })
+            return
+
+        logger.info(f"Received message: {message}")
+
+        # Handle MCP initialization
+        if message.get("command") == "initialize":
+            logger.info("Handling initialization request")
+            response = {
+                "type": "response",
+                "requestId": request_id,
+                "success": True,
+                "result": {
+                    "capabilities": {
+                        "textDocument": True,
+                        "workspace": True
+                    }
+                }
+            }
+            await manager.send_json(websocket, response)
+            return
+
+        # Handle regular MCP commands
+        request = MCPRequest.parse_obj(message)
+        logger.info(f"Processing command: {request.command}")
+        command_started = time.perf_counter()
+        response = await execute_command(websocket, request, message)
+        response.requestId = request_id
+
+        # Unknown commands share one label so clients can't grow the metric without bound
+        command_label = request.command if request.command in KNOWN_COMMANDS else "unknown"
+        command_duration.observe(time.perf_counter() - command_started, command_label)
+        if response.error is not None:
+            command_errors.inc(1, command_label)
+
+        # Send response
+        await manager.send_text(websocket, response.json())
+
+    except WebSocketDisconnect:
+        raise
+
+    except Exception as e:
+        logger.error(f"WebSocket error: {str(e)}")
+        await manager.send_text(websocket, MCPResponse(error=str(e), requestId=request_id).json())
+
+async def handle_pending(websocket: WebSocket, message: Dict[str, Any], slots: asyncio.Semaphore):
+    """Handle a message concurrently with others, then free its slot"""
+    try:
+        await handle_message(websocket, message)
+    except Exception as e:
+        # The client went away; the rest of its requests fail the same way
+        logger.debug(f"Could not reply to a request: {str(e)}")
+    finally:
+        slots.release()
+
 @app.websocket("/mcp")
 async def websocket_endpoint(websocket: WebSocket):
+    """
+    Serve one client connection. Requests with a requestId are handled concurrently and
+    answered as they finish, with their requestId echoed; requests without one are
+    handled in order, each answered before the next is read. Runs still in progress when
+    the client disconnects are not stopped; their replies are dropped.
+    """
     await manager.connect(websocket)
+    pending: Set[asyncio.Task] = set()
+    slots = asyncio.Semaphore(MAX_PENDING_REQUESTS)
 
     try:
         while True:
             try:
-                # Check rate limit
-                if not await manager.check_rate_limit(websocket):
-                    await websocket.send_json({
-                        "error": f"Rate limit exceeded. Maximum {MAX_REQUESTS_PER_MINUTE} requests per minute allowed."
-                    })
-                    continue
-
                 # Receive message with timeout
                 data = await asyncio.wait_for(
                     websocket.receive_text(),
                     timeout=CONNECTION_TIMEOUT
                 )
-                
-                message = json.loads(data)
-                logger.info(f"Received message: {message}")
-
-                # Update last heartbeat time
-                manager.active_connections[websocket]["last_heartbeat"] = datetime.now()
-
-                # Handle MCP initialization
-                if message.get("command") == "initialize":
-                    logger.info("Handling initialization request")
-                    response = {
-                        "type": "response",
-                        "requestId": message.get("requestId"),
-                        "success": True,
-                        "result": {
-                            "capabilities": {
-                                "textDocument": True,
-                                "workspace": True
-                            }
-                        }
-                    }
-                    await websocket.send_json(response)
-                    continue
-
-                # Handle regular MCP commands
-                request = MCPRequest.parse_raw(data)
-                logger.info(f"Processing command: {request.command}")
-                
-                # Process command
-                if request.command == "generate":
-                    try:
-                        if "prompt" in request.params:
-                            test_spec = prompt_generator.parse_prompt(request.params["prompt"])
-                            script = script_generator.generate(test_spec.dict())
-                            config = test_spec.dict()
-                        else:
-                            script = script_generator.generate(request.params)
-                            config = {
-                                "host": request.params.get("targetUrl", "http://localhost:8000"),
-                                "users": request.params.get("users", 10),
-                                "spawn_rate": request.params.get("spawnRate", 1),
-                                "run_time": request.params.get("runTime", "30s")
-                            }
-                        
-                        description = request.params.get("prompt", "Generated test")
-                        test_info = test_store.save_test(script, config, description)
-                        
-                        response = MCPResponse(result={
-                            "test_id": test_info["id"],
-                            "script": script,
-                            "config": config,
-                            "script_path": test_info["script_path"],
-                            "config_path": test_info["config_path"]
-                        })
-                    except Exception as e:
-                        logger.error(f"Error generating script: {str(e)}")
-                        response = MCPResponse(error=str(e))
-                
-                elif request.command == "run":
-                    try:
-                        if "test_id" in request.params:
-                            test_data = test_store.get_test(request.params["test_id"])
-                            if test_data is None:
-                                raise ValueError(f"Test with ID {request.params['test_id']} not found")
-                            script = test_data["script"]
-                            config = test_data["config"]
-                        else:
-                            script = request.params.get("script", "")
-                            config = request.params.get("config", {})
-                        
-                        results = await test_runner.run({
-                            "script": script,
-                            "config": config
-                        })
-                        response = MCPResponse(result=results)
-                    except Exception as e:
-                        logger.error(f"Error running test: {str(e)}")
-                        response = MCPResponse(error=str(e))
-                
-                elif request.command == "list":
-                    try:
-                        tests = test_store.list_tests()
-                        response = MCPResponse(result={"tests": tests})
-                    except Exception as e:
-                        logger.error(f"Error listing tests: {str(e)}")
-                        response = MCPResponse(error=str(e))
-                
-                elif request.command == "stop":
-                    try:
-                        result = await test_runner.stop()
-                        response = MCPResponse(result=result)
-                    except Exception as e:
-                        logger.error(f"Error stopping tests: {str(e)}")
-                        response = MCPResponse(error=str(e))
-                
-                else:
-                    error_msg = f"Unknown command: {request.command}"
-                    logger.error(error_msg)
-                    response = MCPResponse(error=error_msg)
-                
-                # Send response
-                await websocket.send_text(response.json())
-                
             except asyncio.TimeoutError:
+                # Requests still being handled keep the connection open
+                if pending:
+                    continue
                 logger.warning("Connection timed out")
                 break
-                
-            except Exception as e:
-                logger.error(f"WebSocket error: {str(e)}")
-                try:
-                    await websocket.send_text(MCPResponse(error=str(e)).json())
-                except:
-                    logger.error("Failed to send error response")
-                    break
+
+            # Update last heartbeat time
+            manager.active_connections[websocket]["last_heartbeat"] = datetime.now()
+
+            try:
+                message = json.loads(data)
+                if not isinstance(message, dict):
+                    raise ValueError("Messages must be JSON objects")
+            except ValueError as e:
+                logger.error(f"Invalid message: {str(e)}")
+                await manager.send_text(websocket, MCPResponse(error=str(e)).json())
+                continue
+
+            if message.get("requestId") is not None:
+                await slots.acquire()
+                task = asyncio.create_task(handle_pending(websocket, message, slots))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                continue
+
+            try:
+                await handle_message(websocket, message)
+            except WebSocketDisconnect:
+                raise
+            except Exception:
+                logger.error("Failed to send error response")
+                break
 
     except WebSocketDisconnect:
         logger.info("Client disconnected normally")
     finally:
+        live_runs.drop(websocket)
+        drop_relays(websocket)
         manager.disconnect(websocket)
 
 def create_app():
     """Create and configure the FastAPI application for MCP"""
     return app
 
-if __name__ == "__main__":
+def main():
+    """Console entry point: run the MCP server"""
     import uvicorn
+    configure_logging()
     logger.info("Starting Locust MCP Server")
-    uvicorn.run(app, host="127.0.0.1", port=8000)
+    if WORKERS > 1:
+        # Each worker process imports the app itself, so uvicorn needs it by name
+        uvicorn.run("locust_mcp.server:app", host="127.0.0.1", port=8000, workers=WORKERS)
+    else:
+        uvicorn.run(app, host="127.0.0.1", port=8000)
+
+if __name__ == "__main__":
+    main()
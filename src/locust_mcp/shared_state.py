@@ -0,0 +1,195 @@
+# State shared by the worker processes of a multi-process server (LOCUST_MCP_WORKERS > 1),
+# kept in one SQLite database in WAL mode so readers never wait for writers: the server
+# workers and the control sockets they listen on, the registry of runs in progress and the
+# worker that owns each, the CPU cores leased to runs, and client-wide rate-limit windows.
+# Workers ask each other to stop runs or relay subscriptions over their control sockets,
+# with one JSON message per line. Rows left by workers that died are removed by the others.
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS workers (
+    pid INTEGER PRIMARY KEY, control_path TEXT NOT NULL, started REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY, pid INTEGER NOT NULL, test_id TEXT, runner TEXT, started REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS core_leases (
+    core INTEGER PRIMARY KEY, pid INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS requests (
+    client TEXT NOT NULL, time REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS requests_by_client ON requests (client, time);
+"""
+# Milliseconds a write waits for another process's write to finish
+BUSY_TIMEOUT = 5000
+# Control messages carry whole run results, which can be large
+CONTROL_LINE_LIMIT = 1 << 24
+
+
+def process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SharedState:
+    """
+    One server worker's connection to the state shared by all workers. Statements are
+    short, so they are run directly on the event loop; a lock makes the connection safe
+    to use from the runners' threads as well.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Autocommit; multi-statement updates use explicit IMMEDIATE transactions
+        self._db = sqlite3.connect(path, timeout=BUSY_TIMEOUT / 1000, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT}")
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _query(self, sql: str, args: Tuple = ()) -> List[Tuple]:
+        with self._lock:
+            return self._db.execute(sql, args).fetchall()
+
+    def _transaction(self, statements: Iterable[Tuple[str, Tuple]]):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, args in statements:
+                    self._db.execute(sql, args)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    # Server workers
+
+    def register_worker(self, pid: int, control_path: str):
+        self._query("INSERT OR REPLACE INTO workers VALUES (?, ?, ?)", (pid, control_path, time.time()))
+
+    def unregister_worker(self, pid: int):
+        """Remove a worker with its runs and core leases"""
+        self._transaction([(f"DELETE FROM {table} WHERE pid = ?", (pid,)) for table in ("workers", "runs", "core_leases")])
+
+    def workers(self) -> List[Dict[str, Any]]:
+        return [{"pid": pid, "control_path": path, "started": started}
+                for pid, path, started in self._query("SELECT pid, control_path, started FROM workers ORDER BY pid")]
+
+    def prune(self) -> List[int]:
+        """Remove the rows of workers that are no longer running; returns their pids"""
+        pids = {pid for table in ("workers", "runs", "core_leases")
+                for (pid,) in self._query(f"SELECT DISTINCT pid FROM {table}")}
+        dead = [pid for pid in pids if not process_alive(pid)]
+        for pid in dead:
+            logger.warning(f"Removing the state of server worker {pid}, which is no longer running")
+            self.unregister_worker(pid)
+        return dead
+
+    # Runs in progress
+
+    def add_run(self, run_id: str, pid: int, test_id: Optional[str] = None, runner: Optional[str] = None):
+        self._query("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?)", (run_id, pid, test_id, runner, time.time()))
+
+    def remove_run(self, run_id: str):
+        self._query("DELETE FROM runs WHERE run_id = ?", (run_id,))
+
+    def runs(self) -> List[Dict[str, Any]]:
+        return [{"run_id": run_id, "worker": pid, "test_id": test_id, "runner": runner, "started": started}
+                for run_id, pid, test_id, runner, started
+                in self._query("SELECT run_id, pid, test_id, runner, started FROM runs ORDER BY run_id")]
+
+    def run_owner(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """The worker running run_id, or None if no worker is"""
+        rows = self._query(
+            "SELECT workers.pid, workers.control_path FROM runs JOIN workers ON runs.pid = workers.pid "
+            "WHERE runs.run_id = ?", (run_id,)
+        )
+        return {"pid": rows[0][0], "control_path": rows[0][1]} if rows else None
+
+    # CPU cores
+
+    def lease_cores(self, pid: int, candidates: List[int], count: int) -> Optional[List[int]]:
+        """Lease the count lowest of candidates that no worker has leased; None if too few are free"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                leased = {core for (core,) in self._db.execute("SELECT core FROM core_leases")}
+                free = [core for core in candidates if core not in leased]
+                if len(free) < count:
+                    self._db.execute("ROLLBACK")
+                    return None
+                cores = free[:count]
+                self._db.executemany("INSERT INTO core_leases VALUES (?, ?)", [(core, pid) for core in cores])
+                self._db.execute("COMMIT")
+                return cores
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def release_cores(self, cores: Iterable[int]):
+        self._transaction([("DELETE FROM core_leases WHERE core = ?", (core,)) for core in cores])
+
+    def free_core_count(self, candidates: List[int]) -> int:
+        leased = {core for (core,) in self._query("SELECT core FROM core_leases")}
+        return sum(1 for core in candidates if core not in leased)
+
+    # Rate limits
+
+    def record_request(self, client: str, now: float, window: float) -> int:
+        """Record a request of client and return its requests within the last window seconds"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("DELETE FROM requests WHERE client = ? AND time <= ?", (client, now - window))
+                self._db.execute("INSERT INTO requests VALUES (?, ?)", (client, now))
+                (count,) = self._db.execute("SELECT COUNT(*) FROM requests WHERE client = ?", (client,)).fetchone()
+                self._db.execute("COMMIT")
+                return count
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def forget_requests(self, before: float):
+        """Drop requests older than before, including those of clients that went away"""
+        self._query("DELETE FROM requests WHERE time <= ?", (before,))
+
+
+async def control_connect(path: str, message: Dict[str, Any]) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """Open a worker's control socket and send it a message"""
+    reader, writer = await asyncio.open_unix_connection(path, limit=CONTROL_LINE_LIMIT)
+    writer.write(json.dumps(message).encode() + b"\n")
+    await writer.drain()
+    return reader, writer
+
+
+async def control_request(path: str, message: Dict[str, Any]) -> Dict[str, Any]:
+    """Send a message to a worker's control socket and return its one-line reply"""
+    reader, writer = await control_connect(path, message)
+    try:
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError(f"No reply on control socket {path}")
+        return json.loads(line)
+    finally:
+        writer.close()
@@ -0,0 +1,158 @@
+import json
+import logging
+import os
+import threading
+import zipfile
+from collections import OrderedDict, defaultdict
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Tests per archive segment; one segment replaces this many test directories
+SEGMENT_MAX_TESTS = 1000
+# Segments kept open, so reads skip parsing the zip directory again
+MAX_OPEN_SEGMENTS = 8
+
+
+class TestArchive:
+    """
+    Compressed archive segments of stored tests. Each segment is a zip file with one
+    deflated JSON member per test (its history entry, script, config and run results),
+    so single tests are read without decompressing the rest. index.jsonl maps test IDs to
+    the segments holding them; runs recorded after a test was archived go to later segments.
+    Segments are never modified, only written whole and deleted whole. With shared=True,
+    other processes may change the archive, and the index is read again when its file changed.
+    """
+
+    def __init__(self, directory: str, shared: bool = False):
+        self.directory = directory
+        self.index_file = os.path.join(directory, "index.jsonl")
+        self.shared = shared
+        self._index: Optional[Dict[str, List[str]]] = None
+        # The index file's inode, size and modification time when it was read
+        self._index_source: Optional[Tuple[int, int, int]] = None
+        self._lock = threading.Lock()
+        self._open_segments: "OrderedDict[str, zipfile.ZipFile]" = OrderedDict()
+
+    @property
+    def index(self) -> Dict[str, List[str]]:
+        """Segments holding each archived test, oldest first"""
+        with self._lock:
+            if self._index is not None and self.shared and self._index_signature() != self._index_source:
+                self._index = None
+            if self._index is None:
+                self._index_source = self._index_signature()
+                self._index = defaultdict(list)
+                if os.path.exists(self.index_file):
+                    with open(self.index_file) as f:
+                        for line in f:
+                            if self.shared and not line.endswith("\n"):
+                                # Still being appended by another process; read with the next change
+                                break
+                            if line.strip():
+                                entry = json.loads(line)
+                                self._index[entry["id"]].append(entry["segment"])
+            return self._index
+
+    def _index_signature(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.index_file)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def __contains__(self, test_id: str) -> bool:
+        return test_id in self.index
+
+    def segments(self) -> Dict[str, List[str]]:
+        """Test IDs in each segment"""
+        segments: Dict[str, List[str]] = defaultdict(list)
+        for test_id, names in self.index.items():
+            for name in names:
+                segments[name].append(test_id)
+        return segments
+
+    def _next_segment_name(self) -> str:
+        numbers = [int(name[8:14]) for name in os.listdir(self.directory)
+                   if name.startswith("segment_") and name[8:14].isdigit()]
+        return f"segment_{max(numbers, default=0) + 1:06d}.zip"
+
+    def write_segment(self, records: List[Dict[str, Any]]) -> str:
+        """
+        Write records ({"id", "info", "script", "config", "runs"}) as a new segment and add them
+        to the index. Returns the segment name.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        index = self.index
+        with self._lock:
+            name = self._next_segment_name()
+            path = os.path.join(self.directory, name)
+            with zipfile.ZipFile(path + ".tmp", "w", compression=zipfile.ZIP_DEFLATED, compresslevel=9) as archive:
+                for record in records:
+                    archive.writestr(f"{record['id']}.json", json.dumps(record))
+            os.replace(path + ".tmp", path)
+            with open(self.index_file, "a") as f:
+                for record in records:
+                    f.write(json.dumps({"id": record["id"], "segment": name}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            for record in records:
+                index[record["id"]].append(name)
+        logger.info(f"Archived {len(records)} tests in {path}")
+        return name
+
+    def read(self, test_id: str) -> Optional[Dict[str, Any]]:
+        """An archived test merged from all its segments, or None"""
+        names = list(self.index.get(test_id, ()))
+        if not names:
+            return None
+        merged: Dict[str, Any] = {"id": test_id, "runs": {}, "segments": names}
+        for name in names:
+            try:
+                with self._lock:
+                    record = json.loads(self._segment(name).read(f"{test_id}.json"))
+            except (OSError, KeyError, zipfile.BadZipFile) as e:
+                logger.error(f"Could not read test {test_id} from archive segment {name}: {e}")
+                continue
+            for key in ("info", "script", "config"):
+                if record.get(key) is not None:
+                    merged[key] = record[key]
+            merged["runs"].update(record.get("runs") or {})
+        return merged
+
+    def _segment(self, name: str) -> zipfile.ZipFile:
+        """An open segment; call with the lock held"""
+        archive = self._open_segments.get(name)
+        if archive is None:
+            archive = self._open_segments[name] = zipfile.ZipFile(os.path.join(self.directory, name))
+            if len(self._open_segments) > MAX_OPEN_SEGMENTS:
+                self._open_segments.popitem(last=False)[1].close()
+        else:
+            self._open_segments.move_to_end(name)
+        return archive
+
+    def delete_segments(self, names: Iterable[str]):
+        """Delete whole segments and rewrite the index without them"""
+        names = set(names)
+        if not names:
+            return
+        index = self.index
+        with self._lock:
+            for test_id in list(index):
+                index[test_id] = [name for name in index[test_id] if name not in names]
+                if not index[test_id]:
+                    del index[test_id]
+            tmp_file = self.index_file + ".tmp"
+            with open(tmp_file, "w") as f:
+                for test_id, segments in index.items():
+                    for name in segments:
+                        f.write(json.dumps({"id": test_id, "segment": name}) + "\n")
+            os.replace(tmp_file, self.index_file)
+            for name in names:
+                if name in self._open_segments:
+                    self._open_segments.pop(name).close()
+                try:
+                    os.unlink(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+        logger.info(f"Deleted archive segments: {', '.join(sorted(names))}")
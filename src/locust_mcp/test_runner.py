@@ -1,54 +1,215 @@
 import asyncio
-import tempfile
 import os
-from typing import Dict, Any
+import time
+import uuid
+from typing import Callable, Dict, Any, List, Optional
 import json
-import subprocess
+from locust_mcp.cpu_affinity import CoreAllocator, run_layout
+from locust_mcp.locust_generator import ROW_NAME_PATTERN
+from locust_mcp.data_feeder import RUN_ID_ENV, build_index
+from locust_mcp.run_hooks import CLI_HOOK_SOURCE, SEED_ENV, RunRecorder, parse_event_line, phase_durations, relative_timing
+from locust_mcp.windowed_stats import apply_window, percentile
+from locust_mcp.script_cache import script_path, validate_script
+
+# Locust log lines can be long; the default 64 KiB StreamReader limit is too tight
+STDERR_LINE_LIMIT = 1 << 20
+
+def parse_stats_output(output: str) -> List[Dict[str, Any]]:
+    """
+    Parse the --json stats Locust prints on stdout. With --processes every worker prints
+    its own (empty) list as well, so the largest of all printed lists is the master's.
+    """
+    decoder = json.JSONDecoder()
+    found = []
+    pos = 0
+    while True:
+        start = output.find("[", pos)
+        if start < 0:
+            break
+        try:
+            value, pos = decoder.raw_decode(output, start)
+        except json.JSONDecodeError:
+            pos = start + 1
+            continue
+        if isinstance(value, list):
+            found.append(value)
+    if not found:
+        raise json.JSONDecodeError("No stats found in Locust output", output, 0)
+    return max(found, key=len)
+
+def breakdown_by_row(statistics: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Group the stats entries of a mixed-workload run by the source row encoded in their names."""
+    rows: Dict[str, Dict[str, Any]] = {}
+    for entry in statistics or []:
+        match = ROW_NAME_PATTERN.match(entry.get("name") or "")
+        if not match:
+            continue
+        row = rows.setdefault(match.group(1), {
+            "name": entry["name"][match.end():],
+            "num_requests": 0,
+            "num_failures": 0,
+            "total_response_time": 0,
+            "max_response_time": 0,
+            "response_times": {}
+        })
+        row["num_requests"] += entry.get("num_requests", 0)
+        row["num_failures"] += entry.get("num_failures", 0)
+        row["total_response_time"] += entry.get("total_response_time", 0)
+        row["max_response_time"] = max(row["max_response_time"], entry.get("max_response_time") or 0)
+        for value, count in (entry.get("response_times") or {}).items():
+            row["response_times"][value] = row["response_times"].get(value, 0) + count
+
+    for row in rows.values():
+        requests = row["num_requests"]
+        response_times = row.pop("response_times")
+        row["avg_response_time"] = row["total_response_time"] / requests if requests else 0
+        row["median_response_time"] = percentile(response_times, requests, 0.5)
+        row["p95_response_time"] = percentile(response_times, requests, 0.95)
+        row["failure_rate"] = 100.0 * row["num_failures"] / requests if requests else 0
+    return rows
+
+async def prepare_data_file(config: Dict[str, Any]) -> Optional[str]:
+    """Index a run's data file up front so worker processes only memory-map it; returns the index path"""
+    data_file = config.get("data_file")
+    if not data_file:
+        return None
+    return await asyncio.get_running_loop().run_in_executor(None, build_index, data_file["path"])
+
+def remove_data_cursor(index_path: Optional[str], run_id: str):
+    """Remove the feeder cursor shared by the processes of a finished run"""
+    if index_path and os.path.exists(f"{index_path}.{run_id}.cursor"):
+        os.unlink(f"{index_path}.{run_id}.cursor")
+
+def finish_result(result: Dict[str, Any], recorder: RunRecorder, config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Apply the measurement window and attach the row breakdown, milestone offsets, phase
+    durations, failure groups, connection timings, exemplars, trends and seed
+    """
+    recorder.finish()
+    apply_window(result, recorder.marks, recorder.intervals, config, recorder.interval_exemplars.size)
+    result["seed"] = config.get("seed")
+    result["failures"] = recorder.failures.summary()
+    result["connections"] = recorder.connections.summary()
+    # Exemplars cover the whole run, so they are linked to the whole-run percentiles
+    result["exemplars"] = recorder.exemplars.summary(result.get("full_statistics") or result["statistics"],
+                                                     recorder.marks.get("requested"))
+    result["trends"] = recorder.trends.summary(recorder.marks.get("requested"))
+    if result["statistics"] is not None and config.get("rows"):
+        result["rows"] = breakdown_by_row(result["statistics"])
+    result["timing"] = relative_timing(recorder.marks)
+    result["phases"] = phase_durations(recorder.marks)
+    return result
+
+async def read_run_events(stream: asyncio.StreamReader, recorder: RunRecorder):
+    """Record run milestones and stats intervals from the hook events in a locust process's stderr"""
+    async for line in stream:
+        event = parse_event_line(line.decode(errors="replace"))
+        if event is not None:
+            recorder.record(event)
+
+def run_core_count(config: Dict[str, Any], allocator: CoreAllocator) -> int:
+    """Dedicated cores for a run: one per worker process, or one for a single process"""
+    processes = int(config.get("processes") or 1)
+    # --processes -1 starts one worker per core
+    return len(allocator.run_cores) if processes < 0 else processes
 
 class LocustTestRunner:
-    async def run(self, params: Dict[str, Any]) -> Dict[str, Any]:
-        """Run Locust tests with the given parameters."""
+    def __init__(self, max_concurrent_runs: Optional[int] = None, cpu_allocator: Optional[CoreAllocator] = None):
+        # Runs beyond the limit wait for a slot; that wait is reported as the queue_wait phase
+        self._slots = asyncio.Semaphore(max_concurrent_runs) if max_concurrent_runs else None
+        # Pins each run to its own cores when given
+        self._cpu_allocator = cpu_allocator
+        # Locust processes of the runs in progress, by run ID
+        self._processes: Dict[str, asyncio.subprocess.Process] = {}
+
+    async def run(self, params: Dict[str, Any],
+                  listener: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Run Locust tests with the given parameters, passing the run's hook events to listener."""
         script = params.get("script", "")
         config = params.get("config", {})
         
         if not script:
             return {"error": "No test script provided"}
+        # Catch broken scripts before waiting for a slot or spawning Locust
+        source = script + CLI_HOOK_SOURCE
+        try:
+            validate_script(source)
+        except ValueError as e:
+            return {"success": False, "statistics": None, "error": str(e)}
 
-        # Create a temporary file for the test script
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
-            f.write(script)
-            script_path = f.name
+        recorder = RunRecorder({"requested": time.time()}, listener)
+        run_id = params.get("run_id") or uuid.uuid4().hex
+        if self._slots is None:
+            return await self._run(source, config, recorder, run_id)
+        async with self._slots:
+            return await self._run(source, config, recorder, run_id)
+
+    async def _run(self, source: str, config: Dict[str, Any], recorder: RunRecorder, run_id: str) -> Dict[str, Any]:
+        marks = recorder.marks
+        marks["acquired"] = time.time()
+        try:
+            index_path = await prepare_data_file(config)
+        except (OSError, ValueError) as e:
+            return {"success": False, "statistics": None, "error": f"Data file error: {e}"}
+
+        # Content-addressed, so repeated runs of a test reuse the file and its cached bytecode
+        try:
+            path = script_path(source)
+        except OSError as e:
+            return {"success": False, "statistics": None, "error": f"Failed to write test script: {e}"}
+        marks["script_written"] = time.time()
 
+        lease = self._cpu_allocator.acquire(run_core_count(config, self._cpu_allocator)) if self._cpu_allocator else None
         try:
             # Construct Locust command
-            cmd = [
-                "locust",
-                "-f", script_path,
-                "--host", config.get("host", "http://localhost:8000"),
+            cmd = ["locust", "-f", path]
+            # Mixed-workload scripts set host to None so each user class keeps its own host
+            host = config.get("host", "http://localhost:8000")
+            if host:
+                cmd.extend(["--host", host])
+            cmd.extend([
                 "--users", str(config.get("users", 10)),
                 "--spawn-rate", str(config.get("spawn_rate", 1)),
                 "--run-time", str(config.get("run_time", "30s")),
                 "--headless",
                 "--json"
-            ]
+            ])
+            if config.get("processes"):
+                cmd.extend(["--processes", str(config["processes"])])
+
+            env = {**os.environ, RUN_ID_ENV: run_id, **(lease.env if lease else {})}
+            if config.get("seed") is not None:
+                env[SEED_ENV] = str(int(config["seed"]))
 
             # Run Locust process
             process = await asyncio.create_subprocess_exec(
                 *cmd,
                 stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
+                stderr=asyncio.subprocess.PIPE,
+                env=env,
+                limit=STDERR_LINE_LIMIT
             )
+            self._processes[run_id] = process
+            # Locust takes far longer to import than this, so its worker processes are
+            # forked inside the cpuset or with the affinity mask set here
+            if lease is not None:
+                lease.apply(process.pid, f"run-{run_id}", cgroup=True)
+            marks["spawned"] = time.time()
 
-            stdout, stderr = await process.communicate()
+            stdout, _ = await asyncio.gather(process.stdout.read(), read_run_events(process.stderr, recorder))
+            await process.wait()
             
             try:
                 # Parse JSON output from Locust
-                results = json.loads(stdout.decode())
-                return {
+                results = parse_stats_output(stdout.decode())
+                response = {
                     "success": True,
                     "statistics": results,
-                    "error": None
+                    "error": None,
+                    "cpu_layout": run_layout(self._cpu_allocator, lease, recorder.processes)
                 }
+                marks["finished"] = time.time()
+                return finish_result(response, recorder, config)
             except json.JSONDecodeError:
                 return {
                     "success": False,
@@ -64,29 +225,28 @@ class LocustTestRunner:
                 "error": str(e)
             }
         finally:
-            # Clean up temporary file
-            if os.path.exists(script_path):
-                os.unlink(script_path)
+            self._processes.pop(run_id, None)
+            # Clean up the run's shared feeder cursor; the script stays cached for later runs
+            remove_data_cursor(index_path, run_id)
+            if lease is not None:
+                lease.release()
 
-    async def stop(self) -> Dict[str, Any]:
-        """Stop any running Locust tests."""
-        try:
-            # Find and kill any running Locust processes
-            cmd = "pkill -f locust"
-            process = await asyncio.create_subprocess_shell(
-                cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            
-            await process.communicate()
-            
-            return {
-                "success": True,
-                "message": "All Locust processes stopped"
-            }
-        except Exception as e:
-            return {
-                "success": False,
-                "error": str(e)
-            }
+    async def stop(self, run_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Stop this runner's Locust runs in progress, or only run_id. Locust shuts down on
+        SIGTERM like on Ctrl+C, so each run still returns its stats so far.
+        """
+        stopped = 0
+        for key, process in list(self._processes.items()):
+            if run_id is not None and key != run_id:
+                continue
+            try:
+                process.terminate()
+                stopped += 1
+            except ProcessLookupError:
+                pass
+        return {
+            "success": True,
+            "stopped": stopped,
+            "message": f"Stopped {stopped} Locust run(s)"
+        }
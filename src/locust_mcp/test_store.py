@@ -1,15 +1,38 @@
 import os
 import json
 import logging
+import shutil
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from locust_mcp.retention import RetentionPolicy
+from locust_mcp.test_archive import TestArchive, SEGMENT_MAX_TESTS
 
 logger = logging.getLogger(__name__)
 
+def new_run_id() -> str:
+    """A run ID; IDs sort in the order runs started"""
+    return datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+
 class TestStore:
-    """Manages storage and retrieval of Locust test files"""
+    """
+    Manages storage and retrieval of Locust test files. With shared=True several processes,
+    such as the workers of a multi-process server, use the store at once: appends to and
+    rewrites of the history take a file lock, and each process picks up the tests the
+    others added when it lists them.
+    """
     
-    def __init__(self, base_dir: str = None):
+    def __init__(self, base_dir: str = None, load: bool = True, shared: bool = False):
+        if shared and fcntl is None:
+            raise ValueError("A shared test store needs file locks, which this platform lacks")
+        self.shared = shared
         # Set up local tests directory in the project
         self.tests_dir = os.path.join(os.getcwd(), 'tests', 'generated')
         os.makedirs(self.tests_dir, exist_ok=True)
@@ -27,24 +50,179 @@ class TestStore:
         else:
             self.cache_dir = base_dir
             
-        # Keep track of test history
-        self.history_file = os.path.join(self.tests_dir, 'history.json')
-        self.load_history()
+        # Keep track of test history. With load=False it is read on first use, or by an
+        # explicit load_history() call, e.g. from a background thread while the server starts.
+        # The history is a JSON lines file that new tests are appended to; history.json is
+        # the older format, read once and then replaced.
+        self.history_file = os.path.join(self.tests_dir, 'history.jsonl')
+        self.legacy_history_file = os.path.join(self.tests_dir, 'history.json')
+        self._history: Optional[List[Dict[str, Any]]] = None
+        self._history_lock = threading.Lock()
+        # Re-entrant, so a refresh can run inside a write
+        self._write_lock = threading.RLock()
+        self._compaction_lock = threading.Lock()
+        # Set when the history file must be rewritten rather than appended to
+        self._rewrite_history = False
+        # Inode of the history file and the offset up to which it has been read, in shared mode
+        self._history_source: Optional[Tuple[int, int]] = None
+        self.history_lock_file = os.path.join(self.tests_dir, 'history.lock')
+        self.compaction_lock_file = os.path.join(self.tests_dir, 'compaction.lock')
+
+        # Tests removed by retention are compacted into archive segments
+        self.archive = TestArchive(os.path.join(self.tests_dir, 'archive'), shared=shared)
+        if load:
+            self.load_history()
         
         logger.info(f"Test store initialized. Tests will be saved in: {self.tests_dir}")
 
+    @property
+    def history(self) -> List[Dict[str, Any]]:
+        if self._history is None:
+            # Waits for a load already in progress instead of starting a second one
+            self.load_history()
+        return self._history
+
+    @history.setter
+    def history(self, value: List[Dict[str, Any]]):
+        self._history = value
+
+    @property
+    def history_loaded(self) -> bool:
+        return self._history is not None
+
     def load_history(self):
-        """Load test history from file"""
-        if os.path.exists(self.history_file):
-            with open(self.history_file, 'r') as f:
-                self.history = json.load(f)
-        else:
-            self.history = []
+        """Load test history from file, unless it is already loaded"""
+        with self._history_lock:
+            if self._history is not None:
+                return
+            if os.path.exists(self.history_file):
+                with open(self.history_file, 'rb') as f:
+                    data = f.read()
+                    inode = os.fstat(f.fileno()).st_ino
+                if self.shared:
+                    # A line another process is still appending is read by the next refresh
+                    data = data[:data.rfind(b'\n') + 1]
+                    self._history_source = (inode, len(data))
+                lines = [line for line in data.decode().split('\n') if line.strip()]
+                try:
+                    # One parse of all lines as an array is about twice as fast as one per line
+                    self._history = json.loads('[' + ','.join(lines) + ']')
+                except json.JSONDecodeError:
+                    # A line cut short by a crash while appending is skipped
+                    self._history = []
+                    for line in lines:
+                        try:
+                            self._history.append(json.loads(line))
+                        except json.JSONDecodeError:
+                            logger.warning(f"Skipping corrupt line in {self.history_file}: {line[:80]}")
+                    self._rewrite_history = True
+            elif os.path.exists(self.legacy_history_file):
+                with open(self.legacy_history_file, 'r') as f:
+                    self._history = json.load(f)
+                self._rewrite_history = True
+            else:
+                self._history = []
+
+    def refresh_history(self):
+        """
+        In shared mode, add the tests other processes appended to the history since it was
+        read, or read it again after another process rewrote it.
+        """
+        if not self.shared or self._history is None:
+            return
+        with self._write_lock:
+            try:
+                f = open(self.history_file, 'rb')
+            except FileNotFoundError:
+                return
+            with f:
+                stat = os.fstat(f.fileno())
+                inode, size = stat.st_ino, stat.st_size
+                source_inode, offset = self._history_source or (None, 0)
+                if inode != source_inode or size < offset:
+                    with self._history_lock:
+                        self._history = None
+                    self.load_history()
+                    return
+                if size == offset:
+                    return
+                f.seek(offset)
+                data = f.read()
+            data = data[:data.rfind(b'\n') + 1]
+            for line in data.decode().split('\n'):
+                if line.strip():
+                    try:
+                        self._history.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        logger.warning(f"Skipping corrupt line in {self.history_file}: {line[:80]}")
+            self._history_source = (inode, offset + len(data))
+
+    @contextmanager
+    def _file_lock(self, path: str):
+        """In shared mode, an exclusive lock on path held against other processes"""
+        if not self.shared:
+            yield
+            return
+        with open(path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _history_write(self):
+        """Hold the history for changing it, against other threads and, in shared mode, processes"""
+        # Loaded first, since loading takes the history lock
+        self.load_history()
+        with self._write_lock, self._file_lock(self.history_lock_file):
+            self.refresh_history()
+            yield
+
+    def _set_history_source(self, f):
+        if self.shared:
+            stat = os.fstat(f.fileno())
+            self._history_source = (stat.st_ino, stat.st_size)
 
     def save_history(self):
-        """Save test history to file"""
-        with open(self.history_file, 'w') as f:
-            json.dump(self.history, f, indent=2)
+        """Rewrite the whole test history file"""
+        tmp_file = self.history_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            for test_info in self.history:
+                f.write(json.dumps(test_info) + '\n')
+            f.flush()
+            self._set_history_source(f)
+        os.replace(tmp_file, self.history_file)
+        self._rewrite_history = False
+        if os.path.exists(self.legacy_history_file):
+            os.unlink(self.legacy_history_file)
+
+    def _append_history(self, test_info: Dict[str, Any]):
+        with self._history_write():
+            self.history.append(test_info)
+            if self._rewrite_history:
+                self.save_history()
+            else:
+                with open(self.history_file, 'a') as f:
+                    f.write(json.dumps(test_info) + '\n')
+                    f.flush()
+                    self._set_history_source(f)
+
+    def _new_test_dir(self) -> str:
+        """Create the directory of a new test, named by its timestamp, and return the test ID"""
+        base_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+        test_id = base_id
+        suffix = 1
+        while True:
+            # Tests saved within the same second get _2, _3, ... appended
+            if test_id not in self.archive:
+                try:
+                    os.makedirs(os.path.join(self.tests_dir, test_id))
+                    return test_id
+                except FileExistsError:
+                    pass
+            suffix += 1
+            test_id = f"{base_id}_{suffix}"
 
     def save_test(self, script: str, config: Dict[str, Any], description: str = "") -> Dict[str, Any]:
         """
@@ -52,11 +230,10 @@ class TestStore:
         Returns dict with test ID and file locations.
         """
         # Generate unique test ID using timestamp
-        test_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+        test_id = self._new_test_dir()
         
         # Save in local tests directory
         test_dir = os.path.join(self.tests_dir, test_id)
-        os.makedirs(test_dir, exist_ok=True)
         
         script_path = os.path.join(test_dir, f'locust_test_{test_id}.py')
         config_path = os.path.join(test_dir, 'config.json')
@@ -87,8 +264,7 @@ class TestStore:
             'config_path': config_path,
             'config': config
         }
-        self.history.append(test_info)
-        self.save_history()
+        self._append_history(test_info)
         
         logger.info(f"Test files generated:")
         logger.info(f"- Script: {script_path}")
@@ -97,16 +273,22 @@ class TestStore:
         return test_info
 
     def get_test(self, test_id: str) -> Optional[Dict[str, Any]]:
-        """Retrieve a test by its ID"""
+        """Retrieve a test by its ID, from its files or else from the archive"""
         test_dir = os.path.join(self.tests_dir, test_id)
-        if not os.path.exists(test_dir):
-            return None
-            
         script_path = os.path.join(test_dir, f'locust_test_{test_id}.py')
         config_path = os.path.join(test_dir, 'config.json')
         
         if not os.path.exists(script_path) or not os.path.exists(config_path):
-            return None
+            record = self.archive.read(test_id)
+            if record is None or "script" not in record:
+                return None
+            return {
+                'script': record['script'],
+                'config': record['config'],
+                'script_path': None,
+                'config_path': None,
+                'archived': True
+            }
             
         with open(script_path, 'r') as f:
             script = f.read()
@@ -123,4 +305,133 @@ class TestStore:
 
     def list_tests(self) -> List[Dict[str, Any]]:
         """List all saved tests"""
+        self.refresh_history()
         return self.history
+
+    def save_run(self, test_id: str, result: Dict[str, Any], run_id: Optional[str] = None) -> str:
+        """Save the result of a run of a stored test, under run_id or a new run ID. Returns the run ID."""
+        if not os.path.isdir(os.path.join(self.tests_dir, test_id)) and test_id not in self.archive:
+            raise ValueError(f"Test with ID {test_id} not found")
+        runs_dir = os.path.join(self.tests_dir, test_id, 'runs')
+        os.makedirs(runs_dir, exist_ok=True)
+        run_id = run_id or new_run_id()
+        tmp_path = os.path.join(runs_dir, f'{run_id}.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(result, f)
+        os.replace(tmp_path, os.path.join(runs_dir, f'{run_id}.json'))
+        return run_id
+
+    def _read_runs(self, test_id: str) -> Dict[str, Any]:
+        runs_dir = os.path.join(self.tests_dir, test_id, 'runs')
+        runs = {}
+        if os.path.isdir(runs_dir):
+            for name in sorted(os.listdir(runs_dir)):
+                if name.endswith('.json'):
+                    with open(os.path.join(runs_dir, name)) as f:
+                        runs[name[:-5]] = json.load(f)
+        return runs
+
+    def get_runs(self, test_id: str) -> Dict[str, Any]:
+        """Results of the saved runs of a test by run ID, oldest first, archived ones included"""
+        record = self.archive.read(test_id)
+        runs = dict(record["runs"]) if record else {}
+        runs.update(self._read_runs(test_id))
+        return dict(sorted(runs.items()))
+
+    def _remove_archived_files(self, test_id: str, record: Dict[str, Any]):
+        """Delete the files of a test that were archived, leaving anything written since"""
+        test_dir = os.path.join(self.tests_dir, test_id)
+        runs_dir = os.path.join(test_dir, 'runs')
+        paths = [os.path.join(runs_dir, f'{run_id}.json') for run_id in record.get("runs") or {}]
+        if "script" in record:
+            paths += [os.path.join(test_dir, f'locust_test_{test_id}.py'), os.path.join(test_dir, 'config.json')]
+            shutil.rmtree(os.path.join(self.cache_dir, test_id), ignore_errors=True)
+        for path in paths:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        # Only removed when empty, so a run saved meanwhile is archived next time
+        for directory in (runs_dir, test_dir):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+
+    def compact(self, policy: RetentionPolicy, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Blocking: apply a retention policy. Tests the policy does not keep are moved into
+        compressed archive segments, together with their run results, and their directories
+        are removed; get_test and get_runs keep reading them from the archive. Results of
+        runs of already archived tests are archived as well, and archive segments whose
+        tests all exceed the policy's max_archive_age are deleted.
+        """
+        with self._compaction_lock, self._file_lock(self.compaction_lock_file):
+            with self._history_write():
+                history = list(self.history)
+            keep = policy.kept(history, now)
+
+            records = []
+            # Archived by a compaction that was interrupted before it updated the history
+            recovered = set()
+            for test_info in history:
+                test_id = test_info['id']
+                if not test_info.get('archived') and test_id not in keep and test_id in self.archive:
+                    recovered.add(test_id)
+                    self._remove_archived_files(test_id, {"script": True})
+                    continue
+                if test_info.get('archived'):
+                    runs = self._read_runs(test_id)
+                    if runs:
+                        records.append({"id": test_id, "runs": runs})
+                    continue
+                if test_id in keep:
+                    continue
+                test = self.get_test(test_id)
+                if test is None or test.get('archived'):
+                    logger.warning(f"Files of test {test_id} are missing; it cannot be archived")
+                    continue
+                records.append({
+                    "id": test_id,
+                    "info": test_info,
+                    "script": test['script'],
+                    "config": test['config'],
+                    "runs": self._read_runs(test_id)
+                })
+
+            segments = []
+            for start in range(0, len(records), SEGMENT_MAX_TESTS):
+                chunk = records[start:start + SEGMENT_MAX_TESTS]
+                segments.append(self.archive.write_segment(chunk))
+                for record in chunk:
+                    self._remove_archived_files(record["id"], record)
+            archived = {record["id"] for record in records if "script" in record} | recovered
+
+            # Segments are deleted whole, once every test in them has expired
+            expired = {test_info['id'] for test_info in history
+                       if (test_info.get('archived') or test_info['id'] in archived)
+                       and policy.expired(test_info, now)}
+            deleted_segments = [name for name, test_ids in self.archive.segments().items()
+                                if all(test_id in expired for test_id in test_ids)]
+            self.archive.delete_segments(deleted_segments)
+            deleted = {test_id for test_id in expired if test_id not in self.archive}
+
+            with self._history_write():
+                for test_info in self.history:
+                    if test_info['id'] in archived:
+                        test_info.update({'archived': True, 'script_path': None, 'config_path': None})
+                self.history = [test_info for test_info in self.history if test_info['id'] not in deleted]
+                if archived or deleted:
+                    self.save_history()
+                live = sum(1 for test_info in self.history if not test_info.get('archived'))
+
+        summary = {
+            "archived_tests": len(archived),
+            "archived_runs": sum(len(record["runs"]) for record in records),
+            "segments": segments,
+            "deleted_tests": len(deleted),
+            "deleted_segments": deleted_segments,
+            "live_tests": live
+        }
+        logger.info(f"Compaction finished: {summary}")
+        return summary
@@ -0,0 +1,259 @@
+# W3C trace context for generated scripts, and slow-request exemplars. use_tracing() makes
+# a user's HttpSession send a traceparent header on a sample of its requests, so the
+# target's traces of those requests can be found by trace ID. Each Locust process keeps
+# the slowest traced requests per endpoint and interval as exemplars (ExemplarReservoir),
+# and the runner collects them into a series of bounded length (ExemplarSeries) that links
+# the percentiles of the run's response times to the exemplars in their buckets. They are
+# also attached to the run's stats intervals (IntervalExemplars), so the measurement
+# window and the trends cut from those intervals carry the exemplars of their requests.
+import heapq
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from locust_mcp.sampling import sampling_random
+from locust_mcp.windowed_stats import percentile
+
+# Exemplars kept per endpoint and interval, overridable through the environment of the locust processes
+DEFAULT_EXEMPLARS = 5
+# Series points kept per run; beyond that, neighbouring points are merged
+SERIES_LIMIT = 240
+PERCENTILES = (("p50", 0.5), ("p90", 0.9), ("p95", 0.95), ("p99", 0.99), ("max", 1.0))
+
+
+def exemplar_count() -> int:
+    value = os.environ.get("LOCUST_MCP_EXEMPLARS")
+    return max(0, int(value)) if value else DEFAULT_EXEMPLARS
+
+
+def response_time_bucket(response_time: float) -> int:
+    """The bucket of Locust's response time histograms that a response time counts in"""
+    if response_time < 100:
+        return round(response_time)
+    if response_time < 1000:
+        return int(round(response_time, -1))
+    if response_time < 10000:
+        return int(round(response_time, -2))
+    return int(round(response_time, -3))
+
+
+def slowest(exemplars: Iterable[Dict[str, Any]], size: int) -> List[Dict[str, Any]]:
+    """The size slowest exemplars, slowest first"""
+    return sorted(exemplars, key=lambda exemplar: exemplar["response_time"], reverse=True)[:size]
+
+
+def new_traceparent() -> str:
+    """A traceparent header for a new, sampled trace"""
+    # From the OS, so IDs are unique across processes however they were started
+    trace_id = int.from_bytes(os.urandom(16), "big") or 1
+    span_id = int.from_bytes(os.urandom(8), "big") or 1
+    return f"00-{trace_id:032x}-{span_id:016x}-01"
+
+
+def parse_traceparent(value: str) -> Optional[Tuple[str, str]]:
+    """The (trace ID, span ID) of a traceparent header, or None"""
+    parts = value.split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+
+class TraceContext:
+    """
+    Session auth that adds a traceparent header to a sample of requests, after applying
+    the session's own auth, if any
+    """
+
+    def __init__(self, sample_rate: float, auth: Any = None):
+        self.sample_rate = sample_rate
+        self.auth = auth
+
+    def __call__(self, request):
+        if self.auth is not None:
+            request = self.auth(request)
+        if "traceparent" not in request.headers and sampling_random.random() < self.sample_rate:
+            request.headers["traceparent"] = new_traceparent()
+        return request
+
+
+def use_tracing(client, sample_rate: float = 1.0):
+    """Send a traceparent header on sample_rate of a user's requests (0 to 1)"""
+    if not 0 <= sample_rate <= 1:
+        raise ValueError(f"Invalid trace sample rate: {sample_rate}")
+    client.auth = TraceContext(sample_rate, client.auth)
+
+
+class ExemplarReservoir:
+    """The slowest traced requests of one process since the last report, per endpoint"""
+
+    def __init__(self, size: int = DEFAULT_EXEMPLARS):
+        self.size = size
+        # Min-heaps of (response time, time, trace ID, span ID), so the fastest is replaced first
+        self._heaps: Dict[Tuple[str, str], List[Tuple[float, float, str, str]]] = {}
+
+    def record(self, method: str, name: str, response: Any, response_time: float, now: float) -> bool:
+        """Offer one request from Locust's request event; False if it wasn't traced"""
+        request = getattr(response, "request", None)
+        header = request.headers.get("traceparent") if request is not None else None
+        if not header or not self.size:
+            return False
+        ids = parse_traceparent(header)
+        if ids is None:
+            return False
+        heap = self._heaps.setdefault((name, method), [])
+        item = (response_time, now, *ids)
+        if len(heap) < self.size:
+            heapq.heappush(heap, item)
+        elif response_time > heap[0][0]:
+            heapq.heapreplace(heap, item)
+        return True
+
+    def take(self) -> List[Dict[str, Any]]:
+        """The exemplars per endpoint since the last call, slowest first"""
+        endpoints = [
+            {"name": name, "method": method, "exemplars": [
+                {"trace_id": trace_id, "span_id": span_id, "time": time, "response_time": round(response_time, 3),
+                 "bucket": response_time_bucket(response_time)}
+                for response_time, time, trace_id, span_id in sorted(heap, reverse=True)
+            ]}
+            for (name, method), heap in self._heaps.items() if heap
+        ]
+        self._heaps = {}
+        return endpoints
+
+
+class ExemplarSeries:
+    """
+    The exemplars of a run by endpoint over time, merged from the reports of all its
+    processes. Points start at one per stats interval; when there are more than limit,
+    neighbouring points are merged, keeping the slowest exemplars, so memory stays bounded.
+    """
+
+    def __init__(self, size: int = DEFAULT_EXEMPLARS, interval: float = 1.0, limit: int = SERIES_LIMIT):
+        self.size = size
+        self.interval = interval
+        self.limit = limit
+        # Seconds per point
+        self.width = interval
+        # Point start (a multiple of width) -> (name, method) -> exemplars
+        self.points: Dict[float, Dict[Tuple[str, str], List[Dict[str, Any]]]] = {}
+
+    def _keep(self, exemplars: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return slowest(exemplars, self.size)
+
+    def add(self, event: Dict[str, Any]):
+        """Add an "exemplars" event, or a point of events()"""
+        start = event["time"] - event["time"] % self.width
+        point = self.points.setdefault(start, {})
+        for endpoint in event.get("endpoints") or []:
+            key = (endpoint["name"], endpoint["method"])
+            point[key] = self._keep(point.get(key, []) + endpoint["exemplars"])
+        while len(self.points) > self.limit:
+            self._coarsen()
+
+    def _coarsen(self):
+        self.width *= 2
+        points = self.points
+        self.points = {}
+        for start, endpoints in sorted(points.items()):
+            merged = self.points.setdefault(start - start % self.width, {})
+            for key, exemplars in endpoints.items():
+                merged[key] = self._keep(merged.get(key, []) + exemplars)
+
+    def events(self) -> List[Dict[str, Any]]:
+        """The series as "exemplars" events, for another ExemplarSeries to add"""
+        return [
+            {"time": start, "endpoints": [{"name": name, "method": method, "exemplars": exemplars}
+                                          for (name, method), exemplars in endpoints.items()]}
+            for start, endpoints in sorted(self.points.items())
+        ]
+
+    def summary(self, statistics: Optional[List[Dict[str, Any]]], origin: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Per endpoint, its exemplars over time (offsets in seconds from origin, by default the
+        first point), and the bucket of each response time percentile in statistics (Locust
+        entries with their response_times histograms) with the exemplars that fall between
+        it and the next higher percentile, closest to it first
+        """
+        if origin is None:
+            origin = min(self.points, default=0.0)
+        entries = {(entry["name"], entry["method"]): entry for entry in statistics or [] if entry.get("response_times")}
+        by_endpoint: Dict[Tuple[str, str], List[Tuple[float, List[Dict[str, Any]]]]] = {}
+        for start, endpoints in sorted(self.points.items()):
+            for key, exemplars in endpoints.items():
+                by_endpoint.setdefault(key, []).append((start, exemplars))
+
+        summary = []
+        for (name, method), points in by_endpoint.items():
+            exemplars = [exemplar for _, point in points for exemplar in point]
+            summary.append({
+                "name": name,
+                "method": method,
+                "percentiles": self._link_percentiles(entries.get((name, method)), exemplars),
+                "intervals": [
+                    {"start": round(start - origin, 3), "end": round(start + self.width - origin, 3), "exemplars": point}
+                    for start, point in points
+                ]
+            })
+        return summary
+
+    def _link_percentiles(self, entry: Optional[Dict[str, Any]], exemplars: List[Dict[str, Any]]) -> Dict[str, Any]:
+        if entry is None:
+            return {}
+        response_times = entry["response_times"]
+        total = sum(response_times.values())
+        buckets = [(name, percentile(response_times, total, percent)) for name, percent in PERCENTILES]
+        linked = {}
+        for index, (name, bucket) in enumerate(buckets):
+            upper = next((value for _, value in buckets[index + 1:] if value > bucket), None)
+            band = [exemplar for exemplar in exemplars
+                    if exemplar["bucket"] >= bucket and (upper is None or exemplar["bucket"] < upper)]
+            band.sort(key=lambda exemplar: exemplar["response_time"])
+            linked[name] = {"bucket": bucket, "exemplars": band[:self.size]}
+        return linked
+
+
+class IntervalExemplars:
+    """
+    Attaches exemplars to the stats intervals their requests were counted in, as the
+    slowest size "exemplars" of the interval's entry for their endpoint. A request counts
+    in the interval in which it completed, its time plus its response time; exemplars
+    reported before that interval wait for it.
+    """
+
+    def __init__(self, size: int = DEFAULT_EXEMPLARS):
+        self.size = size
+        # (completion time, name, method, exemplar)
+        self.pending: List[Tuple[float, str, str, Dict[str, Any]]] = []
+
+    def add(self, event: Dict[str, Any], intervals: List[Dict[str, Any]]):
+        """Attach the exemplars of an "exemplars" event to the intervals recorded so far"""
+        for endpoint in event.get("endpoints") or []:
+            for exemplar in endpoint["exemplars"]:
+                completed = exemplar["time"] + exemplar["response_time"] / 1000
+                self.pending.append((completed, endpoint["name"], endpoint["method"], exemplar))
+        self.attach(intervals)
+
+    def attach(self, intervals: List[Dict[str, Any]]):
+        """Attach the waiting exemplars whose interval has been recorded, e.g. after adding one"""
+        waiting = []
+        last = intervals[-1]["time"] if intervals else None
+        for item in self.pending:
+            completed, name, method, exemplar = item
+            if last is None or completed >= last:
+                waiting.append(item)
+                continue
+            # Usually one of the latest intervals; exemplars of none are dropped here
+            interval = None
+            for candidate in reversed(intervals):
+                if candidate["start"] <= completed < candidate["time"]:
+                    interval = candidate
+                    break
+                if candidate["time"] <= completed:
+                    break
+            if interval is None:
+                continue
+            for entry in interval["entries"]:
+                if entry["name"] == name and entry["method"] == method:
+                    entry["exemplars"] = slowest(entry.get("exemplars", []) + [exemplar], self.size)
+                    break
+        self.pending = waiting
@@ -0,0 +1,264 @@
+import json
+import logging
+import random
+import re
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional, TextIO, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_TEMPLATES = 1000
+DEFAULT_MAX_SAMPLES = 20
+# Total of all task weights in a generated script; Locust expands each weight into list entries
+WEIGHT_SCALE = 1000
+
+# nginx/Apache "combined" (and "common") log format
+COMBINED_LOG_PATTERN = re.compile(
+    r'^\S+ \S+ \S+ \[(?P<time>[^\]]+)\] "(?P<method>[A-Z]+) (?P<target>\S+)(?: [^"]*)?" (?P<status>\d{3}) '
+)
+LOG_TIME_FORMAT = '%d/%b/%Y:%H:%M:%S %z'
+HAR_ENTRIES_PATTERN = re.compile(r'"entries"\s*:\s*\[')
+
+# Path segments that are identifiers rather than routes, checked in order
+SEGMENT_PLACEHOLDERS = [
+    (re.compile(r'^\d+$'), '{id}'),
+    (re.compile(r'^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$'), '{uuid}'),
+    (re.compile(r'^[0-9a-fA-F]{16,}$'), '{hash}'),
+    (re.compile(r'^(?=.*\d)[A-Za-z0-9_\-]{20,}$'), '{token}'),
+]
+
+
+def normalize_path(path: str) -> str:
+    """Turn a concrete request path into a template, e.g. /users/42/orders -> /users/{id}/orders."""
+    segments = path.split('/')
+    for idx, segment in enumerate(segments):
+        for pattern, placeholder in SEGMENT_PLACEHOLDERS:
+            if pattern.match(segment):
+                segments[idx] = placeholder
+                break
+    return '/'.join(segments) or '/'
+
+
+def detect_format(path: str) -> str:
+    """Guess the traffic file format from its extension."""
+    return "har" if path.lower().endswith(".har") else "combined"
+
+
+def iter_access_log(f: TextIO) -> Iterator[Dict[str, Any]]:
+    """Stream requests from an nginx/Apache combined access log, skipping unparseable lines."""
+    # Consecutive lines usually share a second, so only parse the time when it changes
+    last_time = None
+    timestamp = None
+    for line in f:
+        match = COMBINED_LOG_PATTERN.match(line)
+        if not match:
+            continue
+        if match.group('time') != last_time:
+            try:
+                timestamp = datetime.strptime(match.group('time'), LOG_TIME_FORMAT).timestamp()
+            except ValueError:
+                continue
+            last_time = match.group('time')
+        yield {
+            "timestamp": timestamp,
+            "method": match.group('method'),
+            "target": match.group('target'),
+            "status": int(match.group('status')),
+            "host": None
+        }
+
+
+def _iter_json_array(f: TextIO, start_pattern: re.Pattern, chunk_size: int = 1 << 20) -> Iterator[Any]:
+    """
+    Incrementally decode the items of the first JSON array opened by start_pattern.
+    Only the current item and one read chunk are held in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = None
+    eof = False
+
+    while pos is None:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+        # Keep a tail in case the key is split across chunks
+        buffer = buffer[-64:] + chunk
+        match = start_pattern.search(buffer)
+        if match:
+            pos = match.end()
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        if pos < len(buffer):
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                yield item
+                pos = end
+                continue
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+        elif eof:
+            return
+        # Item is incomplete: drop what has been consumed and read more
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+
+def iter_har(f: TextIO) -> Iterator[Dict[str, Any]]:
+    """Stream requests from a HAR file without loading the whole document."""
+    for entry in _iter_json_array(f, HAR_ENTRIES_PATTERN):
+        request = entry.get("request") or {}
+        url = urlsplit(request.get("url", ""))
+        if not url.scheme:
+            continue
+        started = entry.get("startedDateTime", "").replace("Z", "+00:00")
+        try:
+            timestamp = datetime.fromisoformat(started).timestamp()
+        except ValueError:
+            continue
+        yield {
+            "timestamp": timestamp,
+            "method": request.get("method", "GET").upper(),
+            "target": url.path + (f"?{url.query}" if url.query else ""),
+            "status": (entry.get("response") or {}).get("status"),
+            "host": f"{url.scheme}://{url.netloc}"
+        }
+
+
+def iter_requests(path: str, fmt: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Stream request records from an access log or HAR file."""
+    fmt = fmt or detect_format(path)
+    if fmt not in ("combined", "har"):
+        raise ValueError(f"Unsupported traffic format: {fmt}")
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        yield from (iter_har(f) if fmt == "har" else iter_access_log(f))
+
+
+class TrafficProfile:
+    """
+    Frequency profile of recorded traffic, aggregated by method and path template.
+    Memory is bounded by max_templates and max_samples regardless of input size.
+    """
+
+    def __init__(self, max_templates: int = DEFAULT_MAX_TEMPLATES, max_samples: int = DEFAULT_MAX_SAMPLES):
+        self.max_templates = max_templates
+        self.max_samples = max_samples
+        self.templates: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.hosts: Dict[str, int] = {}
+        self.total = 0
+        self.dropped = 0
+        self._random = random.Random(0)
+
+    def add(self, record: Dict[str, Any]):
+        """Count one request, keeping a reservoir sample of concrete targets per template"""
+        self.total += 1
+        if record.get("host"):
+            self.hosts[record["host"]] = self.hosts.get(record["host"], 0) + 1
+
+        template = normalize_path(record["target"].split('?', 1)[0])
+        key = (record["method"], template)
+        stats = self.templates.get(key)
+        if stats is None:
+            if len(self.templates) >= self.max_templates:
+                self.dropped += 1
+                return
+            stats = self.templates[key] = {"count": 0, "samples": []}
+
+        stats["count"] += 1
+        if len(stats["samples"]) < self.max_samples:
+            stats["samples"].append(record["target"])
+        else:
+            slot = self._random.randrange(stats["count"])
+            if slot < self.max_samples:
+                stats["samples"][slot] = record["target"]
+
+    def endpoints(self) -> List[Dict[str, Any]]:
+        """Endpoints ordered by frequency, with weights scaled so they sum to about WEIGHT_SCALE"""
+        counted = self.total - self.dropped
+        endpoints = []
+        for (method, template), stats in sorted(self.templates.items(), key=lambda item: -item[1]["count"]):
+            endpoint = {
+                "method": method,
+                "path": template,
+                "weight": max(1, round(stats["count"] * WEIGHT_SCALE / counted)),
+                "count": stats["count"]
+            }
+            # Templates with placeholders replay the concrete paths that were seen
+            samples = set(stats["samples"])
+            if samples != {template}:
+                endpoint["samples"] = sorted(samples)
+            endpoints.append(endpoint)
+        return endpoints
+
+    def busiest_host(self) -> Optional[str]:
+        return max(self.hosts, key=self.hosts.get) if self.hosts else None
+
+
+class TrafficImporter:
+    """Builds load test specifications and replay schedules from access logs and HAR files"""
+
+    def __init__(self, max_templates: int = DEFAULT_MAX_TEMPLATES, max_samples: int = DEFAULT_MAX_SAMPLES):
+        self.max_templates = max_templates
+        self.max_samples = max_samples
+
+    def profile(self, path: str, fmt: Optional[str] = None) -> TrafficProfile:
+        """Stream a traffic file into a frequency profile."""
+        profile = TrafficProfile(self.max_templates, self.max_samples)
+        for record in iter_requests(path, fmt):
+            profile.add(record)
+        if profile.dropped:
+            logger.warning(f"{profile.dropped} requests exceeded the limit of {self.max_templates} path templates")
+        return profile
+
+    def to_spec(self, path: str, fmt: Optional[str] = None, target_url: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Build a load test specification whose endpoints are the recorded path templates,
+        weighted by how often they occurred.
+        """
+        profile = self.profile(path, fmt)
+        if not profile.total:
+            raise ValueError(f"No requests found in {path}")
+        return {
+            "targetUrl": target_url or profile.busiest_host() or "http://localhost:8000",
+            "endpoints": profile.endpoints(),
+            "requestCount": profile.total,
+            "droppedRequests": profile.dropped
+        }
+
+    def write_replay_schedule(self, path: str, schedule_path: str, fmt: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Write a replay schedule of [offset seconds, method, target, template] lines,
+        streaming the source so that memory stays constant.
+        """
+        start = None
+        count = 0
+        last_offset = 0.0
+        hosts: Dict[str, int] = {}
+        with open(schedule_path, "w") as schedule:
+            for record in iter_requests(path, fmt):
+                if start is None:
+                    start = record["timestamp"]
+                last_offset = record["timestamp"] - start
+                if record.get("host"):
+                    hosts[record["host"]] = hosts.get(record["host"], 0) + 1
+                template = normalize_path(record["target"].split('?', 1)[0])
+                schedule.write(json.dumps([round(last_offset, 3), record["method"], record["target"], template]))
+                schedule.write("\n")
+                count += 1
+
+        if not count:
+            raise ValueError(f"No requests found in {path}")
+        return {
+            "schedule_path": schedule_path,
+            "requestCount": count,
+            "duration": last_offset,
+            "host": max(hosts, key=hosts.get) if hosts else None
+        }
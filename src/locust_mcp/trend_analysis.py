@@ -0,0 +1,302 @@
+# Trend detection over a run's stats intervals, for soak tests where a slow drift (p95
+# creeping up, throughput decaying as the target leaks memory) matters more than the final
+# averages. TrendTracker sums the stats intervals after the ramp-up into points of a fixed
+# length, and follows a few metrics of each point with online estimators of constant
+# memory: running mean and variance, a linear regression over the whole run, a regression
+# over a sliding window whose slope shows drift, and a two-sided CUSUM that detects shifts
+# in level. Drift and change points in the direction that means trouble are returned as
+# "drift" events as they are detected, with the slowest exemplars of the point that raised
+# them, so the traces of the slow requests behind an alert are a click away.
+import math
+import os
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from locust_mcp.trace_context import DEFAULT_EXEMPLARS, exemplar_count, slowest
+from locust_mcp.windowed_stats import WINDOW_SLACK, percentile
+
+# Seconds the drift slope is fitted over, and the change across that window,
+# relative to its mean, that counts as drift; both overridable through the environment
+DEFAULT_DRIFT_WINDOW = 300.0
+DEFAULT_DRIFT_THRESHOLD = 0.1
+# Points per drift window; stats intervals are summed into points of window / this seconds,
+# so the estimators see averages rather than every second's noise
+WINDOW_POINTS = 30
+# How sure a slope must be, as slope / standard error, before it counts as drift. High,
+# because neighbouring points are correlated.
+DRIFT_T_STAT = 4.0
+# Consecutive points a slope must count as drift for before it is reported
+DRIFT_POINTS = WINDOW_POINTS // 6
+# Points that set the level CUSUM compares against, after the ramp-up and after every change point
+BASELINE_POINTS = 30
+# CUSUM allowance and decision threshold, in standard deviations of the baseline
+CUSUM_K = 0.5
+CUSUM_H = 8.0
+# Baseline noise is at least this share of its mean, so a flat baseline doesn't flag every wobble
+MIN_RELATIVE_NOISE = 0.02
+# Change points and alerts kept per run
+MAX_EVENTS = 50
+
+# Metric name, the direction that means trouble, and its smallest noise and the smallest
+# mean that changes are taken relative to (requests/s, ms, failed share of requests)
+METRICS = (
+    ("rps", "down", 1.0),
+    ("avg_response_time", "up", 1.0),
+    ("p95_response_time", "up", 1.0),
+    ("failure_rate", "up", 0.01),
+)
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+def _add_interval(point: Dict[str, Any], interval: Dict[str, Any], exemplars: int = DEFAULT_EXEMPLARS):
+    """Sum a stats interval's entries into a point, keeping its slowest exemplars across endpoints"""
+    point["time"] = interval["time"]
+    for delta in interval["entries"]:
+        point["requests"] += delta["num_requests"]
+        point["failures"] += delta["num_failures"]
+        point["total_response_time"] += delta["total_response_time"]
+        response_times = point["response_times"]
+        for value, count in delta["response_times"].items():
+            value = float(value)
+            response_times[value] = response_times.get(value, 0) + count
+        if delta.get("exemplars"):
+            found = [{"name": delta["name"], "method": delta["method"], **exemplar} for exemplar in delta["exemplars"]]
+            point["exemplars"] = slowest(point["exemplars"] + found, exemplars)
+
+
+def point_metrics(point: Dict[str, Any]) -> Dict[str, float]:
+    """The metrics of a point; without the response time ones if it had no requests"""
+    requests = point["requests"]
+    elapsed = point["time"] - point["start"]
+    metrics = {"rps": requests / elapsed if elapsed > 0 else 0.0}
+    if requests:
+        metrics["avg_response_time"] = point["total_response_time"] / requests
+        metrics["p95_response_time"] = percentile(point["response_times"], sum(point["response_times"].values()), 0.95)
+        metrics["failure_rate"] = point["failures"] / requests
+    return metrics
+
+
+class Regression:
+    """Least-squares line through (t, y) points from running sums; points can be removed again"""
+
+    def __init__(self):
+        self.n = 0
+        self.t = self.y = self.tt = self.ty = self.yy = 0.0
+
+    def add(self, t: float, y: float, sign: int = 1):
+        self.n += sign
+        self.t += sign * t
+        self.y += sign * y
+        self.tt += sign * t * t
+        self.ty += sign * t * y
+        self.yy += sign * y * y
+
+    def remove(self, t: float, y: float):
+        self.add(t, y, -1)
+
+    @property
+    def mean(self) -> float:
+        return self.y / self.n if self.n else 0.0
+
+    def slope(self) -> Tuple[float, float]:
+        """The slope and its standard error; (0, inf) with too few points to tell"""
+        if self.n < 3:
+            return 0.0, math.inf
+        stt = self.tt - self.t * self.t / self.n
+        if stt <= 0:
+            return 0.0, math.inf
+        sty = self.ty - self.t * self.y / self.n
+        syy = self.yy - self.y * self.y / self.n
+        slope = sty / stt
+        residual = max(syy - slope * sty, 0.0) / (self.n - 2)
+        return slope, math.sqrt(residual / stt)
+
+
+class MetricTrend:
+    """The trend of one metric over a run's points"""
+
+    def __init__(self, name: str, worse: str, floor: float, window: int, threshold: float):
+        self.name = name
+        self.worse = worse
+        self.floor = floor
+        self.threshold = threshold
+        self.count = 0
+        self.mean = self.m2 = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.run = Regression()
+        # The first window's mean, then the sliding window over the latest points
+        self.first = Regression()
+        self.window: Deque[Tuple[float, float]] = deque(maxlen=window)
+        self.recent = Regression()
+        self.drifting = False
+        self.drift_points = 0
+        # CUSUM: the baseline being learned, and once learned its mean and noise
+        self.baseline = Regression()
+        self.level: Optional[Tuple[float, float]] = None
+        self.high = self.low = 0.0
+        self.high_steps = self.low_steps = 0
+        self.change_points: Deque[Dict[str, Any]] = deque(maxlen=MAX_EVENTS)
+
+    def _relative(self, change: float, mean: float) -> float:
+        return change / max(abs(mean), self.floor)
+
+    def add(self, t: float, y: float, now: float) -> List[Dict[str, Any]]:
+        """Add a point t seconds into the analysis; returns alerts for drift and change points in the worse direction"""
+        self.count += 1
+        delta = y - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (y - self.mean)
+        self.min = y if self.min is None else min(self.min, y)
+        self.max = y if self.max is None else max(self.max, y)
+        self.run.add(t, y)
+        if self.first.n < self.window.maxlen:
+            self.first.add(t, y)
+        if len(self.window) == self.window.maxlen:
+            self.recent.remove(*self.window[0])
+        self.window.append((t, y))
+        self.recent.add(t, y)
+        return [alert for alert in (self._check_drift(now), self._check_level(y, now)) if alert is not None]
+
+    def _sign(self, direction: str) -> int:
+        return 1 if direction == "up" else -1
+
+    def _check_drift(self, now: float) -> Optional[Dict[str, Any]]:
+        if self.recent.n < max(self.window.maxlen // 2, 3):
+            return None
+        slope, error = self.recent.slope()
+        span = self.window[-1][0] - self.window[0][0]
+        change = self._relative(slope * span, self.recent.mean) * self._sign(self.worse)
+        significant = error == 0 or abs(slope) / error >= DRIFT_T_STAT
+        self.drift_points = self.drift_points + 1 if significant and change >= self.threshold else 0
+        if not self.drifting and self.drift_points >= DRIFT_POINTS:
+            self.drifting = True
+            return {"event": "drift", "time": now, "kind": "slope", "metric": self.name, "direction": self.worse,
+                    "slope_per_hour": round(slope * 3600, 4), "change_pct": round(change * 100, 2),
+                    "window": round(span, 3), "level": round(self.recent.mean, 4)}
+        if self.drifting and change < self.threshold / 2:
+            self.drifting = False
+        return None
+
+    def _check_level(self, y: float, now: float) -> Optional[Dict[str, Any]]:
+        if self.level is None:
+            self.baseline.add(0.0, y)
+            if self.baseline.n >= BASELINE_POINTS:
+                mean = self.baseline.mean
+                variance = max(self.baseline.yy / self.baseline.n - mean * mean, 0.0)
+                noise = max(math.sqrt(variance), MIN_RELATIVE_NOISE * abs(mean), self.floor)
+                self.level = (mean, noise)
+                self.high = self.low = 0.0
+                self.high_steps = self.low_steps = 0
+            return None
+        mean, noise = self.level
+        z = (y - mean) / noise
+        self.high = max(0.0, self.high + z - CUSUM_K)
+        self.high_steps = self.high_steps + 1 if self.high else 0
+        self.low = max(0.0, self.low - z - CUSUM_K)
+        self.low_steps = self.low_steps + 1 if self.low else 0
+        if self.high > CUSUM_H:
+            direction, shift = "up", noise * (CUSUM_K + self.high / self.high_steps)
+        elif self.low > CUSUM_H:
+            direction, shift = "down", -noise * (CUSUM_K + self.low / self.low_steps)
+        else:
+            return None
+        # Learn the new level before looking for the next change
+        self.level = None
+        self.baseline = Regression()
+        # Shifts too small to matter only move the level
+        if abs(self._relative(shift, mean)) < self.threshold:
+            return None
+        change_point = {"time": now, "direction": direction, "before": round(mean, 4), "after": round(mean + shift, 4)}
+        self.change_points.append(change_point)
+        # A level shift in the middle of a drift that was already reported is part of it
+        if direction != self.worse or self.drifting:
+            return None
+        return {"event": "drift", "kind": "change_point", "metric": self.name, **change_point,
+                "change_pct": round(self._relative(shift, mean) * 100, 2)}
+
+    def summary(self, origin: float) -> Dict[str, Any]:
+        slope, _ = self.run.slope()
+        return {
+            "mean": round(self.mean, 4),
+            "stddev": round(math.sqrt(self.m2 / (self.count - 1)), 4) if self.count > 1 else 0.0,
+            "min": round(self.min, 4),
+            "max": round(self.max, 4),
+            "first_window": round(self.first.mean, 4),
+            "last_window": round(self.recent.mean, 4),
+            "change_pct": round(self._relative(self.recent.mean - self.first.mean, self.first.mean) * 100, 2),
+            "slope_per_hour": round(slope * 3600, 4),
+            "drifting": self.drifting,
+            "change_points": [{**point, "time": round(point["time"] - origin, 3)} for point in self.change_points]
+        }
+
+
+class TrendTracker:
+    """The trends of a run's metrics over its stats intervals after the ramp-up"""
+
+    def __init__(self, window: float = DEFAULT_DRIFT_WINDOW, threshold: float = DEFAULT_DRIFT_THRESHOLD,
+                 interval: float = 1.0, exemplars: int = DEFAULT_EXEMPLARS):
+        self.window = window
+        self.threshold = threshold
+        # Exemplars kept per point, and added to the alerts it raises
+        self.exemplars = exemplars
+        # Seconds per point: at least one stats interval
+        self.step = max(window / WINDOW_POINTS, interval)
+        points = max(int(round(window / self.step)), 3)
+        self.metrics = {name: MetricTrend(name, worse, floor, points, threshold) for name, worse, floor in METRICS}
+        self.intervals = 0
+        self.start: Optional[float] = None
+        # The point being summed
+        self.point: Optional[Dict[str, Any]] = None
+        self.alerts: Deque[Dict[str, Any]] = deque(maxlen=MAX_EVENTS)
+
+    @classmethod
+    def from_env(cls, interval: float = 1.0) -> "TrendTracker":
+        return cls(_env_float("LOCUST_MCP_DRIFT_WINDOW", DEFAULT_DRIFT_WINDOW),
+                   _env_float("LOCUST_MCP_DRIFT_THRESHOLD", DEFAULT_DRIFT_THRESHOLD), interval, exemplar_count())
+
+    def add(self, interval: Dict[str, Any], after: Optional[float]) -> List[Dict[str, Any]]:
+        """
+        Add a "stats" event, if it starts no earlier than after, the end of the ramp-up;
+        returns the "drift" events it raised
+        """
+        if after is None or interval["start"] < after - WINDOW_SLACK:
+            return []
+        if self.start is None:
+            self.start = interval["start"]
+        self.intervals += 1
+        if self.point is None:
+            self.point = {"start": interval["start"], "time": interval["start"], "requests": 0, "failures": 0,
+                          "total_response_time": 0.0, "response_times": {}, "exemplars": []}
+        point = self.point
+        _add_interval(point, interval, self.exemplars)
+        if point["time"] - point["start"] < self.step - WINDOW_SLACK:
+            return []
+        # A run's last, partial point is left out
+        self.point = None
+        t = point["time"] - self.start
+        alerts = []
+        for name, value in point_metrics(point).items():
+            alerts.extend(self.metrics[name].add(t, value, point["time"]))
+        if point["exemplars"]:
+            for alert in alerts:
+                alert["exemplars"] = point["exemplars"]
+        self.alerts.extend(alerts)
+        return alerts
+
+    def summary(self, origin: Optional[float] = None) -> Dict[str, Any]:
+        """Per metric, its distribution, drift and change points, and the alerts raised; times in seconds since origin"""
+        if origin is None:
+            origin = self.start or 0.0
+        return {
+            "intervals": self.intervals,
+            "window": self.window,
+            "step": self.step,
+            "metrics": {name: trend.summary(origin) for name, trend in self.metrics.items() if trend.count},
+            "alerts": [{**{key: value for key, value in alert.items() if key != "event"},
+                        "time": round(alert["time"] - origin, 3)} for alert in self.alerts]
+        }
@@ -0,0 +1,183 @@
+import logging
+from typing import Dict, Any, List, Optional, Sequence
+
+from locust_mcp.locust_generator import parse_run_time
+
+logger = logging.getLogger(__name__)
+
+# Stats intervals per batch for steady-state detection (MSER-5)
+MSER_BATCH_SIZE = 5
+# Fewer batches than this are too few to tell a transient from noise
+MSER_MIN_BATCHES = 4
+# Interval boundaries are sampled, so allow for a little clock slack when matching windows
+WINDOW_SLACK = 0.05
+
+
+def percentile(response_times: Dict[Any, int], total: int, percent: float) -> float:
+    """Percentile from a Locust response time histogram ({rounded ms: count})."""
+    if not total:
+        return 0
+    threshold = total * percent
+    seen = 0
+    for value, count in sorted((float(k), v) for k, v in response_times.items()):
+        seen += count
+        if seen >= threshold:
+            return value
+    return 0
+
+
+def _duration(value: Any) -> float:
+    """Seconds from a number or a run time string such as "30s" or "1m30s"."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    return float(parse_run_time(str(value)))
+
+
+def merge_intervals(intervals: Sequence[Dict[str, Any]], exemplars: int = 0) -> List[Dict[str, Any]]:
+    """
+    Sum the per-entry deltas of stats intervals into entries shaped like Locust's --json
+    output. Entries keep up to exemplars of the slowest exemplars of their intervals.
+    """
+    merged: Dict[tuple, Dict[str, Any]] = {}
+    found: Dict[tuple, List[Dict[str, Any]]] = {}
+    for interval in intervals:
+        for delta in interval["entries"]:
+            entry = merged.setdefault((delta["name"], delta["method"]), {
+                "name": delta["name"],
+                "method": delta["method"],
+                "num_requests": 0,
+                "num_failures": 0,
+                "total_response_time": 0,
+                "response_times": {}
+            })
+            entry["num_requests"] += delta["num_requests"]
+            entry["num_failures"] += delta["num_failures"]
+            entry["total_response_time"] += delta["total_response_time"]
+            response_times = entry["response_times"]
+            for value, count in delta["response_times"].items():
+                response_times[value] = response_times.get(value, 0) + count
+            if exemplars and delta.get("exemplars"):
+                found.setdefault((delta["name"], delta["method"]), []).extend(delta["exemplars"])
+
+    duration = sum(interval["time"] - interval["start"] for interval in intervals)
+    for entry in merged.values():
+        response_times = {key: count for key, count in entry["response_times"].items() if count}
+        entry["response_times"] = response_times
+        values = [float(key) for key in response_times]
+        entry["min_response_time"] = min(values) if values else None
+        entry["max_response_time"] = max(values) if values else 0
+        entry["avg_response_time"] = (
+            entry["total_response_time"] / entry["num_requests"] if entry["num_requests"] else 0
+        )
+        entry["requests_per_sec"] = entry["num_requests"] / duration if duration else 0
+        entry["failures_per_sec"] = entry["num_failures"] / duration if duration else 0
+    for key, entry_exemplars in found.items():
+        entry_exemplars.sort(key=lambda exemplar: exemplar["response_time"], reverse=True)
+        merged[key]["exemplars"] = entry_exemplars[:exemplars]
+    return list(merged.values())
+
+
+def _interval_series(intervals: Sequence[Dict[str, Any]]):
+    """Throughput and mean response time of each stats interval"""
+    throughput, latency = [], []
+    for interval in intervals:
+        requests = sum(delta["num_requests"] for delta in interval["entries"])
+        total_time = sum(delta["total_response_time"] for delta in interval["entries"])
+        elapsed = interval["time"] - interval["start"]
+        throughput.append(requests / elapsed if elapsed > 0 else 0)
+        latency.append(total_time / requests if requests else 0)
+    return throughput, latency
+
+
+def mser_truncation(series: Sequence[float], batch_size: int = MSER_BATCH_SIZE) -> Optional[int]:
+    """
+    Number of leading observations to drop as warm-up, by the MSER-5 rule: batch the series
+    and pick the truncation point, within the first half, that minimizes the squared standard
+    error of the mean of what remains. Returns None when the series is too short to judge.
+    """
+    batches = [
+        sum(series[i:i + batch_size]) / batch_size
+        for i in range(0, len(series) - batch_size + 1, batch_size)
+    ]
+    if len(batches) < MSER_MIN_BATCHES:
+        return None
+
+    best, best_batches = None, 0
+    for dropped in range(len(batches) // 2 + 1):
+        remaining = batches[dropped:]
+        mean = sum(remaining) / len(remaining)
+        score = sum((value - mean) ** 2 for value in remaining) / len(remaining) ** 2
+        if best is None or score < best:
+            best, best_batches = score, dropped
+    return best_batches * batch_size
+
+
+def detect_steady_state(intervals: Sequence[Dict[str, Any]], after: float) -> Optional[float]:
+    """
+    Time at which a run reached steady state: the later of the MSER-5 truncation points of
+    its throughput and mean response time series, considering only intervals from after on.
+    """
+    candidates = [interval for interval in intervals if interval["start"] >= after - WINDOW_SLACK]
+    throughput, latency = _interval_series(candidates)
+    cuts = [mser_truncation(throughput), mser_truncation(latency)]
+    if None in cuts:
+        return None
+    cut = max(cuts)
+    return candidates[cut]["start"] if cut < len(candidates) else None
+
+
+def apply_window(result: Dict[str, Any], marks: Dict[str, float], intervals: Sequence[Dict[str, Any]],
+                 config: Dict[str, Any], exemplars: int = 0) -> Dict[str, Any]:
+    """
+    Replace a run's statistics with those of its measurement window when the config asks for
+    one, keeping the whole-run numbers in full_statistics. The window starts after "warmup"
+    (seconds or a duration like "30s", or "ramp" for the end of the ramp-up) and, with
+    "steady_state", no earlier than the detected steady state; it ends "cooldown" before the
+    run stopped. The window's entries keep up to exemplars of their slowest exemplars.
+    """
+    warmup = config.get("warmup")
+    cooldown = config.get("cooldown")
+    steady_state = config.get("steady_state")
+    if not (warmup or cooldown or steady_state) or not result.get("statistics"):
+        return result
+    if not intervals:
+        result["window"] = {"error": "No interval stats were reported for this run; statistics cover the whole run"}
+        return result
+
+    origin = marks.get("requested", intervals[0]["start"])
+    started = marks.get("started", intervals[0]["start"])
+    stopped = marks.get("stopped", intervals[-1]["time"])
+    start = started
+    source = []
+    if warmup == "ramp":
+        start = marks.get("ramp_complete", started)
+        source.append("ramp")
+    elif warmup:
+        start = started + _duration(warmup)
+        source.append("warmup")
+    if steady_state:
+        detected = detect_steady_state(intervals, max(start, marks.get("ramp_complete", started)))
+        if detected is None:
+            logger.warning("Could not detect a steady state; using the configured warm-up only")
+        elif detected > start:
+            start = detected
+            source.append("steady_state")
+    end = stopped - _duration(cooldown) if cooldown else stopped
+
+    selected = [
+        interval for interval in intervals
+        if interval["start"] >= start - WINDOW_SLACK and interval["time"] <= end + WINDOW_SLACK
+    ]
+    if not selected:
+        result["window"] = {"error": "The measurement window contains no requests; statistics cover the whole run"}
+        return result
+
+    result["full_statistics"] = result["statistics"]
+    result["statistics"] = merge_intervals(selected, exemplars)
+    result["window"] = {
+        "start": round(selected[0]["start"] - origin, 4),
+        "end": round(selected[-1]["time"] - origin, 4),
+        "intervals": len(selected),
+        "source": source or ["cooldown"]
+    }
+    return result
@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+import uuid
+from typing import Callable, Dict, Any, Optional, Set
+
+from locust_mcp.cpu_affinity import CoreAllocator
+from locust_mcp.library_runner import build_result, exchange
+from locust_mcp.locust_worker import worker_main
+from locust_mcp.script_cache import validate_script
+from locust_mcp.test_runner import prepare_data_file, remove_data_cursor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 2
+DEFAULT_MAX_RUNS_PER_WORKER = 20
+WORKER_EXIT_TIMEOUT = 5
+# Starts of a pool worker before its slot is given up, with the delay doubling from SPAWN_RETRY_DELAY seconds
+SPAWN_ATTEMPTS = 3
+SPAWN_RETRY_DELAY = 1.0
+
+
+class _PoolWorker:
+    """A pre-imported Locust worker process and the pipe used to talk to it"""
+
+    def __init__(self, context, max_runs: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=worker_main, args=(child_conn, max_runs), daemon=True)
+        self.process.start()
+        # The child has its own copy of its end of the pipe
+        child_conn.close()
+        self.runs = 0
+        self.started_at = time.time()
+        self.ready_at: Optional[float] = None
+
+    def wait_ready(self) -> bool:
+        """Blocking: wait for the worker to finish importing Locust"""
+        try:
+            message = self.conn.recv()
+        except (EOFError, OSError):
+            return False
+        self.ready_at = message.get("time")
+        return message.get("type") == "ready"
+
+    def shutdown(self):
+        try:
+            self.conn.send({"type": "exit"})
+        except OSError:
+            pass
+        self.process.join(WORKER_EXIT_TIMEOUT)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+
+class LocustWorkerPool:
+    """
+    Pool of pre-warmed Locust worker processes for fast run startup.
+
+    Each worker has already paid for interpreter startup, gevent monkey-patching and the
+    locust/requests imports, so a run starts generating load as soon as it is handed over.
+    Workers are recycled after max_runs_per_worker runs to bound leaks between runs.
+    Runs beyond the pool size wait for a worker to become free. A worker that fails to
+    start is retried a few times; once no worker is left or starting, waiting runs fail,
+    and the next run tries to start the pool's workers again.
+    """
+
+    def __init__(self, size: int = DEFAULT_POOL_SIZE, max_runs_per_worker: int = DEFAULT_MAX_RUNS_PER_WORKER,
+                 cpu_allocator: Optional[CoreAllocator] = None):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.size = size
+        self.max_runs_per_worker = max_runs_per_worker
+        # Pins a worker to its own core for each run when given
+        self._cpu_allocator = cpu_allocator
+        self._context = multiprocessing.get_context("spawn")
+        self._idle: Optional[asyncio.Queue] = None
+        # Workers alive or starting; each spawn that gives up sets _lost to wake waiting runs
+        self._workers = 0
+        self._lost: Optional[asyncio.Event] = None
+        self._active: Dict[str, _PoolWorker] = {}
+        # Shutdowns of used-up workers in progress, awaited by close()
+        self._shutdowns: Set[asyncio.Future] = set()
+        self._closed = False
+
+    @property
+    def idle_workers(self) -> int:
+        return self._idle.qsize() if self._idle is not None else 0
+
+    async def start(self):
+        """Start the missing workers; they become available as soon as each one is ready."""
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            self._lost = asyncio.Event()
+        while self._workers < self.size and not self._closed:
+            self._workers += 1
+            asyncio.create_task(self._spawn())
+
+    def _give_up_slot(self):
+        self._workers -= 1
+        # Waiting runs wake up and check whether any worker is left
+        self._lost.set()
+        self._lost = asyncio.Event()
+
+    async def _spawn(self):
+        loop = asyncio.get_running_loop()
+        for attempt in range(SPAWN_ATTEMPTS):
+            if attempt:
+                await asyncio.sleep(SPAWN_RETRY_DELAY * 2 ** (attempt - 1))
+            try:
+                worker = _PoolWorker(self._context, self.max_runs_per_worker)
+                ready = await loop.run_in_executor(None, worker.wait_ready)
+            except OSError as e:
+                logger.error(f"Could not start a Locust pool worker: {e}")
+                continue
+            if not ready:
+                logger.error(f"Locust pool worker failed to start (attempt {attempt + 1} of {SPAWN_ATTEMPTS})")
+                await loop.run_in_executor(None, worker.shutdown)
+                continue
+            if self._closed:
+                await loop.run_in_executor(None, worker.shutdown)
+                self._give_up_slot()
+                return
+            logger.debug(f"Locust pool worker {worker.process.pid} ready in {worker.ready_at - worker.started_at:.2f}s")
+            await self._idle.put(worker)
+            return
+        logger.error(f"Giving up on a Locust pool worker; {self._workers - 1} of {self.size} left")
+        self._give_up_slot()
+
+    async def _acquire(self) -> Optional[_PoolWorker]:
+        """Wait for an idle worker; None once no worker is left or starting"""
+        while self._workers > 0:
+            getter = asyncio.ensure_future(self._idle.get())
+            lost = asyncio.ensure_future(self._lost.wait())
+            try:
+                await asyncio.wait({getter, lost}, return_when=asyncio.FIRST_COMPLETED)
+            except asyncio.CancelledError:
+                lost.cancel()
+                getter.cancel()
+                if getter.done() and not getter.cancelled():
+                    self._idle.put_nowait(getter.result())
+                raise
+            lost.cancel()
+            if getter.done():
+                return getter.result()
+            # A cancelled get leaves the queue's items in place
+            getter.cancel()
+        return None
+
+    async def _release(self, worker: _PoolWorker):
+        """Return a worker to the pool, replacing it if it is used up or dead"""
+        if self._closed:
+            await asyncio.get_running_loop().run_in_executor(None, worker.shutdown)
+            self._give_up_slot()
+        elif worker.runs >= self.max_runs_per_worker or not worker.process.is_alive():
+            # Not awaited, so the run's result isn't held up by the worker's exit
+            shutdown = asyncio.get_running_loop().run_in_executor(None, worker.shutdown)
+            self._shutdowns.add(shutdown)
+            shutdown.add_done_callback(self._shutdown_done)
+            asyncio.create_task(self._spawn())
+        else:
+            await self._idle.put(worker)
+
+    def _shutdown_done(self, shutdown: asyncio.Future):
+        self._shutdowns.discard(shutdown)
+        if not shutdown.cancelled() and shutdown.exception() is not None:
+            logger.error(f"Could not shut down a Locust pool worker: {shutdown.exception()}")
+
+    async def run(self, params: Dict[str, Any],
+                  listener: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Run a Locust test on a pre-warmed worker, waiting for one to be free if necessary, and
+        pass the run's hook events to listener.
+        """
+        script = params.get("script", "")
+        config = params.get("config", {})
+
+        if not script:
+            return {"error": "No test script provided"}
+        try:
+            validate_script(script)
+        except ValueError as e:
+            return {"success": False, "statistics": None, "error": str(e)}
+
+        await self.start()
+        marks = {"requested": time.time()}
+        run_id = params.get("run_id") or uuid.uuid4().hex
+        try:
+            index_path = await prepare_data_file(config)
+        except (OSError, ValueError) as e:
+            return {"success": False, "statistics": None, "error": f"Data file error: {e}"}
+
+        try:
+            worker = await self._acquire()
+        except asyncio.CancelledError:
+            remove_data_cursor(index_path, run_id)
+            raise
+        if worker is None:
+            remove_data_cursor(index_path, run_id)
+            return {"success": False, "statistics": None, "error": "No Locust pool worker could be started"}
+        marks["acquired"] = time.time()
+        self._active[run_id] = worker
+        # Workers outlive their runs, so they are pinned with affinity masks, not cpusets
+        lease = self._cpu_allocator.acquire(1) if self._cpu_allocator else None
+        if lease is not None:
+            lease.apply(worker.process.pid)
+        try:
+            worker.runs += 1
+            job = {"type": "run", "run_id": run_id, "script": script, "config": config, "stream": listener is not None}
+            message = await asyncio.get_running_loop().run_in_executor(None, exchange, worker.conn, job, listener)
+            result = build_result(message, marks, config, self._cpu_allocator, lease, worker.process.pid)
+            result["timing"]["pooled"] = True
+            return result
+        finally:
+            self._active.pop(run_id, None)
+            remove_data_cursor(index_path, run_id)
+            if lease is not None:
+                lease.release()
+            await self._release(worker)
+
+    async def stop(self, run_id: Optional[str] = None) -> Dict[str, Any]:
+        """Ask the busy workers, or only run_id's, to stop their runs; the workers stay in the pool."""
+        stopped = 0
+        for key, worker in list(self._active.items()):
+            if run_id is not None and key != run_id:
+                continue
+            try:
+                worker.conn.send({"type": "stop"})
+                stopped += 1
+            except OSError:
+                pass
+        return {
+            "success": True,
+            "stopped": stopped,
+            "message": f"Stop requested for {stopped} pooled run(s)"
+        }
+
+    async def close(self):
+        """
+        Shut down idle workers and wait for used-up ones to exit; busy ones are shut down
+        when their run finishes.
+        """
+        self._closed = True
+        if self._idle is None:
+            return
+        loop = asyncio.get_running_loop()
+        while not self._idle.empty():
+            await loop.run_in_executor(None, self._idle.get_nowait().shutdown)
+            self._give_up_slot()
+        if self._shutdowns:
+            await asyncio.wait(list(self._shutdowns))
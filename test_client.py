@@ -72,19 +72,13 @@ async def generate_test(test_case: dict, generator: LocustScriptGenerator, times
     test_file_path = os.path.join(test_dir, test_file_name)
     config_file_path = os.path.join(test_dir, "config.json")
 
-    # Generate test script
-    script = generator.generate_from_curl(
-        test_case['curl_command'],
-        users=test_case['users'],
-        run_time=test_case['duration']
-    )
-    
-    # Get config
+    # Parse the curl command once and generate the script from the parsed config
     config = generator._parse_curl_command(
         test_case['curl_command'],
         users=test_case['users'],
         run_time=test_case['duration']
     )
+    script = generator.generate_from_config(config)
     
     # Save test script
     with open(test_file_path, 'w') as f:
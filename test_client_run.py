@@ -1,66 +1,61 @@
+import argparse
 import asyncio
-import websockets
-import json
 import logging
 
+from locust_mcp.client import AsyncMCPClient, MCPError
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def run_load_test():
-    """Run a load test using the MCP server"""
-    uri = "ws://localhost:8124/mcp"
+DEFAULT_PROMPT = "Test the API at https://jsonplaceholder.typicode.com/posts with 50 users for 2 minutes"
+
+
+async def run_one(client: AsyncMCPClient, prompt: str):
+    """Generate a test from a prompt, run it with live stats, and print its results"""
+    test = await client.generate(prompt)
+    test_id = test["test_id"]
+    logger.info(f"Generated test with ID: {test_id}")
+    logger.info(f"Test script:\n{test['script']}")
+
+    logger.info(f"Starting load test {test_id}...")
+    stream = await client.stream_run(test_id)
+    async for event in stream:
+        if event.get("event") == "stats":
+            requests = sum(entry["num_requests"] for entry in event["entries"])
+            failures = sum(entry["num_failures"] for entry in event["entries"])
+            logger.info(f"[{test_id}] {requests / max(event['time'] - event['start'], 1e-9):.1f} req/s, {failures} failures")
+        else:
+            logger.info(f"[{test_id}] {event.get('event')}")
+    result = await stream.result()
+
+    # Print test results
+    stats = result.get("statistics") or []
+    if stats:
+        latest_stats = stats[-1]
+        print(f"\nTest Results ({test_id}):")
+        print(f"Total Requests: {latest_stats.get('num_requests', 0)}")
+        print(f"Failed Requests: {latest_stats.get('num_failures', 0)}")
+        print(f"Average Response Time: {latest_stats.get('avg_response_time', 0):.2f} ms")
+        print(f"Requests/sec: {latest_stats.get('current_rps', 0):.2f}")
+        print(f"Failure Rate: {latest_stats.get('failure_rate', 0):.2f}%")
+
+
+async def run_load_tests(uri: str, prompts):
+    """Generate and run one test per prompt, all at once over one connection"""
     logger.info(f"Connecting to MCP server at {uri}")
+    async with AsyncMCPClient(uri) as client:
+        outcomes = await asyncio.gather(*(run_one(client, prompt) for prompt in prompts), return_exceptions=True)
+    for prompt, outcome in zip(prompts, outcomes):
+        if isinstance(outcome, (MCPError, ConnectionError)):
+            logger.error(f"Error for prompt {prompt!r}: {outcome}")
+        elif isinstance(outcome, Exception):
+            raise outcome
 
-    async with websockets.connect(uri) as websocket:
-        # Generate test configuration
-        test_config = {
-            "command": "generate",
-            "params": {
-                "prompt": "Test the API at https://jsonplaceholder.typicode.com/posts with 50 users for 2 minutes"
-            }
-        }
-
-        logger.info("Sending test generation request...")
-        await websocket.send(json.dumps(test_config))
-        response = await websocket.recv()
-        result = json.loads(response)
-
-        if "error" in result and result["error"]:
-            logger.error(f"Error generating test: {result['error']}")
-            return
-
-        test_id = result["result"]["test_id"]
-        logger.info(f"Generated test with ID: {test_id}")
-        logger.info(f"Test script:\n{result['result']['script']}")
-
-        # Run the test
-        run_config = {
-            "command": "run",
-            "params": {
-                "test_id": test_id
-            }
-        }
-
-        logger.info("Starting load test...")
-        await websocket.send(json.dumps(run_config))
-        response = await websocket.recv()
-        result = json.loads(response)
-
-        if "error" in result and result["error"]:
-            logger.error(f"Error running test: {result['error']}")
-            return
-
-        # Print test results
-        stats = result.get("result", {}).get("statistics", [])
-        if stats and len(stats) > 0:
-            latest_stats = stats[-1]
-            print("\nTest Results:")
-            print(f"Total Requests: {latest_stats.get('num_requests', 0)}")
-            print(f"Failed Requests: {latest_stats.get('num_failures', 0)}")
-            print(f"Average Response Time: {latest_stats.get('avg_response_time', 0):.2f} ms")
-            print(f"Requests/sec: {latest_stats.get('current_rps', 0):.2f}")
-            print(f"Failure Rate: {latest_stats.get('failure_rate', 0):.2f}%")
 
 if __name__ == "__main__":
-    asyncio.run(run_load_test())
+    parser = argparse.ArgumentParser(description="Generate and run load tests through the MCP server")
+    parser.add_argument("prompts", nargs="*", default=[DEFAULT_PROMPT])
+    parser.add_argument("--uri", default="ws://localhost:8000/mcp")
+    args = parser.parse_args()
+    asyncio.run(run_load_tests(args.uri, args.prompts))
@@ -0,0 +1,87 @@
+import os
+from array import array
+
+import pytest
+
+from locust_mcp import data_feeder
+from locust_mcp.data_feeder import DataFeeder, RUN_ID_ENV, build_index
+from locust_mcp.test_runner import remove_data_cursor
+
+
+@pytest.fixture(autouse=True)
+def index_dir(tmp_path, monkeypatch):
+    directory = tmp_path / "indexes"
+    monkeypatch.setattr(data_feeder, "INDEX_DIR", str(directory))
+    monkeypatch.delenv(RUN_ID_ENV, raising=False)
+    return directory
+
+
+def write(path, text):
+    path.write_bytes(text.encode())
+    return str(path)
+
+
+def read_index(index_path):
+    offsets = array("Q")
+    with open(index_path, "rb") as f:
+        offsets.frombytes(f.read())
+    return list(offsets)
+
+
+def test_csv_index_skips_the_header_and_blank_lines(tmp_path):
+    path = write(tmp_path / "users.csv", "name,id\nalice,1\n\nbob,2\n")
+
+    # Row starts, then the end of the last row
+    assert read_index(build_index(path)) == [8, 17, 23]
+
+
+def test_index_is_reused_until_the_file_changes(tmp_path):
+    path = write(tmp_path / "rows.jsonl", '{"id": 1}\n')
+    index_path = build_index(path)
+    assert build_index(path) == index_path
+
+    write(tmp_path / "rows.jsonl", '{"id": 1}\n{"id": 2}\n')
+    assert build_index(path) != index_path
+
+
+def test_rows_are_read_through_the_index(tmp_path):
+    feeder = DataFeeder(write(tmp_path / "users.csv", "name,id\r\nalice,1\r\n\"b,ob\",2\r\n"))
+    assert feeder.rows == 2
+    assert feeder.row(1) == {"name": "b,ob", "id": "2"}
+
+    feeder = DataFeeder(write(tmp_path / "rows.jsonl", '{"id": 1}\n\n{"id": 2}'))
+    assert [feeder.row(number) for number in range(feeder.rows)] == [{"id": 1}, {"id": 2}]
+
+
+def test_sequential_rows_wrap_around(tmp_path):
+    feeder = DataFeeder(write(tmp_path / "rows.jsonl", '{"id": 1}\n{"id": 2}\n'))
+    assert [feeder.next_row()["id"] for _ in range(5)] == [1, 2, 1, 2, 1]
+
+
+def test_empty_file_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        DataFeeder(write(tmp_path / "empty.csv", "name,id\n"))
+
+
+@pytest.mark.skipif(data_feeder.fcntl is None, reason="Shared cursors need file locks")
+def test_feeders_of_one_run_share_a_cursor(tmp_path, monkeypatch):
+    path = write(tmp_path / "rows.jsonl", "".join(f'{{"id": {i}}}\n' for i in range(4)))
+    monkeypatch.setenv(RUN_ID_ENV, "run1")
+    first, second = DataFeeder(path), DataFeeder(path, mode="unique")
+
+    assert [first.next_row()["id"], second.next_row()["id"], first.next_row()["id"]] == [0, 1, 2]
+
+    cursor = f"{build_index(path)}.run1.cursor"
+    assert os.path.exists(cursor)
+    remove_data_cursor(build_index(path), "run1")
+    assert not os.path.exists(cursor)
+
+    # Another run starts from the first row
+    monkeypatch.setenv(RUN_ID_ENV, "run2")
+    assert DataFeeder(path).next_row()["id"] == 0
+
+
+def test_random_rows_follow_the_seed(tmp_path):
+    path = write(tmp_path / "rows.jsonl", "".join(f'{{"id": {i}}}\n' for i in range(50)))
+    first, second = DataFeeder(path, mode="random", seed=7), DataFeeder(path, mode="random", seed=7)
+    assert [first.next_row()["id"] for _ in range(10)] == [second.next_row()["id"] for _ in range(10)]
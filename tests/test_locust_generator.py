@@ -0,0 +1,66 @@
+import ast
+
+import pytest
+
+from locust_mcp.locust_generator import LocustScriptGenerator
+
+CASES = [
+    {"curl_command": "curl 'https://a.example.com/x' -b 'sid=1'", "users": 3, "duration": "1m"},
+    {"curl_command": "curl 'https://a.example.com/y' -b 'sid=2'", "users": 1},
+    {"curl_command": "curl -X POST 'https://b.example.com/z' -d 'k=1'", "sr_no": "9"},
+]
+
+
+def classes(script):
+    """User classes of a script by name: their attributes and the request call of each task"""
+    found = {}
+    for node in ast.parse(script).body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+        attributes = {target.id: statement.value for statement in node.body if isinstance(statement, ast.Assign)
+                      for target in statement.targets}
+        tasks = {statement.name: next(call for call in ast.walk(statement)
+                                      if isinstance(call, ast.Call) and isinstance(call.func, ast.Attribute)
+                                      and call.func.attr in ("get", "post"))
+                 for statement in node.body if isinstance(statement, ast.FunctionDef)}
+        found[node.name] = {"attributes": attributes, "tasks": tasks}
+    return found
+
+
+def keyword(call, name):
+    value = next((keyword.value for keyword in call.keywords if keyword.arg == name), None)
+    return ast.literal_eval(value) if value is not None else None
+
+
+def test_mixed_script_has_one_user_class_per_host():
+    script, config = LocustScriptGenerator().generate_mixed(CASES)
+    users = classes(script)
+
+    assert sorted(users) == ["HostUser1", "HostUser2"]
+    assert ast.literal_eval(users["HostUser1"]["attributes"]["host"]) == "https://a.example.com"
+    assert ast.literal_eval(users["HostUser1"]["attributes"]["weight"]) == 4
+    assert sorted(users["HostUser1"]["tasks"]) == ["row_1", "row_2"]
+    assert keyword(users["HostUser2"]["tasks"]["row_3"], "name") == "[row 9] /z"
+
+    assert config["host"] is None
+    assert config["users"] == 5
+    assert config["run_time"] == "1m"
+    assert [(row["sr_no"], row["method"], row["weight"]) for row in config["rows"]] == [
+        ("1", "GET", 3), ("2", "GET", 1), ("9", "POST", 1)
+    ]
+
+
+def test_mixed_script_sends_each_rows_cookies_with_its_own_requests():
+    script, _ = LocustScriptGenerator().generate_mixed(CASES)
+    users = classes(script)
+
+    # No session-wide cookies shared by the rows of a host
+    assert all("on_start" not in user["tasks"] for user in users.values())
+    assert keyword(users["HostUser1"]["tasks"]["row_1"], "cookies") == {"sid": "1"}
+    assert keyword(users["HostUser1"]["tasks"]["row_2"], "cookies") == {"sid": "2"}
+    assert keyword(users["HostUser2"]["tasks"]["row_3"], "cookies") is None
+
+
+def test_mixed_script_needs_cases():
+    with pytest.raises(ValueError):
+        LocustScriptGenerator().generate_mixed([])
@@ -0,0 +1,116 @@
+import asyncio
+import json
+
+from locust_mcp.run_broadcast import LiveRun, Subscriber, coalesce_stats
+
+
+def stats_event(start, requests=2, name="/"):
+    return {"event": "stats", "start": start, "time": start + 1, "entries": [{
+        "name": name, "method": "GET", "num_requests": requests, "num_failures": 0,
+        "total_response_time": 10 * requests, "response_times": {10: requests}
+    }]}
+
+
+class Connection:
+    """A subscriber's connection that only sends once opened"""
+
+    def __init__(self):
+        self.sent = []
+        self.open = asyncio.Event()
+
+    async def send(self, text):
+        await self.open.wait()
+        self.sent.append(json.loads(text))
+
+    async def flush(self):
+        self.open.set()
+        for _ in range(10):
+            await asyncio.sleep(0)
+
+    def kinds(self):
+        return [message.get("event", message["type"]) for message in self.sent]
+
+
+def run(coroutine):
+    return asyncio.run(coroutine())
+
+
+def test_coalesced_stats_keep_every_request():
+    earlier, later = stats_event(0, 2), stats_event(1, 3)
+    later["entries"].append(stats_event(1, 1, "/other")["entries"][0])
+    merged = coalesce_stats(earlier, later)
+
+    assert merged["start"] == 0 and merged["time"] == 2
+    by_name = {entry["name"]: entry for entry in merged["entries"]}
+    assert by_name["/"]["num_requests"] == 5
+    assert by_name["/"]["response_times"] == {10: 5}
+    assert by_name["/other"]["num_requests"] == 1
+    # The inputs are shared with other subscribers and stay as they were
+    assert earlier["entries"][0]["num_requests"] == 2 and earlier["entries"][0]["response_times"] == {10: 2}
+
+
+def test_full_queue_coalesces_stats_updates():
+    async def scenario():
+        connection = Connection()
+        live_run = LiveRun("run", {}, queue_size=4)
+        live_run.subscribe("client", connection.send)
+        for second in range(10):
+            live_run.publish(stats_event(second))
+        live_run.publish({"event": "drift", "time": 10})
+        await connection.flush()
+        return connection, live_run
+
+    connection, live_run = run(scenario)
+    assert connection.kinds()[0] == "snapshot"
+    assert connection.kinds()[-1] == "drift"
+    stats = [message for message in connection.sent if message.get("event") == "stats"]
+    assert len(stats) < 10
+    assert sum(entry["num_requests"] for message in stats for entry in message["entries"]) == 20
+    assert stats[-1]["totals"]["num_requests"] == 20
+    assert "client" in live_run.subscribers
+
+
+def test_snapshot_and_result_are_never_evicted():
+    async def scenario():
+        connection = Connection()
+        subscriber = Subscriber(connection.send, queue_size=2)
+        assert subscriber.put("{\"type\": \"snapshot\"}", essential=True)
+        assert subscriber.put("{\"type\": \"event\", \"event\": \"ramp_complete\"}")
+        assert subscriber.put("{\"type\": \"event\", \"event\": \"result\"}", essential=True)
+        subscriber.close()
+        await connection.flush()
+        return connection
+
+    assert run(scenario).kinds() == ["snapshot", "ramp_complete", "result"]
+
+
+def test_subscriber_full_of_other_events_is_ended():
+    async def scenario():
+        connection = Connection()
+        live_run = LiveRun("run", {}, queue_size=3)
+        live_run.subscribe("client", connection.send)
+        for second in range(5):
+            live_run.publish({"event": "drift", "time": second})
+        ended = "client" not in live_run.subscribers
+        live_run.finish({"success": True})
+        await connection.flush()
+        return connection, ended
+
+    connection, ended = run(scenario)
+    assert ended
+    assert connection.kinds() == ["unsubscribed"]
+    assert connection.sent[0]["runId"] == "run"
+
+
+def test_result_reaches_a_subscriber_with_a_full_queue():
+    async def scenario():
+        connection = Connection()
+        live_run = LiveRun("run", {}, queue_size=3)
+        live_run.subscribe("client", connection.send)
+        live_run.publish({"event": "drift", "time": 0})
+        live_run.publish({"event": "drift", "time": 1})
+        live_run.finish({"success": True})
+        await connection.flush()
+        return connection
+
+    assert run(scenario).kinds() == ["snapshot", "drift", "drift", "result"]
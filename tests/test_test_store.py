@@ -0,0 +1,91 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from locust_mcp import test_store
+from locust_mcp.retention import RetentionPolicy
+
+SCRIPT = "from locust import HttpUser\n"
+
+
+@pytest.fixture
+def store_dirs(tmp_path, monkeypatch):
+    # The store keeps its tests under the working directory
+    monkeypatch.chdir(tmp_path)
+    return tmp_path / "tests" / "generated", tmp_path / "cache"
+
+
+def new_store(cache_dir, **kwargs):
+    return test_store.TestStore(base_dir=str(cache_dir), **kwargs)
+
+
+def test_legacy_history_is_migrated_to_jsonl(store_dirs):
+    tests_dir, cache_dir = store_dirs
+    tests_dir.mkdir(parents=True)
+    legacy = [{"id": "20240101_000000", "timestamp": "2024-01-01T00:00:00", "config": {}}]
+    (tests_dir / "history.json").write_text(json.dumps(legacy))
+
+    store = new_store(cache_dir)
+    assert store.list_tests() == legacy
+    store.save_test(SCRIPT, {"host": "http://example.com"})
+
+    assert not (tests_dir / "history.json").exists()
+    lines = (tests_dir / "history.jsonl").read_text().splitlines()
+    assert len(lines) == 2 and json.loads(lines[0])["id"] == "20240101_000000"
+    assert [test["id"] for test in new_store(cache_dir).list_tests()] == [json.loads(line)["id"] for line in lines]
+
+
+def test_truncated_history_line_is_skipped_and_rewritten(store_dirs):
+    tests_dir, cache_dir = store_dirs
+    store = new_store(cache_dir)
+    saved = store.save_test(SCRIPT, {})
+    with open(tests_dir / "history.jsonl", "a") as f:
+        f.write('{"id": "cut sh')
+
+    store = new_store(cache_dir)
+    assert [test["id"] for test in store.list_tests()] == [saved["id"]]
+    store.save_test(SCRIPT, {})
+    for line in (tests_dir / "history.jsonl").read_text().splitlines():
+        json.loads(line)
+
+
+def test_compaction_archives_old_tests_and_keeps_them_readable(store_dirs):
+    tests_dir, cache_dir = store_dirs
+    store = new_store(cache_dir)
+    old = store.save_test(SCRIPT, {"host": "http://old.example.com"})
+    new = store.save_test(SCRIPT + "# new\n", {"host": "http://new.example.com"})
+    store.save_run(old["id"], {"success": True}, "run1")
+
+    summary = store.compact(RetentionPolicy(max_count=1), now=datetime.now() + timedelta(seconds=1))
+
+    assert summary["archived_tests"] == 1
+    assert summary["archived_runs"] == 1
+    assert summary["live_tests"] == 1
+    assert not (tests_dir / old["id"]).exists()
+    assert (tests_dir / new["id"]).exists()
+    archived = store.get_test(old["id"])
+    assert archived["archived"] and archived["script"] == SCRIPT
+    assert store.get_runs(old["id"]) == {"run1": {"success": True}}
+
+    # The history marks the test archived, for this store and a new one
+    reloaded = {test["id"]: test for test in new_store(cache_dir).list_tests()}
+    assert reloaded[old["id"]]["archived"] and reloaded[old["id"]]["script_path"] is None
+    assert not reloaded[new["id"]].get("archived")
+
+
+def test_compaction_deletes_expired_archive_segments(store_dirs):
+    _, cache_dir = store_dirs
+    store = new_store(cache_dir)
+    old = store.save_test(SCRIPT, {})
+    store.save_test(SCRIPT, {})
+    store.compact(RetentionPolicy(max_count=1))
+
+    summary = store.compact(RetentionPolicy(max_count=1, max_archive_age=60),
+                            now=datetime.now() + timedelta(hours=1))
+
+    assert summary["deleted_tests"] == 1
+    assert len(summary["deleted_segments"]) == 1
+    assert store.get_test(old["id"]) is None
+    assert old["id"] not in {test["id"] for test in store.list_tests()}
+    assert store.archive.segments() == {}